@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Автосохранение в фоне.
+
+Редактор после каждой правки перезапускает таймер; когда правки утихли,
+на GUI-потоке снимается дешёвая копия (словари операций копируются
+поверхностно, строки общие) и отдаётся фоновому потоку. Поток:
+
+    - из накопившихся снимков берёт только последний;
+    - считает хэш содержимого и ничего не пишет, если он не изменился;
+    - пишет файл восстановления через xml_handler.save_xml без проверки —
+      копия без потерь, операции с ошибками тоже сохраняются (.tmp + os.replace);
+    - оставляет не больше MAX_FILES последних файлов в папке.
+
+    ~/.up_editor/autosave/<имя>.<дата-время>.autosave.xml
+
+Тот же поток пишет снимки журнала правок (journal.Journal.write_snapshot),
+чтобы сжатие журнала не останавливало интерфейс.
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import time
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import metrics
+
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".up_editor", "autosave")
+# Пауза после последней правки, мс
+DELAY_MS = 3000
+# Сколько файлов восстановления хранить
+MAX_FILES = 10
+SUFFIX = ".autosave.xml"
+
+
+def take_snapshot(file_path, panel_data, operations):
+    """Копия состояния для фонового потока (GUI-поток может править дальше)."""
+    with metrics.timer("autosave_snapshot"):
+        return file_path, dict(panel_data), [dict(op) for op in operations]
+
+
+def content_hash(panel_data, operations):
+    data = json.dumps([panel_data, operations], ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def recovery_path(recovery_dir, file_path):
+    stem = os.path.splitext(os.path.basename(file_path))[0] if file_path else "без_имени"
+    now = time.time()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"{int(now * 1000) % 1000:03d}"
+    return os.path.join(recovery_dir, f"{stem}.{stamp}{SUFFIX}")
+
+
+def rotate(recovery_dir, keep=MAX_FILES):
+    """Удаляет самые старые файлы восстановления сверх keep."""
+    entries = []
+    for e in os.scandir(recovery_dir):
+        if e.name.endswith(SUFFIX):
+            entries.append((e.stat().st_mtime_ns, e.path))
+    entries.sort(reverse=True)
+    removed = 0
+    for _, path in entries[keep:]:
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError as e:
+            metrics.log_event("autosave.rotate_failed", logging.WARNING, path=path, error=e)
+    return removed
+
+
+class AutosaveWorker(QThread):
+    """Фоновый поток записи файлов восстановления."""
+    saved = pyqtSignal(str)   # путь к файлу восстановления
+    failed = pyqtSignal(str)  # ошибка
+
+    def __init__(self, recovery_dir=None, keep=MAX_FILES, parent=None):
+        super().__init__(parent)
+        self.recovery_dir = recovery_dir or DEFAULT_DIR
+        self.keep = keep
+        self.queue = queue.Queue()
+        self.last_hash = None
+        os.makedirs(self.recovery_dir, exist_ok=True)
+
+    def submit(self, snapshot):
+        self.queue.put(("autosave", snapshot))
+
+    def submit_compaction(self, journal, snapshot):
+        """Снимок журнала правок (journal.Journal.start_compaction) — записать в фоне."""
+        self.queue.put(("journal", (journal, snapshot)))
+
+    def stop(self):
+        self.queue.put(None)
+        self.wait()
+
+    def run(self):
+        while True:
+            task = self.queue.get()
+            # Пачка правок, пока писался прошлый файл, — нужен только последний снимок
+            # каждого вида (последний снимок журнала покрывает и куски предыдущих)
+            latest = {}
+            stopping = False
+            while True:
+                if task is None:
+                    stopping = True
+                else:
+                    latest[task[0]] = task[1]
+                try:
+                    task = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if "journal" in latest:
+                self.write_journal(*latest["journal"])
+            if "autosave" in latest:
+                self.write(latest["autosave"])
+            if stopping:
+                break
+
+    def write_journal(self, journal, snapshot):
+        try:
+            journal.write_snapshot(snapshot)
+        except OSError as e:
+            metrics.log_event("journal.write_failed", logging.WARNING, error=e)
+
+    def write(self, snapshot):
+        import xml_handler
+
+        file_path, panel_data, operations = snapshot
+        try:
+            digest = content_hash(panel_data, operations)
+            if digest == self.last_hash:
+                metrics.count("autosave_skipped")
+                return
+            path = recovery_path(self.recovery_dir, file_path)
+            tmp = path + ".tmp"
+            with metrics.timer("autosave_write"):
+                xml_handler.save_xml(tmp, panel_data, operations, validate=False)
+                os.replace(tmp, path)
+            self.last_hash = digest
+            rotate(self.recovery_dir, self.keep)
+        except Exception as e:
+            metrics.log_event("autosave.failed", logging.ERROR, error=e)
+            self.failed.emit(str(e))
+            return
+        metrics.log_event("autosave.saved", path=path, operations=len(operations))
+        self.saved.emit(path)
@@ -5,68 +5,42 @@ from PyQt5.QtWidgets import (
     QPushButton, QLabel, QLineEdit, QComboBox,
     QFileDialog, QMessageBox, QDialog, QFormLayout, QCheckBox,  QTableWidget, QTableWidgetItem
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 import xml_handler
+import renderer
+import parse_cache
+import program_diff
+import path_simplify
+import path_editor
+import toolpath
+import redraw
+import move_ops
+from file_browser import FileBrowserDock
+from order_view import OrderDock
+from operations_view import OperationsDock
+from operation_index import OperationIndex
+from snap_index import SnapIndex, coord_text
+from scene_view import SceneWidget, changed_span, operation_signature
+import validation
+import journal
+import autosave
+import metrics
+import logging
 import sys
 
 # Матplotlib
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 import matplotlib.pyplot as plt
+import numpy as np
 from matplotlib.patches import Arc  # ← Обязательно добавь это!
+from matplotlib.collections import PathCollection, PolyCollection
+from matplotlib.transforms import Affine2D
 #import matplotlib
 import re
 from math import atan2, degrees
 import math
 
-def calculate_arc_center(A, B, radius, direction):
-    """
-    Вычисляет центр дуги, соединяющей A и B с заданным радиусом и направлением.
-    
-    :param A: (x1, y1) — начальная точка
-    :param B: (x2, y2) — конечная точка
-    :param radius: радиус дуги
-    :param direction: 1 = по часовой, 0 = против часовой
-    :return: (cx, cy) — координаты центра дуги
-    """
-    x1, y1 = A
-    x2, y2 = B
-
-    # Вектор от A к B
-    dx = x2 - x1
-    dy = y2 - y1
-    chord_length = math.hypot(dx, dy)
-
-    # Проверка: радиус должен быть >= половине хорды
-    half_chord = chord_length / 2
-    if radius < half_chord:
-        raise ValueError(f"Радиус {radius} слишком мал для соединения точек на расстоянии {chord_length}")
-
-    # Середина хорды AB
-    mx = (x1 + x2) / 2
-    my = (y1 + y2) / 2
-
-    # Единичный вектор вдоль хорды
-    ux = dx / chord_length
-    uy = dy / chord_length
-
-    # Единичный перпендикуляр (вращение на 90°)
-    nx = -uy  # нормаль
-    ny = ux
-
-    # Расстояние от середины хорды до центра дуги
-    dist_to_center = math.sqrt(radius**2 - half_chord**2)
-
-    # Выбор стороны: direction определяет, в какую сторону отклониться
-    # В системе координат с Y вниз (как у станка) — может быть наоборот
-    sign = 1 if direction == 1 else -1
-
-    center_x = mx + sign * dist_to_center * nx
-    center_y = my + sign * dist_to_center * ny
-
-    return (center_x, center_y)
-
-
 def evaluate_expression(expr, L_val, W_val):
     if not isinstance(expr, str):
         return 0.0
@@ -115,19 +89,76 @@ class PlotWidget(FigureCanvas):
         super().__init__(self.fig)
         self.setParent(main_window)
         self.operation_patches = []
+        self.diff_overlay = None  # результат program_diff.diff_programs
+        # Для перерисовки при смене размеров детали:
+        self.layers = None        # (артисты, легенда) каждой операции
+        self.signatures = None    # scene_view.operation_signature нарисованных операций
+        self.dependencies = None  # от чего зависит операция: frozenset из "L"/"W"
+        self.drawn_size = None    # (L, W), с которыми нарисован чертёж
+        # Полосы фрезы (Width/Correction) для Path и Line
+        self.show_toolpaths = False
+        self.toolpath_cache = toolpath.ToolpathCache()
+        self.toolpath_artist = None
+        # Предпросмотр редактируемого пути: рисуется поверх сохранённого фона (blit)
+        self.preview_artist = None
+        self.preview_background = None
+        # Перетаскивание операции или вершины пути левой кнопкой (см. on_click)
+        self.drag = None
+        # Чертёж без временных наложений (маркер привязки, рамка выделения) — фон для blit
+        self.background = None
+        # Привязка курсора (EditorWindow.snap_index)
+        self.snapping = True
+        self.snap_marker = None
+        self.snap_shown = False
+        # Выделение рамкой/лассо (EditorWindow.selection) и его подсветка одной коллекцией
+        self.band = None
+        self.band_artist = None
+        self.selection_artist = None
+        self.setFocusPolicy(Qt.StrongFocus)  # Delete / Esc для выделенного
+        self.mpl_connect('draw_event', self.on_draw_event)
+        self.mpl_connect('motion_notify_event', self.on_motion)
+        self.mpl_connect('button_release_event', self.on_release)
+        self.mpl_connect('key_press_event', self.on_key)
 
     def clear_plot(self):
         self.ax.clear()
         self.operation_patches = []
+        self.highlight_patch = None
+        self.layers = None
+        self.signatures = None
+        self.dependencies = None
+        self.drawn_size = None
+        self.toolpath_artist = None
+        self.preview_artist = None
+        self.preview_background = None
+        self.drag = None
+        self.background = None
+        self.snap_marker = None
+        self.snap_shown = False
+        self.band = None
+        self.band_artist = None
+        self.selection_artist = None
+
+    def show_message(self, text):
+        """Чертежа нет — только надпись в центре."""
+        self.clear_plot()
+        self.ax.text(0.5, 0.5, text, transform=self.ax.transAxes, ha='center')
+        self.draw()
 
     def clear_highlight(self):
-        if hasattr(self, 'highlight_patch') and self.highlight_patch:
+        if self.drop_highlight():
+            self.draw()
+
+    def drop_highlight(self):
+        """Убирает подсветку без перерисовки (её сделает вызывающий). True — было что убрать."""
+        if getattr(self, 'highlight_patch', None):
             self.highlight_patch.remove()
             self.highlight_patch = None
-            self.draw()
+            return True
+        return False
 
     def highlight_element(self, idx):
-        self.clear_highlight()
+        self.drop_highlight()
         for obj, i in self.operation_patches:
             if i == idx:
                 if isinstance(obj, plt.Circle):
@@ -155,304 +186,251 @@ class PlotWidget(FigureCanvas):
                 break
         self.draw()
 
-    def parse_coord(self, value, L_val, W_val, is_y=False, is_path=False):
-        """
-        Парсит координату.
-        :param is_path: если True — отключаем обработку `-1` как `L-1`, т.к. это Path
-        """
-        if not isinstance(value, str):
-            value = str(value)
-        value = value.strip()
-        if value == "":
-            return 0.0
-
-        # Для Path: отрицательные числа — абсолютные координаты
-        if is_path:
-            try:
-                if value.startswith('-') and value[1:].replace('.', '', 1).isdigit():
-                    return float(value)
-                elif value.replace('.', '', 1).isdigit():
-                    return float(value)
-            except:
-                pass
-            return evaluate_expression(value, L_val, W_val)
-
-        # Для остальных: -1 → L - 1 (если is_y=False) или W - 1 (если is_y=True)
-        if value.startswith('-') and value[1:].replace('.', '', 1).isdigit():
-            try:
-                num = float(value)
-                if is_y:
-                    return W_val + num  # W - 10 → W + (-10)
-                else:
-                    return L_val + num  # L - 10 → L + (-10)
-            except:
-                pass
-
-        return evaluate_expression(value, L_val, W_val)
-
+    @metrics.timed("redraw")
     def draw_operations(self, operations, panel_length, panel_width):
+        if (self.layers is not None and self.drawn_size == (panel_length, panel_width)
+                and not self.diff_overlay and self.sync_operations(operations, panel_length, panel_width)):
+            return
         self.clear_plot()
-        margin = 50
-        # Устанавливаем пределы осей
-        self.ax.set_xlim(panel_length + margin, -margin)  # X: справа (0) → слева (L)
-        self.ax.set_ylim(panel_width + margin, -margin)   # Y: сверху (0) → снизу (W)
-
-        # Инвертируем оси, чтобы рост координат шёл влево и вниз
-        self.ax.invert_xaxis()  # X увеличивается влево
-        self.ax.invert_yaxis()  # Y увеличивается вниз
-
-        # Начало координат — правый верхний угол
-        self.ax.set_xlim(panel_length + margin, -margin)
-        self.ax.set_ylim(panel_width + margin, -margin)
-        self.ax.set_aspect('equal', adjustable='box')
-                # Получаем параметры
-        try:
-            L_val = float(panel_length)
-        except:
-            L_val = 0.0
-        try:
-            W_val = float(panel_width)
-        except:
-            W_val = 0.0
-        thickness = self.main_window.panel_data.get("PanelThickness", "0")
-        name = self.main_window.panel_data.get("PanelName", "Без имени")
-
-        try:
-            T_val = float(str(thickness).replace(',', '.'))
-        except:
-            T_val = 0.0
-
-        title = f"Чертёж детали: {name}"
-        subtitle = f"Размеры: {L_val:.1f} × {W_val:.1f} × {T_val:.1f} мм"
-        self.ax.set_title(f"{title}\n{subtitle}", fontsize=12, loc='left')
-        self.ax.axis('off')
-
-        rectangle = plt.Rectangle(
-            (0, 0), panel_length, panel_width,
-            linewidth=2, edgecolor='black', facecolor='lightblue', alpha=0.5, zorder=1
+        self.layers = []
+        self.operation_patches, self.types_in_use = renderer.draw_panel(
+            self.ax, self.main_window.panel_data, operations, panel_length, panel_width,
+            layers=self.layers
         )
-        self.ax.add_patch(rectangle)
-
-        types_in_use = set()
+        self.signatures = [operation_signature(op) for op in operations]
+        self.drawn_size = (panel_length, panel_width)
+        metrics.count("redraws")
+        metrics.count("operations_drawn", len(operations))
+        metrics.count("artists_created", len(self.ax.patches) + len(self.ax.lines))
+        self.draw_toolpath_overlay(operations, panel_length, panel_width)
+        self.draw_diff_overlay()
+        self.draw_selection()
+        self.draw()
 
-        for idx, op in enumerate(operations):
-            try:
-                type_name = op["TypeName"]
-                L_val = float(panel_length)
-                W_val = float(panel_width)
-
-                if type_name == "Line":
-                    begin_x = self.parse_coord(op.get("BeginX", "0"), L_val, W_val)
-                    begin_y = self.parse_coord(op.get("BeginY", "0"), L_val, W_val, is_y=True)
-                    end_x = self.parse_coord(op.get("EndX", "0"), L_val, W_val)
-                    end_y = self.parse_coord(op.get("EndY", "0"), L_val, W_val, is_y=True)
-                    line, = self.ax.plot([begin_x, end_x], [begin_y, end_y], color='brown', linewidth=2, zorder=2)
-                    self.operation_patches.append((line, idx))
-                    types_in_use.add(("Фрезеровка", 'brown'))
-
-                elif type_name == "Vertical Line":
-                    try:
-                        x1_str = op.get("BeginX", "0").strip()
-                        y1_str = op.get("BeginY", "0").strip()
-                        x2_str = op.get("EndX", "0").strip()
-                        y2_str = op.get("EndY", "0").strip()
-
-                        # Проверяем, не пустые ли строки
-                        if not x1_str or not y1_str or not x2_str or not y2_str:
-                            print(f"⚠️ Vertical Line: пропущена операция — пустые координаты: {op}")
-                            continue
-
-                        # Вычисляем координаты
-                        begin_x = evaluate_expression(x1_str, L_val, W_val)
-                        begin_y = evaluate_expression(y1_str, L_val, W_val)
-                        end_x = evaluate_expression(x2_str, L_val, W_val)
-                        end_y = evaluate_expression(y2_str, L_val, W_val)
-
-                        # Рисуем линию
-                        line, = self.ax.plot([begin_x, end_x], [begin_y, end_y],
-                                             color='red', linewidth=2, linestyle='-', zorder=2)
-                        self.operation_patches.append((line, idx))
-                        types_in_use.add(("Фрезеровка пилой", 'red'))
-
-                    except Exception as e:
-                        print(f"❌ Ошибка при отрисовке Vertical Line: {e}")
-                        print(f"Данные операции: {op}")
-                        continue    
-
-                elif type_name == "Path":
-                    vertexes = op.get("Vertexes", [])
-                    if len(vertexes) < 2:
-                        continue
-                    points = []
-                    for v in vertexes:
-                        try:
-                            x = self.parse_coord(v.get("X1", "0"), L_val, W_val, is_path=True)
-                            y = self.parse_coord(v.get("Y1", "0"), L_val, W_val, is_y=True, is_path=True)
-                            points.append((x, y))
-                        except:
-                            continue
-
-                    for i in range(1, len(points)):
-                        prev = points[i-1]
-                        curr = points[i]
-                        v = vertexes[i]  # <-- vertexes[i], т.к. vertexes[0] = Point
-
-                        if v["type"] == "Line":
-                            line, = self.ax.plot([prev[0], curr[0]], [prev[1], curr[1]], color='purple', linewidth=2, zorder=2)
-                            self.operation_patches.append((line, idx))
-                        elif v["type"] == "Arc":
-                            try:
-                                radius = float(v.get("Radius", 10))
-                                direction = int(v.get("Direction", 1))
-                                A = prev  # начальная точка
-                                B = curr  # конечная точка
-
-                                # Определяем порядок точек для расчёта угла
-                                if direction == 0:
-                                    # Для Direction = 0: рисуем от B к A (обратно)
-                                    start_point = B
-                                    end_point = A
-                                else:
-                                    # Для Direction = 1: от A к B
-                                    start_point = A
-                                    end_point = B
-
-                                # Вычисляем центр дуги как середину перпендикуляра
-                                center_x, center_y = calculate_arc_center(A, B, radius, direction)
-
-                                # Углы от центра к точкам
-                                start_angle = math.degrees(math.atan2(start_point[1] - center_y, start_point[0] - center_x))
-                                end_angle = math.degrees(math.atan2(end_point[1] - center_y, end_point[0] - center_x))
-
-                                # Нормализуем углы
-                                start_angle = start_angle % 360
-                                end_angle = end_angle % 360
-
-                                # Корректируем конечный угол, чтобы дуга шла в нужную сторону
-                                if end_angle >= start_angle + 180:
-                                    end_angle -= 360
-                                elif end_angle <= start_angle - 180:
-                                    end_angle += 360
-
-                                # matplotlib всегда рисует против часовой, поэтому:
-                                # Чтобы дуга была "по часовой", нужно start_angle > end_angle
-                                # Это уже обеспечивается коррекцией выше
-
-                                arc_patch = Arc(
-                                    (center_x, center_y),
-                                    2 * radius, 2 * radius,
-                                    theta1=start_angle,
-                                    theta2=end_angle,
-                                    color='purple',
-                                    linewidth=2,
-                                    zorder=2
-                                )
-                                self.ax.add_patch(arc_patch)
-                                self.operation_patches.append((arc_patch, idx))
-
-                            except Exception as e:
-                                print(f"Arc error: {e}")
-                                # Резерв: рисуем линию
-                                line, = self.ax.plot([A[0], B[0]], [A[1], B[1]], color='purple', linewidth=2)
-                                self.operation_patches.append((line, idx))
-
-                elif type_name == "Horizontal Hole":
-                    x_val = self.parse_coord(op.get("X1", "0"), L_val, W_val)
-                    y_val = self.parse_coord(op.get("Y1", "0"), L_val, W_val, is_y=True)
-                    try:
-                        depth_val = float(str(op.get("Depth", "0")).replace(',', '.'))
-                    except:
-                        depth_val = 0.0
-                    try:
-                        diameter_val = float(str(op.get("Diameter", "5")).replace(',', '.'))
-                    except:
-                        diameter_val = 5.0
-                    if x_val < 10:
-                        rect = plt.Rectangle((x_val, y_val - diameter_val / 2), depth_val, diameter_val,
-                                           facecolor='blue', alpha=0.7, zorder=2)
-                        self.ax.add_patch(rect)
-                        self.operation_patches.append((rect, idx))
-                        types_in_use.add(("Торцевое", 'blue'))
-                    elif x_val > L_val - 10:
-                        rect = plt.Rectangle((x_val - depth_val, y_val - diameter_val / 2), depth_val, diameter_val,
-                                           facecolor='blue', alpha=0.7, zorder=2)
-                        self.ax.add_patch(rect)
-                        self.operation_patches.append((rect, idx))
-                        types_in_use.add(("Торцевое", 'blue'))
-                    elif y_val < 10:
-                        rect = plt.Rectangle((x_val - diameter_val / 2, y_val), diameter_val, depth_val,
-                                           facecolor='blue', alpha=0.7, zorder=2)
-                        self.ax.add_patch(rect)
-                        self.operation_patches.append((rect, idx))
-                        types_in_use.add(("Торцевое", 'blue'))
-                    elif y_val > W_val - 10:
-                        rect = plt.Rectangle((x_val - diameter_val / 2, y_val - depth_val), diameter_val, depth_val,
-                                           facecolor='blue', alpha=0.7, zorder=2)
-                        self.ax.add_patch(rect)
-                        self.operation_patches.append((rect, idx))
-                        types_in_use.add(("Торцевое", 'blue'))
-                    else:
-                        point, = self.ax.plot(x_val, y_val, 'o', color='blue', markersize=4)
-                        self.operation_patches.append((point, idx))
-                        types_in_use.add(("Торцевое", 'blue'))
+    def sync_operations(self, operations, panel_length, panel_width):
+        """
+        Перерисовка после правки: артисты общих начала и конца списка операций остаются,
+        заменяются только между ними. False — изменилось слишком много, выгоднее всё заново.
+        """
+        with metrics.timer("redraw_sync"):
+            new = [operation_signature(op) for op in operations]
+            prefix, removed, added = changed_span(self.signatures, new)
+            if removed + added > max(16, len(new) // 4):
+                return False
+
+            self.drop_highlight()  # ← без своей draw(): чертёж рисуется один раз в конце
+            renderer.update_axes(self.ax, self.main_window.panel_data, panel_length, panel_width)
+            L_val = renderer.to_float(panel_length)
+            W_val = renderer.to_float(panel_width)
+            for artists, _ in self.layers[prefix:prefix + removed]:
+                for artist in artists:
+                    artist.remove()
+            fresh = []
+            for idx in range(prefix, prefix + added):
+                try:
+                    fresh.append(renderer.draw_operation(self.ax, operations[idx], idx, L_val, W_val))
+                except Exception as e:
+                    metrics.log_event("draw.failed", logging.WARNING, index=idx, error=e)
+                    fresh.append(([], None))
+            self.layers[prefix:prefix + removed] = fresh
+            self.signatures = new
+            self.dependencies = None
+            self.operation_patches = [
+                (artist, idx) for idx, (artists, _) in enumerate(self.layers) for artist in artists
+            ]
+            self.types_in_use = sorted({legend for _, legend in self.layers if legend}, key=lambda x: x[0])
+        metrics.count("operations_redrawn", added)
+        self.draw_toolpath_overlay(operations, panel_length, panel_width)
+        self.draw_selection()
+        self.draw()
+        return True
 
-                else:
-                    x_val = self.parse_coord(op.get("X1", "0"), L_val, W_val)
-                    y_val = self.parse_coord(op.get("Y1", "0"), L_val, W_val, is_y=True)
-                    diameter = float(op.get("Diameter", "0") or 0)
-                    try:
-                        depth_val = float(str(op.get("Depth", "0")).replace(',', '.'))
-                    except:
-                        depth_val = 0.0
-                    if depth_val >= 16.0:
-                        color = 'yellow'
-                        label = "Сквозное"
-                    elif type_name == "Vertical Hole":
-                        color = 'green'
-                        label = "Верхняя плоскость"
-                    elif type_name == "Back Vertical Hole":
-                        color = 'magenta'
-                        label = "Нижняя плоскость"
-                    else:
-                        color = 'red'
-                        label = "Отверстие"
-                    radius = diameter / 2
-                    circle = plt.Circle((x_val, y_val), radius, color=color, fill=False, linewidth=1.5, zorder=2)
-                    self.ax.add_patch(circle)
-                    cross, = self.ax.plot(x_val, y_val, 'x', color=color, markersize=5, zorder=2)
-                    self.operation_patches.append((circle, idx))
-                    self.operation_patches.append((cross, idx))
-                    types_in_use.add((label, color))
+    @metrics.timed("redraw_resize")
+    def update_panel_size(self, operations, panel_length, panel_width):
+        """
+        Размеры детали изменились, операции — нет. Перерисовываются только
+        операции, чья геометрия зависит от изменившегося размера (L-32, W/2, -10...);
+        операции с постоянными координатами остаются как были.
+        """
+        if (self.layers is None or self.drawn_size is None or self.diff_overlay
+                or len(self.layers) != len(operations)):
+            self.draw_operations(operations, panel_length, panel_width)
+            return
 
+        old_length, old_width = self.drawn_size
+        changed = set()
+        if panel_length != old_length:
+            changed.add("L")
+        if panel_width != old_width:
+            changed.add("W")
+
+        if changed and self.dependencies is None:
+            with metrics.timer("dependency_index"):
+                self.dependencies = [renderer.operation_dependencies(op) for op in operations]
+        affected = [i for i, deps in enumerate(self.dependencies) if deps & changed] if changed else []
+
+        self.drop_highlight()
+        renderer.update_axes(self.ax, self.main_window.panel_data, panel_length, panel_width)
+
+        L_val = renderer.to_float(panel_length)
+        W_val = renderer.to_float(panel_width)
+        for idx in affected:
+            for artist in self.layers[idx][0]:
+                artist.remove()
+            try:
+                self.layers[idx] = renderer.draw_operation(self.ax, operations[idx], idx, L_val, W_val)
             except Exception as e:
-                print(f"Ошибка при отрисовке: {e}")
-                continue
+                metrics.log_event("draw.failed", logging.WARNING, index=idx, error=e)
+                self.layers[idx] = ([], None)
+        if affected:
+            self.operation_patches = [
+                (artist, idx) for idx, (artists, _) in enumerate(self.layers) for artist in artists
+            ]
+            self.types_in_use = sorted({legend for _, legend in self.layers if legend}, key=lambda x: x[0])
+
+        self.drawn_size = (panel_length, panel_width)
+        metrics.count("operations_redrawn", len(affected))
+        self.draw_toolpath_overlay(operations, panel_length, panel_width)
+        self.draw_selection()
+        self.draw()
 
-        self.types_in_use = sorted(types_in_use, key=lambda x: x[0])
+    def set_show_toolpaths(self, show):
+        self.show_toolpaths = show
+        if self.drawn_size is None:
+            return
+        self.draw_toolpath_overlay(self.main_window.cad_operations, *self.drawn_size)
         self.draw()
 
-    def on_click(self, event):
-        if event.inaxes != self.ax or not event.xdata or not event.ydata:
+    def show_preview(self, polyline):
+        """
+        Ломаная редактируемого пути поверх чертежа. Остальной чертёж не перерисовывается:
+        восстанавливается сохранённый фон и поверх рисуется только этот путь.
+        """
+        if self.drawn_size is None:
+            return
+        if self.preview_artist is None:
+            self.preview_artist, = self.ax.plot([], [], color='orange', linewidth=2, zorder=20, animated=True)
+        self.preview_artist.set_data(polyline[:, 0], polyline[:, 1])
+        if self.preview_background is None:
+            self.preview_background = self.copy_from_bbox(self.fig.bbox)
+        self.restore_region(self.preview_background)
+        self.ax.draw_artist(self.preview_artist)
+        self.blit(self.fig.bbox)
+
+    def clear_preview(self):
+        if self.preview_artist is None:
+            return
+        self.preview_artist.remove()
+        self.preview_artist = None
+        if self.preview_background is not None:
+            self.restore_region(self.preview_background)
+            self.blit(self.fig.bbox)
+            self.preview_background = None
+
+    def on_draw_event(self, event):
+        """Полная перерисовка (смена размера окна и т.п.): новый фон, наложения — поверх."""
+        if self.drag is not None and self.drag["active"]:
+            self.drag["background"] = self.copy_from_bbox(self.fig.bbox)
+            for artist in self.drag["artists"]:
+                self.ax.draw_artist(artist)
+            return
+        self.background = self.copy_from_bbox(self.fig.bbox)
+        self.snap_shown = False
+        if self.selection_artist is not None:
+            self.ax.draw_artist(self.selection_artist)
+        if self.preview_artist is not None:
+            self.preview_background = self.copy_from_bbox(self.fig.bbox)
+            self.ax.draw_artist(self.preview_artist)
+
+    def restore_background(self):
+        """Чертёж без временных наложений и подсветка выделенного поверх (перед blit)."""
+        self.restore_region(self.background)
+        if self.selection_artist is not None and self.selection_artist.get_visible():
+            self.ax.draw_artist(self.selection_artist)
+
+    def draw_toolpath_overlay(self, operations, panel_length, panel_width):
+        """
+        Полосы фрезы одной коллекцией. Многоугольники берутся из кэша —
+        пересчитываются только новые и изменённые операции.
+        """
+        if self.toolpath_artist is not None:
+            self.toolpath_artist.remove()
+            self.toolpath_artist = None
+        if not self.show_toolpaths:
             return
+        self.toolpath_artist = toolpath.draw_toolpaths(
+            self.ax, operations, renderer.to_float(panel_length), renderer.to_float(panel_width),
+            self.toolpath_cache
+        )
+
+    def show_diff(self, diff):
+        """Показывает результат сравнения поверх чертежа (до clear_diff)."""
+        self.diff_overlay = diff
+        self.main_window.refresh_plot()
+
+    def clear_diff(self):
+        self.diff_overlay = None
+        self.main_window.refresh_plot()
+
+    def drop_diff(self):
+        """
+        Программа изменилась — номера операций и точки сравнения устарели.
+        Без перерисовки: слой уберёт следующая (полная) перерисовка чертежа.
+        """
+        if self.diff_overlay:
+            self.diff_overlay = None
+            self.layers = None
 
-        x_click, y_click = event.xdata, event.ydata
-        clicked_idx = None
+    def draw_diff_overlay(self):
+        """
+        Слой сравнения: по одному артисту на категорию.
+        Зелёные — добавлены, красные — удалены, синие — изменены,
+        оранжевые — перемещены (со стрелкой от старого места).
+        """
+        diff = self.diff_overlay
+        if not diff:
+            return
+        from matplotlib.collections import LineCollection
+
+        def scatter(points, **style):
+            if points:
+                xs, ys = zip(*points)
+                self.ax.scatter(xs, ys, zorder=40, **style)
+
+        scatter([a["at"] for a in diff["added"]], s=180, facecolors='none',
+                edgecolors='limegreen', linewidths=2.5, label="Добавлено")
+        scatter([r["at"] for r in diff["removed"]], s=120, marker='x',
+                color='red', linewidths=2.5, label="Удалено")
+        scatter([c["at"] for c in diff["changed"]], s=160, marker='s', facecolors='none',
+                edgecolors='royalblue', linewidths=2, label="Изменено")
+        if diff["moved"]:
+            segments = [(m["from"], m["to"]) for m in diff["moved"]]
+            self.ax.add_collection(LineCollection(segments, colors='darkorange',
+                                                  linewidths=1.5, linestyles='--', zorder=40))
+            scatter([m["to"] for m in diff["moved"]], s=160, facecolors='none',
+                    edgecolors='darkorange', linewidths=2.5, label="Перемещено")
+        self.ax.legend(loc='lower left', fontsize=8)
+
+    @metrics.timed("hit_test")
+    def find_operation_at(self, x_click, y_click):
+        """
+        Возвращает индекс операции под точкой (в мм) или None.
+        Проверяются артисты в обратном порядке — верхние первыми.
+        """
         for obj, idx in reversed(self.operation_patches):
             try:
                 if isinstance(obj, plt.Circle):
                     dx = x_click - obj.center[0]
                     dy = y_click - obj.center[1]
                     if dx*dx + dy*dy <= (obj.radius + 10)**2:
-                        clicked_idx = idx
-                        break
+                        return idx
                 elif isinstance(obj, plt.Rectangle):
                     xmin, ymin = obj.get_xy()
                     xmax = xmin + obj.get_width()
                     ymax = ymin + obj.get_height()
                     margin_x, margin_y = 10, 15
                     if xmin - margin_x <= x_click <= xmax + margin_x and ymin - margin_y <= y_click <= ymax + margin_y:
-                        clicked_idx = idx
-                        break
+                        return idx
                 elif hasattr(obj, 'get_xydata'):
                     xy = obj.get_xydata()
                     if len(xy) >= 2:
@@ -474,8 +452,7 @@ class PlotWidget(FigureCanvas):
                             yy = y1 + param * D
                         dist = ((x_click - xx)**2 + (y_click - yy)**2)**0.5
                         if dist < 10:
-                            clicked_idx = idx
-                            break
+                            return idx
                 elif isinstance(obj, Arc):
                     center = obj.center
                     radius = obj.width / 2
@@ -485,20 +462,365 @@ class PlotWidget(FigureCanvas):
                     y_arc = center[1] + radius * np.sin(angles)
                     dist = np.min((x_arc - x_click)**2 + (y_arc - y_click)**2)**0.5
                     if dist < 10:
-                        clicked_idx = idx
-                        break
+                        return idx
             except:
                 continue
+        return None
 
+    def on_click(self, event):
+        if event.inaxes != self.ax or not event.xdata or not event.ydata:
+            return
+
+        clicked_idx = self.find_operation_at(event.xdata, event.ydata)
+        selection = self.main_window.selection
         if clicked_idx is not None:
             op = self.main_window.cad_operations[clicked_idx]
             type_name = op["TypeName"]
 
-            if event.button == 1:  # Левый клик
-                self.main_window.edit_operation(clicked_idx)
+            if event.button == 1 and "ctrl" in event.modifiers:
+                # Ctrl+щелчок — добавить к выделению или снять
+                self.main_window.select_operations(set(selection) ^ {clicked_idx})
+            elif event.button == 1:  # Левый клик
+                # Щелчок или перетаскивание — станет ясно по движению мыши (on_motion/on_release)
+                vertex = self.vertex_at(op, event) if type_name == "Path" else None
+                movable = type_name != "Path" or vertex is not None
+                # Операция из выделения тянет за собой всё выделенное
+                group = vertex is None and clicked_idx in selection and len(selection) > 1
+                self.drag = {
+                    "index": clicked_idx,
+                    "indices": list(selection) if group else [clicked_idx],
+                    "vertex": vertex,
+                    "movable": movable,
+                    # Точка операции, которая привязывается при перемещении
+                    "anchor": move_ops.reference_point(op, *self.drawn_size, vertex) if movable else None,
+                    "snap": None,
+                    "press": (event.x, event.y),
+                    "origin": (event.xdata, event.ydata),
+                    "delta": (0.0, 0.0),
+                    "active": False,
+                }
             elif event.button == 3:  # Правый клик
-                if type_name in ["Vertical Hole", "Back Vertical Hole", "Horizontal Hole"]:
+                if clicked_idx in selection:
+                    self.show_selection_menu(event)
+                elif type_name in ["Vertical Hole", "Back Vertical Hole", "Horizontal Hole"]:
                     self.show_context_menu(event, clicked_idx)
+        elif event.button == 1 and self.drawn_size is not None:
+            # Пустое место: рамка, с Shift — лассо; с Ctrl — добавить к выделению
+            self.band = {
+                "press": (event.x, event.y),
+                "points": [(event.xdata, event.ydata)],
+                "lasso": "shift" in event.modifiers,
+                "add": "ctrl" in event.modifiers,
+                "active": False,
+            }
+        elif event.button == 3 and self.drawn_size is not None:
+            self.show_add_menu(event)
+
+    # === Перетаскивание мышью ===
+    # Пока операция едет за курсором, чертёж не перерисовывается: её артисты скрыты,
+    # остальное сохранено как фон (copy_from_bbox), и поверх фона рисуется только
+    # сдвинутая копия (blit). В программу сдвиг попадает при отпускании — одним шагом отмены.
+
+    DRAG_THRESHOLD_PX = 4  # меньше — щелчок (открывает диалог), больше — перетаскивание
+    VERTEX_PICK_PX = 8     # радиус захвата вершины пути
+
+    def vertex_at(self, op, event):
+        """Номер вершины Path рядом с курсором (в пикселях) или None — тогда путь не двигается."""
+        if self.drawn_size is None:
+            return None
+        points = renderer.path_points(op, *self.drawn_size)
+        if not points:
+            return None
+        pixels = self.ax.transData.transform(points)
+        distances = np.hypot(pixels[:, 0] - event.x, pixels[:, 1] - event.y)
+        nearest = int(np.argmin(distances))
+        return nearest if distances[nearest] <= self.VERTEX_PICK_PX else None
+
+    def on_motion(self, event):
+        if self.band is not None:
+            self.update_band(event)
+            return
+        drag = self.drag
+        if drag is None:
+            self.hover(event)
+            return
+        if not drag["movable"]:
+            return
+        if not drag["active"]:
+            if math.hypot(event.x - drag["press"][0], event.y - drag["press"][1]) < self.DRAG_THRESHOLD_PX:
+                return
+            self.begin_drag()
+        if event.inaxes != self.ax or event.xdata is None or event.ydata is None:
+            return
+        # К элементам чертежа привязывается опорная точка операции, а не курсор
+        anchor_x, anchor_y = drag["anchor"]
+        target_x = anchor_x + event.xdata - drag["origin"][0]
+        target_y = anchor_y + event.ydata - drag["origin"][1]
+        drag["snap"] = self.snap(target_x, target_y, exclude=drag["index"])
+        if drag["snap"] is not None:
+            target_x, target_y = drag["snap"][:2]
+        self.update_drag(target_x - anchor_x, target_y - anchor_y)
+
+    def on_release(self, event):
+        if self.band is not None:
+            self.finish_band()
+            return
+        drag, self.drag = self.drag, None
+        if drag is None or event.button != 1:
+            return
+        if not drag["active"]:
+            self.main_window.edit_operation(drag["index"])
+            return
+        for artist in drag["artists"]:
+            artist.remove()
+        for artist in drag["hidden"]:
+            artist.set_visible(True)
+        if self.selection_artist is not None:
+            self.selection_artist.set_visible(True)
+        dx, dy = drag["delta"]
+        if dx or dy:
+            # Чертёж перерисует отложенная перерисовка после правки
+            self.main_window.move_operations(drag["indices"], dx, dy, vertex=drag["vertex"])
+        else:
+            self.draw()
+
+    def begin_drag(self):
+        """Скрывает перетаскиваемую операцию и запоминает чертёж без неё как фон."""
+        drag = self.drag
+        drag["active"] = True
+        drag["artists"] = []
+        drag["hidden"] = [artist for idx in drag["indices"] for artist in self.layers[idx][0]] if self.layers else []
+        self.drop_highlight()
+        for artist in drag["hidden"]:
+            artist.set_visible(False)
+        if self.selection_artist is not None:
+            self.selection_artist.set_visible(False)
+        if drag["vertex"] is None:
+            # Операции целиком: копии рисуются один раз несколькими коллекциями
+            # и дальше только сдвигаются (update_drag)
+            L_val, W_val = self.drawn_size
+            shapes = []
+            for idx in drag["indices"]:
+                try:
+                    shapes += renderer.operation_shapes(self.main_window.cad_operations[idx], idx, L_val, W_val)[0]
+                except Exception as e:
+                    metrics.log_event("draw.failed", logging.WARNING, index=idx, error=e)
+            drag["artists"] = renderer.draw_shape_collections(self.ax, shapes)
+            for artist in drag["artists"]:
+                artist.set_animated(True)
+                artist.set_zorder(20)
+        self.draw()  # on_draw_event сохранит фон
+        metrics.count("drags")
+
+    def update_drag(self, dx, dy):
+        """Рисует операции, сдвинутые на (dx, dy) мм, поверх сохранённого фона."""
+        drag = self.drag
+        drag["delta"] = (dx, dy)
+        if drag["vertex"] is None:
+            offset = Affine2D().translate(dx, dy) + self.ax.transData
+            for artist in drag["artists"]:
+                if isinstance(artist, PathCollection):
+                    artist.set_offset_transform(offset)  # маркеры: сдвигаются точки, не форма
+                else:
+                    artist.set_transform(offset)
+            artists = drag["artists"]
+        else:
+            # Вершина пути: ломаная пути строится заново
+            L_val, W_val = self.drawn_size
+            op = move_ops.moved_operation(self.main_window.cad_operations[drag["index"]], dx, dy, drag["vertex"])
+            for artist in drag["artists"]:
+                artist.remove()
+            polyline = toolpath.path_polyline(op.get("Vertexes", []), L_val, W_val)
+            artists = self.ax.plot(polyline[:, 0], polyline[:, 1], color=renderer.COLOR_PATH,
+                                   linewidth=2, zorder=20, animated=True)
+            drag["artists"] = artists
+        self.restore_region(drag["background"])
+        for artist in artists:
+            self.ax.draw_artist(artist)
+        if drag["snap"] is not None:
+            self.draw_snap_marker(drag["snap"])
+        self.blit(self.fig.bbox)
+
+    # === Привязка курсора ===
+    # Ближайший центр отверстия, вершина пути или конец линии (k-d дерево snap_index),
+    # иначе кромка детали или узел сетки 32 мм — в пределах SNAP_PX пикселей.
+
+    SNAP_PX = 10
+
+    def set_snapping(self, enabled):
+        self.snapping = enabled
+        if not enabled:
+            self.hide_snap()
+
+    def snap(self, x, y, exclude=None):
+        """Точка привязки (x, y, подпись) для точки (x, y) в мм или None."""
+        if not self.snapping or self.drawn_size is None:
+            return None
+        origin_x = self.ax.transData.transform((0, 0))[0]
+        scale = abs(self.ax.transData.transform((1, 0))[0] - origin_x)  # пикселей на мм
+        if not scale:
+            return None
+        with metrics.timer("snap"):
+            return self.main_window.snap_index.snap(x, y, self.SNAP_PX / scale, exclude)
+
+    def draw_snap_marker(self, point):
+        if self.snap_marker is None:
+            self.snap_marker, = self.ax.plot([], [], 'o', markersize=12, markerfacecolor='none',
+                                             markeredgecolor='darkorange', markeredgewidth=2,
+                                             zorder=25, animated=True)
+        self.snap_marker.set_data([point[0]], [point[1]])
+        self.ax.draw_artist(self.snap_marker)
+
+    def hover(self, event):
+        """Курсор над чертежом без нажатой кнопки: маркер привязки и координаты в строке состояния."""
+        if self.background is None or self.preview_artist is not None:
+            return
+        if event.inaxes != self.ax or event.xdata is None or event.ydata is None:
+            self.hide_snap()
+            return
+        point = self.snap(event.xdata, event.ydata)
+        if point is None:
+            self.hide_snap()
+            self.main_window.statusBar().showMessage(f"X {event.xdata:.1f}  Y {event.ydata:.1f}")
+            return
+        self.restore_background()
+        self.draw_snap_marker(point)
+        self.blit(self.fig.bbox)
+        self.snap_shown = True
+        self.main_window.statusBar().showMessage(f"X {point[0]:.1f}  Y {point[1]:.1f} — {point[2]}")
+
+    def hide_snap(self):
+        if self.snap_shown and self.background is not None:
+            self.restore_background()
+            self.blit(self.fig.bbox)
+        self.snap_shown = False
+
+    def show_add_menu(self, event):
+        """Правый клик по пустому месту: отверстие в точке привязки (или под курсором)."""
+        from PyQt5.QtWidgets import QMenu
+        from PyQt5.QtCore import QPoint
+
+        point = self.snap(event.xdata, event.ydata) or (event.xdata, event.ydata)
+        L_val, W_val = self.drawn_size
+        x_text = coord_text(point[0], L_val, "L")
+        y_text = coord_text(point[1], W_val, "W")
+
+        menu = QMenu(self.main_window)
+        menu.addSection(f"X {x_text}  Y {y_text}")
+        actions = {}
+        for hole_type in ("Vertical Hole", "Back Vertical Hole", "Horizontal Hole"):
+            actions[menu.addAction(f"Добавить: {display_type(hole_type)}")] = hole_type
+        pos = QPoint(int(event.x), self.height() - int(event.y))
+        action = menu.exec_(self.mapToGlobal(pos))
+        if action in actions:
+            self.main_window.add_hole(actions[action], x_text, y_text)
+
+    # === Выделение рамкой и лассо ===
+    # Рамка или лассо рисуются поверх фона (blit); выделенное ищется в пространственном
+    # индексе габаритов (EditorWindow.operation_index), а не перебором артистов.
+
+    def update_band(self, event):
+        band = self.band
+        if not band["active"]:
+            if math.hypot(event.x - band["press"][0], event.y - band["press"][1]) < self.DRAG_THRESHOLD_PX:
+                return
+            band["active"] = True
+        if event.inaxes == self.ax and event.xdata is not None and event.ydata is not None:
+            if band["lasso"]:
+                band["points"].append((event.xdata, event.ydata))
+            else:
+                band["points"][1:] = [(event.xdata, event.ydata)]
+        if self.background is None or len(band["points"]) < 2:
+            return
+        if band["lasso"]:
+            xs, ys = zip(*band["points"])
+        else:
+            (x0, y0), (x1, y1) = band["points"]
+            xs, ys = (x0, x1, x1, x0, x0), (y0, y0, y1, y1, y0)
+        if self.band_artist is None:
+            self.band_artist, = self.ax.plot([], [], color='royalblue', linewidth=1, linestyle='--',
+                                             zorder=40, animated=True)
+        self.band_artist.set_data(xs, ys)
+        self.restore_background()
+        self.ax.draw_artist(self.band_artist)
+        self.blit(self.fig.bbox)
+
+    def finish_band(self):
+        band, self.band = self.band, None
+        index = self.main_window.operation_index
+        if not band["active"] or len(band["points"]) < 2:
+            # Щелчок по пустому месту снимает выделение
+            if not band["add"] and self.main_window.selection:
+                self.main_window.select_operations([])
+            return
+        if band["lasso"]:
+            found = index.in_polygon(band["points"])
+        else:
+            (x0, y0), (x1, y1) = band["points"]
+            found = index.in_rect(x0, y0, x1, y1)
+        if band["add"]:
+            found = set(self.main_window.selection) | set(found.tolist())
+        self.main_window.select_operations(found)  # перерисовка уберёт рамку
+
+    def draw_selection(self):
+        """Подсветка выделенного: одна коллекция прямоугольников по габаритам операций."""
+        if self.selection_artist is not None:
+            self.selection_artist.remove()
+            self.selection_artist = None
+        selection = self.main_window.selection
+        if not selection or self.drawn_size is None:
+            return
+        boxes = self.main_window.operation_index.footprints(selection)
+        boxes = boxes[~np.isnan(boxes).any(axis=1)]
+        x0, y0 = boxes[:, 0] - 3, boxes[:, 1] - 3
+        x1, y1 = boxes[:, 2] + 3, boxes[:, 3] + 3
+        corners = np.stack([np.column_stack(c) for c in ((x0, y0), (x1, y0), (x1, y1), (x0, y1))], axis=1)
+        # animated: в полную перерисовку не входит, рисуется поверх фона (on_draw_event, blit)
+        self.selection_artist = PolyCollection(corners, facecolors=(1.0, 0.0, 0.0, 0.12),
+                                               edgecolors='red', linewidths=1.5, zorder=30, animated=True)
+        self.ax.add_collection(self.selection_artist, autolim=False)
+
+    def show_selection(self):
+        """Выделение изменилось, чертёж — нет: только подсветка поверх сохранённого фона."""
+        if self.drawn_size is None:
+            return
+        self.draw_selection()
+        if self.background is None:
+            self.draw()
+            return
+        self.restore_background()
+        self.blit(self.fig.bbox)
+        self.snap_shown = False
+
+    def show_selection_menu(self, event):
+        from PyQt5.QtWidgets import QMenu
+        from PyQt5.QtCore import QPoint
+
+        window = self.main_window
+        indices = list(window.selection)
+        menu = QMenu(window)
+        menu.addSection(f"Выделено: {len(indices)}")
+        actions = {
+            menu.addAction("Удалить"): lambda: window.delete_operations(indices),
+            menu.addAction("Сдвинуть на…"): lambda: window.move_operations_dialog(indices),
+        }
+        menu.addSeparator()
+        for axis in ("x", "y"):
+            actions[menu.addAction(f"Отразить по {axis.upper()}")] = \
+                lambda axis=axis: window.mirror_operations(indices, axis)
+            actions[menu.addAction(f"Отразить по {axis.upper()} с копированием")] = \
+                lambda axis=axis: window.mirror_operations(indices, axis, copy=True)
+        pos = QPoint(int(event.x), self.height() - int(event.y))
+        action = menu.exec_(self.mapToGlobal(pos))
+        if action in actions:
+            actions[action]()
+
+    def on_key(self, event):
+        window = self.main_window
+        if event.key == 'delete' and window.selection:
+            window.delete_operations(list(window.selection))
+        elif event.key == 'escape' and window.selection:
+            window.select_operations([])
 
     def show_context_menu(self, event, idx):
         from PyQt5.QtWidgets import QMenu
@@ -624,10 +946,11 @@ class PlotWidget(FigureCanvas):
             # Z1 только для торцевых
             if op["TypeName"] == "Horizontal Hole":
                 new_op["Z1"] = op.get("Z1", "8.00")
-            self.main_window.cad_operations.append(new_op)
+            self.main_window.add_operation(new_op)
         else:  # move
             op["X1"] = new_x
             op["Y1"] = new_y
+            self.main_window.replace_operation(idx, op)
 
         self.main_window.refresh_plot()
 
@@ -731,9 +1054,9 @@ class EditorWindow(QMainWindow):
 
                 self.save_state("Фрезеровка пилой")
                 if idx == -1:
-                    self.cad_operations.append(new_op)
+                    self.add_operation(new_op)
                 else:
-                    self.cad_operations[idx] = new_op
+                    self.replace_operation(idx, new_op)
 
                 self.refresh_plot()
                 dialog.accept()
@@ -747,7 +1070,7 @@ class EditorWindow(QMainWindow):
                                             QMessageBox.Yes | QMessageBox.No)
                 if reply == QMessageBox.Yes:
                     self.save_state("Удаление фрезеровки пилой")
-                    del self.cad_operations[idx]
+                    self.delete_operation(idx)
                     self.refresh_plot()
                     dialog.accept()
 
@@ -758,8 +1081,12 @@ class EditorWindow(QMainWindow):
 
 
     
-    def __init__(self):
+    def __init__(self, backend="matplotlib"):
+        """
+        :param backend: "matplotlib" — PlotWidget, "scene" — scene_view.SceneWidget (QGraphicsScene)
+        """
         super().__init__()
+        self.backend = backend
         self.setWindowTitle("Редактор УП — Минимализм")
         self.setGeometry(50, 30, 1300, 600)
         self.file_path = None
@@ -767,8 +1094,15 @@ class EditorWindow(QMainWindow):
         self.cad_operations = []
         self.undo_stack = []  # ← Стек для отмены
         self.max_undo_steps = 50  # Максимум шагов
+        self.journal = journal.new_session()  # ← Журнал правок этого окна для восстановления после падения
+        self.operation_index = OperationIndex()  # ← Индексы для запросов (список операций)
+        self.snap_index = SnapIndex()  # ← Точки привязки курсора на чертеже
+        self.selection = []            # ← Выделенные на чертеже операции (номера по возрастанию)
+        self.selection_program = None  # ← Список операций, к которому относится выделение
+        self.redraw = redraw.RedrawScheduler(self.redraw_plot, self)  # ← Правки одного действия — одна перерисовка
         self.init_ui()
         self.update_window_title()
+        QTimer.singleShot(0, self.offer_recovery)
 
     def edit_line_dialog(self, idx=-1):
         """
@@ -866,9 +1200,9 @@ class EditorWindow(QMainWindow):
                 }
 
                 if idx == -1:
-                    self.cad_operations.append(new_op)
+                    self.add_operation(new_op)
                 else:
-                    self.cad_operations[idx] = new_op
+                    self.replace_operation(idx, new_op)
 
                 self.refresh_plot()
                 dialog.accept()
@@ -884,7 +1218,7 @@ class EditorWindow(QMainWindow):
                                             QMessageBox.Yes | QMessageBox.No)
                 if reply == QMessageBox.Yes:
                     self.save_state("Удаление линии")  # ← Добавлено
-                    del self.cad_operations[idx]
+                    self.delete_operation(idx)
                     self.refresh_plot()
                     dialog.accept()
 
@@ -917,11 +1251,22 @@ class EditorWindow(QMainWindow):
         action_path = add_mill_menu.addAction("Путь фрезеровки")
         action_line = add_mill_menu.addAction("Линейная фрезеровка")
         action_saw = add_mill_menu.addAction("Фрезеровка пилой")
+        add_mill_menu.addSeparator()
+        action_simplify = add_mill_menu.addAction("Упростить пути фрезеровки")
 
         # Меню "Параметры детали"
         panel_menu = menu_bar.addMenu("Параметры детали")
         action_edit_panel = panel_menu.addAction("Изменить параметры детали")
 
+        # Меню "Вид"
+        view_menu = menu_bar.addMenu("Вид")
+
+        # Меню "Проверка"
+        check_menu = menu_bar.addMenu("Проверка")
+        action_validate = check_menu.addAction("Проверить программу")
+        action_diff = check_menu.addAction("Сравнить с файлом…")
+        action_clear_diff = check_menu.addAction("Сбросить сравнение")
+
         # === Привязка действий ===
         action_open.triggered.connect(self.open_xml)
         action_save.triggered.connect(self.save_xml)
@@ -935,8 +1280,12 @@ class EditorWindow(QMainWindow):
         action_path.triggered.connect(lambda: self.edit_path_dialog(-1))
         action_line.triggered.connect(lambda: self.edit_line_dialog(-1))
         action_saw.triggered.connect(lambda: self.edit_saw_line_dialog(-1))
+        action_simplify.triggered.connect(self.simplify_paths)
 
         action_edit_panel.triggered.connect(self.edit_panel_properties)
+        action_validate.triggered.connect(self.validate_program)
+        action_diff.triggered.connect(self.compare_with_file)
+        action_clear_diff.triggered.connect(lambda: self.plot.clear_diff())
 
         # === Поля параметров детали (опционально, можно оставить) ===
         params_layout = QHBoxLayout()
@@ -955,8 +1304,11 @@ class EditorWindow(QMainWindow):
         #params_layout.addWidget(self.thickness_input)
 
         # === Чертёж ===
-        self.plot = PlotWidget(self)
-        self.plot.fig.canvas.mpl_connect('button_press_event', self.plot.on_click)
+        if self.backend == "scene":
+            self.plot = SceneWidget(self)
+        else:
+            self.plot = PlotWidget(self)
+            self.plot.fig.canvas.mpl_connect('button_press_event', self.plot.on_click)
 
         # === Добавляем всё в layout ===
         main_layout.addLayout(params_layout)  # Можно убрать, если хочешь только меню
@@ -964,6 +1316,44 @@ class EditorWindow(QMainWindow):
         central_widget.setLayout(main_layout)
         self.setCentralWidget(central_widget)
 
+        # === Обзор файлов (миниатюры) ===
+        self.file_browser = FileBrowserDock(self)
+        self.addDockWidget(Qt.LeftDockWidgetArea, self.file_browser)
+        self.file_browser.hide()
+        view_menu.addAction(self.file_browser.toggleViewAction())
+
+        # === Обзор заказа (все детали папки плиткой) ===
+        self.order_dock = OrderDock(self)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.order_dock)
+        self.order_dock.hide()
+        view_menu.addAction(self.order_dock.toggleViewAction())
+
+        # === Список операций (для перекрывающихся отверстий, которые не достать кликом) ===
+        self.operations_dock = OperationsDock(self)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.operations_dock)
+        self.operations_dock.hide()
+        view_menu.addAction(self.operations_dock.toggleViewAction())
+        action_toolpaths = view_menu.addAction("Ширина фрезы")
+        action_toolpaths.setCheckable(True)
+        action_toolpaths.toggled.connect(self.plot.set_show_toolpaths)
+        if self.backend != "scene":
+            action_snap = view_menu.addAction("Привязка к отверстиям, вершинам и сетке")
+            action_snap.setCheckable(True)
+            action_snap.setChecked(True)
+            action_snap.toggled.connect(self.plot.set_snapping)
+
+        # === Автосохранение: после паузы в правках, запись в фоне ===
+        self.autosave_worker = autosave.AutosaveWorker(parent=self)
+        self.autosave_worker.saved.connect(
+            lambda path: self.statusBar().showMessage(f"Автосохранено: {path}", 5000))
+        self.autosave_worker.failed.connect(
+            lambda error: self.statusBar().showMessage(f"Автосохранение не удалось: {error}", 10000))
+        self.autosave_worker.start()
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.setSingleShot(True)
+        self.autosave_timer.setInterval(autosave.DELAY_MS)
+        self.autosave_timer.timeout.connect(self.autosave_now)
+
         # === Привязка обновления данных ===
         self.name_input.editingFinished.connect(self.update_panel_data)
         self.length_input.editingFinished.connect(self.update_panel_data)
@@ -988,6 +1378,7 @@ class EditorWindow(QMainWindow):
         state = self.undo_stack.pop()
         self.panel_data = state["panel_data"]
         self.cad_operations = state["cad_operations"]
+        self.checkpoint()
 
         # Обновляем интерфейс
         if hasattr(self, 'name_input'):
@@ -1000,19 +1391,20 @@ class EditorWindow(QMainWindow):
         QMessageBox.information(self, "Отменено", f"Действие '{state['action']}' отменено.")        
 
 
-    def add_hole(self, hole_type):
+    def add_hole(self, hole_type, x="0", y="0"):
         """
         Унифицированное добавление отверстия по типу.
         Поддерживает формулы: L-100, W/2 и т.д.
         Для "Торцевое" — проверяет, что на торце.
+        x, y — начальные координаты (правый клик по чертежу — точка привязки).
         """
         dialog = QDialog(self)
         dialog.setWindowTitle("Добавить отверстие")
         dialog.resize(300, 250)
         layout = QVBoxLayout()
 
-        x_input = QLineEdit("0")
-        y_input = QLineEdit("0")
+        x_input = QLineEdit(x)
+        y_input = QLineEdit(y)
         diam_input = QLineEdit("5")
         depth_input = QLineEdit("16")
 
@@ -1062,18 +1454,11 @@ class EditorWindow(QMainWindow):
                 except:
                     W_val = 0.0
 
-                # Вычисляем координаты
-                x_val = evaluate_expression(x_str, L_val, W_val)
-                y_val = evaluate_expression(y_str, L_val, W_val)
-
-                # Проверка: только для "Торцевое"
+                # Проверка: только для "Торцевое" — общим движком проверки
                 if hole_type == "Horizontal Hole":
-                    tolerance = 0.1
-                    is_on_edge = (
-                        abs(x_val) < tolerance or
-                        abs(x_val - L_val) < tolerance or
-                        abs(y_val) < tolerance or
-                        abs(y_val - W_val) < tolerance
+                    probe = {"TypeName": hole_type, "X1": x_str, "Y1": y_str}
+                    is_on_edge = not validation.validate(
+                        self.panel_data, [probe], rules=["hole_in_panel", "horizontal_on_edge"]
                     )
                     if not is_on_edge:
                         QMessageBox.warning(
@@ -1094,7 +1479,7 @@ class EditorWindow(QMainWindow):
                     "Diameter": diam,
                     "Depth": depth
                 }
-                self.cad_operations.append(new_op)
+                self.add_operation(new_op)
                 self.refresh_plot()
                 dialog.accept()
 
@@ -1149,8 +1534,9 @@ class EditorWindow(QMainWindow):
                 self.panel_data["PanelLength"] = to_float(length_input.text())
                 self.panel_data["PanelWidth"] = to_float(width_input.text())
                 self.panel_data["PanelThickness"] = to_float(thickness_input.text())
+                self.panel_changed()
 
-                self.refresh_plot()
+                self.refresh_panel_size()
                 dialog.accept()
             except ValueError:
                 QMessageBox.critical(dialog, "Ошибка", "Введите корректные числовые значения!")
@@ -1166,28 +1552,67 @@ class EditorWindow(QMainWindow):
         file_path, _ = QFileDialog.getOpenFileName(self, "Открыть XML", "", "XML Files (*.xml)")
         if not file_path:
             return
-        self.file_path = file_path
-        self.panel_data, self.cad_operations = xml_handler.load_xml(file_path)
-        self.file_path = file_path
-        self.update_window_title()  # ← Новый метод
-        self.refresh_plot()
+        self.load_file(file_path)
+
+    def load_file(self, file_path):
+        """Открывает УП по пути (из диалога или из обзора файлов)."""
+        with metrics.timer("open_file"):
+            try:
+                panel_data, operations = parse_cache.load_xml_cached(file_path)
+            except Exception as e:
+                # Файл не разобрался — текущая программа остаётся открытой
+                QMessageBox.critical(self, "Ошибка", f"Не удалось открыть файл:\n{file_path}\n\n{e}")
+                return
+            self.panel_data, self.cad_operations = panel_data, operations
+            self.file_path = file_path
+            self.checkpoint(dirty=False)
+            self.update_window_title()  # ← Новый метод
+            self.refresh_plot()
+        metrics.log_event("file.opened", path=file_path, operations=len(self.cad_operations))
 
     def refresh_plot(self):
+        """
+        Программа изменилась. Список операций и индексы обновляются сразу,
+        чертёж — один раз за проход цикла событий (redraw.RedrawScheduler).
+        """
+        self.sync_program()
+        self.redraw.request(redraw.FULL)
+
+    def refresh_panel_size(self):
+        """После изменения параметров детали: перерисовка только зависящих от L/W операций."""
+        self.sync_program()
+        self.redraw.request(redraw.SIZE)
+
+    def sync_program(self):
+        try:
+            length = float(self.panel_data.get("PanelLength", 0))
+            width = float(self.panel_data.get("PanelWidth", 0))
+            self.operation_index.set_program(self.cad_operations, length, width)
+            self.snap_index.set_program(self.cad_operations, length, width)
+            if self.selection_program is not self.cad_operations:
+                # Новая программа (открытие, отмена, восстановление): старое выделение
+                # и сравнение не к ней
+                self.selection = []
+                self.selection_program = self.cad_operations
+                self.plot.drop_diff()
+            self.operations_dock.set_program(self.cad_operations, length, width)
+        except Exception as e:
+            metrics.log_event("refresh_plot.failed", logging.ERROR, error=e)
+
+    def redraw_plot(self, kind):
+        """Отложенная перерисовка: kind — redraw.SIZE (только размер детали) или redraw.FULL."""
         try:
             length = float(self.panel_data.get("PanelLength", 0))
             width = float(self.panel_data.get("PanelWidth", 0))
             if length > 0 and width > 0:
-                self.plot.draw_operations(
-                    self.cad_operations,
-                    length,
-                    width
-                )
+                if kind == redraw.SIZE:
+                    self.plot.update_panel_size(self.cad_operations, length, width)
+                else:
+                    self.plot.draw_operations(self.cad_operations, length, width)
             else:
-                self.plot.clear_plot()
-                self.plot.ax.text(0.5, 0.5, 'Укажите размеры детали', transform=self.plot.ax.transAxes, ha='center')
-                self.plot.draw()
+                self.plot.show_message('Укажите размеры детали')
         except Exception as e:
-            print(f"Ошибка: {e}")
+            metrics.log_event("refresh_plot.failed", logging.ERROR, error=e)
 
     def update_window_title(self):
         """
@@ -1293,18 +1718,11 @@ class EditorWindow(QMainWindow):
                 except:
                     W_val = 0.0
 
-                # Вычисляем X и Y
-                x_val = evaluate_expression(x_str, L_val, W_val)
-                y_val = evaluate_expression(y_str, L_val, W_val)
-
-                # Проверка: только для "Торцевое"
+                # Проверка: только для "Торцевое" — общим движком проверки
                 if type_internal == "Horizontal Hole":
-                    tolerance = 0.1
-                    is_on_edge = (
-                        abs(x_val) < tolerance or           # Правый торец: X ≈ 0
-                        abs(x_val - L_val) < tolerance or   # Левый торец: X ≈ L
-                        abs(y_val) < tolerance or           # Верхний торец: Y ≈ 0
-                        abs(y_val - W_val) < tolerance      # Нижний торец: Y ≈ W
+                    probe = {"TypeName": type_internal, "X1": x_str, "Y1": y_str}
+                    is_on_edge = not validation.validate(
+                        self.panel_data, [probe], rules=["hole_in_panel", "horizontal_on_edge"]
                     )
                     if not is_on_edge:
                         QMessageBox.warning(
@@ -1327,9 +1745,9 @@ class EditorWindow(QMainWindow):
                 }
 
                 if idx == -1:
-                    self.cad_operations.append(new_op)
+                    self.add_operation(new_op)
                 else:
-                    self.cad_operations[idx] = new_op
+                    self.replace_operation(idx, new_op)
 
                 self.refresh_plot()
                 dialog.accept()
@@ -1343,7 +1761,7 @@ class EditorWindow(QMainWindow):
                                             QMessageBox.Yes | QMessageBox.No)
                 if reply == QMessageBox.Yes:
                     self.save_state("Удаление отверстия")
-                    del self.cad_operations[idx]
+                    self.delete_operation(idx)
                     self.refresh_plot()
                     dialog.accept()
 
@@ -1354,57 +1772,39 @@ class EditorWindow(QMainWindow):
         
 
     def edit_path_dialog(self, idx=-1):
-        from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QComboBox, \
-            QTableWidget, QTableWidgetItem, QMessageBox
+        """
+        Вершины пути — path_editor.VertexModel прямо над списком вершин (без виджетов в ячейках).
+        Правки сразу видны на чертеже: перерисовывается только этот путь (show_preview).
+        """
+        from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, \
+            QTableView, QAbstractItemView, QHeaderView, QApplication, QMessageBox
 
         dialog = QDialog(self)
         dialog.setWindowTitle("Редактирование пути фрезеровки" if idx >= 0 else "Добавить путь фрезеровки")
         dialog.resize(700, 500)
 
         layout = QVBoxLayout()
-        table = QTableWidget()
-        table.setColumnCount(5)
-        table.setHorizontalHeaderLabels(["Тип", "X1", "Y1", "Radius", "Напр."])
-        table.setRowCount(0)
-
-        # Заполняем таблицу, если редактируем
-        if idx >= 0:
-            op = self.cad_operations[idx]
-            vertexes = op.get("Vertexes", [])
-            for i, v in enumerate(vertexes):
-                row = table.rowCount()
-                table.insertRow(row)
-                if i == 0:
-                    type_combo = QComboBox()
-                    type_combo.addItems(["Point"])
-                    type_combo.setEnabled(False)
-                    table.setCellWidget(row, 0, type_combo)
-                else:
-                    type_combo = QComboBox()
-                    type_combo.addItems(["Line", "Arc"])
-                    type_combo.setCurrentText(v["type"])
-                    table.setCellWidget(row, 0, type_combo)
-                table.setItem(row, 1, QTableWidgetItem(v.get("X1", "0")))
-                table.setItem(row, 2, QTableWidgetItem(v.get("Y1", "0")))
-                if v["type"] == "Arc":
-                    table.setItem(row, 3, QTableWidgetItem(v.get("Radius", "0")))
-                    dir_combo = QComboBox()
-                    dir_combo.addItems(["0", "1"])
-                    dir_combo.setCurrentText(v.get("Direction", "1"))
-                    table.setCellWidget(row, 4, dir_combo)
-                else:
-                    table.setItem(row, 3, QTableWidgetItem(""))
-                    table.setItem(row, 4, QTableWidgetItem(""))
+        # Рабочая копия вершин: «Отмена» не трогает программу
+        vertexes = [dict(v) for v in self.cad_operations[idx].get("Vertexes", [])] if idx >= 0 else []
+        model = path_editor.VertexModel(vertexes, dialog)
+        table = QTableView()
+        table.setModel(model)
+        table.setItemDelegate(path_editor.VertexDelegate(table))
+        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        table.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        table.verticalHeader().setDefaultSectionSize(22)
+        table.horizontalHeader().setStretchLastSection(True)
 
         # Кнопки добавления
         btn_layout = QHBoxLayout()
-        btn_add_point = QPushButton("Начальная точка")
         btn_add_line = QPushButton("Добавить Line")
         btn_add_arc = QPushButton("Добавить Arc")
-        btn_delete_vertex = QPushButton("Удалить вершину")
-        btn_layout.addWidget(btn_add_point)
+        btn_paste = QPushButton("Вставить из буфера")
+        btn_delete_vertex = QPushButton("Удалить вершины")
         btn_layout.addWidget(btn_add_line)
         btn_layout.addWidget(btn_add_arc)
+        btn_layout.addWidget(btn_paste)
         btn_layout.addWidget(btn_delete_vertex)
 
         # Поля ширины и глубины
@@ -1433,75 +1833,71 @@ class EditorWindow(QMainWindow):
         btn_layout.addWidget(btn_delete_path)
         btn_layout.addWidget(btn_ok)
         btn_layout.addWidget(btn_cancel)
-        
-        layout.addWidget(QLabel("Вершины пути:"))
+
+        vertex_count = QLabel()
+        layout.addWidget(vertex_count)
         layout.addWidget(table)
         layout.addLayout(width_layout)
         layout.addLayout(btn_layout)
         dialog.setLayout(layout)
 
-        # Функции добавления вершин
-        def add_vertex(vertex_type, x="0", y="0", radius="", direction="1"):
-            row = table.rowCount()
-            table.insertRow(row)
-            if vertex_type == "Point":
-                type_combo = QComboBox()
-                type_combo.addItems(["Point"])
-                type_combo.setEnabled(False)
-                table.setCellWidget(row, 0, type_combo)
-                table.setItem(row, 1, QTableWidgetItem(x))
-                table.setItem(row, 2, QTableWidgetItem(y))
-                table.setItem(row, 3, QTableWidgetItem(""))
-                table.setItem(row, 4, QTableWidgetItem(""))
-            else:
-                type_combo = QComboBox()
-                type_combo.addItems(["Line", "Arc"])
-                type_combo.setCurrentText(vertex_type)
-                table.setCellWidget(row, 0, type_combo)
-                table.setItem(row, 1, QTableWidgetItem(x))
-                table.setItem(row, 2, QTableWidgetItem(y))
-                table.setItem(row, 3, QTableWidgetItem(radius))
-                dir_combo = QComboBox()
-                dir_combo.addItems(["0", "1"])
-                dir_combo.setCurrentText(direction)
-                table.setCellWidget(row, 4, dir_combo)
+        # Предпросмотр: правки, пришедшие в пределах 30 мс, — одна перерисовка пути
+        preview_timer = QTimer(dialog)
+        preview_timer.setSingleShot(True)
+        preview_timer.setInterval(30)
+
+        def preview():
+            vertex_count.setText(f"Вершины пути: {len(vertexes)}")
+            L_val, W_val = renderer.panel_size(self.panel_data)
+            try:
+                polyline = toolpath.path_polyline(vertexes, L_val, W_val)
+            except Exception as e:
+                metrics.log_event("path_preview.failed", logging.WARNING, error=e)
+                return
+            with metrics.timer("path_preview"):
+                self.plot.show_preview(polyline)
+
+        preview_timer.timeout.connect(preview)
+        for signal in (model.dataChanged, model.rowsInserted, model.rowsRemoved):
+            signal.connect(preview_timer.start)
+        dialog.finished.connect(lambda _: (preview_timer.stop(), self.plot.clear_preview()))
+        preview_timer.start()
+
+        # Вставка вершин: после текущей строки или в конец
+        def insert_at():
+            rows = table.selectionModel().selectedRows()
+            return max(i.row() for i in rows) + 1 if rows else model.rowCount()
+
+        def add_vertex(vertex_type):
+            row = insert_at()
+            model.insert_vertices(row, [path_editor.make_vertex(vertex_type)])
+            table.selectRow(row)
+            table.scrollTo(model.index(row, 0))
+
+        def paste_vertices():
+            try:
+                new_vertices = path_editor.parse_vertices(QApplication.clipboard().text())
+            except ValueError as e:
+                QMessageBox.warning(dialog, "Вставка", str(e))
+                return
+            row = insert_at()
+            model.insert_vertices(row, new_vertices)
+
+        def delete_vertices():
+            model.remove_vertices([i.row() for i in table.selectionModel().selectedRows()])
 
         # Привязка кнопок
-        btn_add_point.clicked.connect(lambda: add_vertex("Point", "0", "0"))
-        btn_add_line.clicked.connect(lambda: add_vertex("Line", "0", "0"))
-        btn_add_arc.clicked.connect(lambda: add_vertex("Arc", "0", "0", "0", "1"))
-        btn_delete_vertex.clicked.connect(lambda: table.removeRow(table.currentRow()))
+        btn_add_line.clicked.connect(lambda: add_vertex("Line"))
+        btn_add_arc.clicked.connect(lambda: add_vertex("Arc"))
+        btn_paste.clicked.connect(paste_vertices)
+        btn_delete_vertex.clicked.connect(delete_vertices)
 
-        # Обработчик сохранения
+        # Обработчик сохранения: вершины уже в vertexes, таблица не перечитывается
         def on_ok():
-            self.save_state("Редактирование пути фрезеровки")  # ←
-            if table.rowCount() == 0:
+            if not vertexes:
                 QMessageBox.warning(dialog, "Ошибка", "Добавьте хотя бы начальную точку")
                 return
-
-            vertexes = []
-            for row in range(table.rowCount()):
-                item0 = table.cellWidget(row, 0)
-                x_item = table.item(row, 1)
-                y_item = table.item(row, 2)
-                radius_item = table.item(row, 3)
-                dir_item = table.cellWidget(row, 4)
-                if not x_item or not y_item:
-                    continue
-                x = x_item.text().strip()
-                y = y_item.text().strip()
-                if row == 0:
-                    vertexes.append({"type": "Point", "X1": x, "Y1": y, "Z1": "0.00", "VertexType": "0"})
-                else:
-                    base = {"X1": x, "Y1": y, "Z1": "0.00", "VertexType": "0"}
-                    t = item0.currentText()
-                    if t == "Line":
-                        base["type"] = "Line"
-                    elif t == "Arc":
-                        base["type"] = "Arc"
-                        base["Radius"] = radius_item.text().strip() if radius_item else "0"
-                        base["Direction"] = dir_item.currentText() if dir_item else "1"
-                    vertexes.append(base)
+            self.save_state("Редактирование пути фрезеровки")  # ←
 
             new_op = {
                 "TypeName": "Path",
@@ -1512,11 +1908,11 @@ class EditorWindow(QMainWindow):
             }
 
             if idx >= 0:
-                self.cad_operations[idx] = new_op
+                self.replace_operation(idx, new_op)
                 self.refresh_plot()
                 dialog.accept()  # Закрываем диалог
             else:
-                self.cad_operations.append(new_op)
+                self.add_operation(new_op)
                 self.refresh_plot()
                 dialog.accept()
 
@@ -1531,7 +1927,7 @@ class EditorWindow(QMainWindow):
             )
             if reply == QMessageBox.Yes:
                 self.save_state("Удаление пути фрезеровки")  # ←
-                del self.cad_operations[idx]
+                self.delete_operation(idx)
                 self.refresh_plot()
                 dialog.accept()  # Закрываем диалог
 
@@ -1557,12 +1953,13 @@ class EditorWindow(QMainWindow):
             self.panel_data["PanelLength"] = to_float(self.length_input.text())
             self.panel_data["PanelWidth"] = to_float(self.width_input.text())
             self.panel_data["PanelThickness"] = to_float(self.thickness_input.text())
+            self.panel_changed()
 
             # Обновляем чертёж (и заголовок)
-            self.refresh_plot()
+            self.refresh_panel_size()
 
         except Exception as e:
-            print(f"Ошибка обновления данных детали: {e}")
+            metrics.log_event("panel_data.invalid", logging.WARNING, error=e)
             QMessageBox.critical(self, "Ошибка", f"Некорректные данные: {e}")
 
 
@@ -1584,25 +1981,317 @@ class EditorWindow(QMainWindow):
             file_path += '.xml'
 
         try:
-            xml_handler.save_xml(file_path, self.panel_data, self.cad_operations)
+            findings = xml_handler.save_xml(file_path, self.panel_data, self.cad_operations)
             # Обновляем текущий путь (если захочешь добавить "Сохранить" позже)
             self.file_path = file_path
-            QMessageBox.information(self, "Сохранено", f"Файл успешно сохранён!\n{file_path}")
+            removed = len({f["index"] for f in findings if f["severity"] == "error"})
+            message = f"Файл успешно сохранён!\n{file_path}"
+            if removed:
+                message += f"\n\nНе сохранено операций с ошибками: {removed}\n(см. Проверка → Проверить программу)"
+            QMessageBox.information(self, "Сохранено", message)
             self.file_path = file_path
+            self.checkpoint(dirty=False, reset=False)
             self.update_window_title()
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить файл:\n{e}")
 
+    def closeEvent(self, event):
+        self.redraw.cancel()
+        metrics.log_event("redraw.stats", **self.redraw.stats())
+        self.file_browser.shutdown()
+        self.order_dock.shutdown()
+        self.autosave_timer.stop()
+        self.autosave_worker.stop()
+        self.journal.discard()
+        super().closeEvent(event)
+
+    def validate_program(self):
+        """
+        Проверяет программу тем же движком, что и save_xml, и показывает отчёт.
+        Первая операция с замечанием подсвечивается на чертеже.
+        """
+        findings = validation.validate(self.panel_data, self.cad_operations)
+        if not findings:
+            QMessageBox.information(self, "Проверка", "Замечаний нет.")
+            return
+
+        max_lines = 40
+        report = validation.format_report(findings[:max_lines], self.cad_operations)
+        if len(findings) > max_lines:
+            report += f"\n... и ещё {len(findings) - max_lines}"
+        errors = sum(1 for f in findings if f["severity"] == "error")
+
+        self.plot.highlight_element(findings[0]["index"])
+        QMessageBox.warning(
+            self, "Проверка",
+            f"Замечаний: {len(findings)}, из них ошибок: {errors}\n"
+            f"(операции с ошибками не будут сохранены)\n\n{report}"
+        )
+
+    def simplify_paths(self):
+        """
+        Упрощает все пути фрезеровки (path_simplify): мелкие отрезки
+        сливаются в длинные и в дуги. Отменяется одним шагом.
+        """
+        with metrics.timer("simplify_paths"):
+            operations, changed = path_simplify.simplify_program(self.panel_data, self.cad_operations)
+        if changed:
+            self.save_state("Упрощение путей фрезеровки")
+            self.replace_operations([(idx, operations[idx]) for idx in changed])
+            self.refresh_plot()
+        QMessageBox.information(self, "Упрощение путей", path_simplify.format_stats(changed))
+
+    def compare_with_file(self):
+        """
+        Сравнивает текущую программу с другой версией файла
+        и показывает различия поверх чертежа.
+        """
+        file_path, _ = QFileDialog.getOpenFileName(self, "Сравнить с (старая версия)", "", "XML Files (*.xml)")
+        if not file_path:
+            return
+        try:
+            old_program = parse_cache.load_xml_cached(file_path)
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось прочитать файл:\n{e}")
+            return
+
+        diff = program_diff.diff_programs(old_program, (self.panel_data, self.cad_operations))
+        self.plot.show_diff(diff)
+
+        report = program_diff.format_diff(diff, old_program[1], self.cad_operations).split("\n")
+        max_lines = 40
+        text = "\n".join(report[:max_lines])
+        if len(report) > max_lines:
+            text += f"\n... и ещё {len(report) - max_lines}"
+        QMessageBox.information(self, "Сравнение", f"{file_path}\n\n{text}")
+
+    # === Правки программы (все изменения идут через журнал) ===
+
+    def add_operation(self, op):
+        self.cad_operations.append(op)
+        self.operation_index.operation_added(len(self.cad_operations) - 1)
+        self.snap_index.operation_added(len(self.cad_operations) - 1)
+        self.operations_dock.operation_added(len(self.cad_operations) - 1)
+        self.record_edit("add", len(self.cad_operations) - 1, op)
+
+    def replace_operation(self, idx, op):
+        self.cad_operations[idx] = op
+        self.operation_index.operation_changed(idx)
+        self.snap_index.operation_changed(idx)
+        self.operations_dock.operation_changed(idx)
+        self.record_edit("modify", idx, op)
+
+    def delete_operation(self, idx):
+        del self.cad_operations[idx]
+        self.operation_index.operation_removed(idx)
+        self.snap_index.operation_removed(idx)
+        if self.selection:
+            self.selection = [i - (i > idx) for i in self.selection if i != idx]
+        self.operations_dock.operation_removed(idx)
+        self.record_edit("delete", idx)
+
+    # Правки пачкой: список меняется разом, в журнал — одна запись "batch" (один fsync),
+    # индексы и список операций обновляются один раз
+
+    def replace_operations(self, changes):
+        """changes — [(номер, новая операция), ...]."""
+        indices = [idx for idx, _ in changes]
+        for idx, op in changes:
+            self.cad_operations[idx] = op
+        self.operation_index.operations_changed(indices)
+        self.snap_index.operations_changed(indices)
+        self.operations_dock.operations_changed(indices)
+        self.record_edit("batch", data=[{"op": "modify", "index": idx, "data": op} for idx, op in changes])
+
+    def add_operations(self, operations):
+        """Дописывает операции в конец программы."""
+        first = len(self.cad_operations)
+        self.cad_operations.extend(operations)
+        self.operation_index.operations_added(first)
+        self.snap_index.operations_added(first)
+        self.operations_dock.operations_added(first)
+        self.record_edit("batch", data=[{"op": "add", "index": first + i, "data": op}
+                                        for i, op in enumerate(operations)])
+
+    def remove_operations(self, indices):
+        """Удаляет операции indices (номера до удаления); выделение пересчитывается один раз."""
+        deleted = np.unique(np.asarray(indices, dtype=np.int64))
+        drop = set(deleted.tolist())
+        self.cad_operations[:] = [op for i, op in enumerate(self.cad_operations) if i not in drop]
+        self.operation_index.operations_removed(deleted)
+        self.snap_index.operations_removed(deleted)
+        if self.selection:
+            selected = np.setdiff1d(np.asarray(self.selection, dtype=np.int64), deleted)
+            self.selection = (selected - np.searchsorted(deleted, selected)).tolist()
+        self.operations_dock.operations_removed(deleted)
+        # С конца: номера ещё не удалённых не сдвигаются
+        self.record_edit("batch", data=[{"op": "delete", "index": int(idx)} for idx in deleted[::-1]])
+
+    def move_operations(self, indices, dx, dy, vertex=None):
+        """
+        Сдвигает операции на (dx, dy) мм одним шагом отмены; формулы координат
+        сохраняются (move_ops.shift_coord). vertex — сдвинуть только эту вершину Path.
+        """
+        self.save_state(f"Перемещение операций ({len(indices)})")
+        self.replace_operations([(idx, move_ops.moved_operation(self.cad_operations[idx], dx, dy, vertex))
+                                 for idx in indices])
+        self.refresh_plot()
+        metrics.log_event("operations.moved", count=len(indices), dx=round(dx, 2), dy=round(dy, 2))
+
+    def mirror_operations(self, indices, axis, copy=False):
+        """
+        Отражает операции по оси axis ("x"/"y") одним шагом отмены; copy — исходные
+        остаются, отражённые копии добавляются в конец и становятся выделением.
+        """
+        if not indices:
+            return
+        self.save_state(f"Отражение операций ({len(indices)})")
+        mirrored = [move_ops.mirrored_operation(self.cad_operations[idx], axis) for idx in indices]
+        if copy:
+            first = len(self.cad_operations)
+            self.add_operations(mirrored)
+            self.selection = list(range(first, len(self.cad_operations)))
+        else:
+            self.replace_operations(list(zip(indices, mirrored)))
+        self.refresh_plot()
+        metrics.log_event("operations.mirrored", count=len(indices), axis=axis, copy=copy)
+
+    def move_operations_dialog(self, indices):
+        """Сдвиг выделенных операций на заданные dX, dY."""
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"Сдвинуть операции ({len(indices)})")
+        layout = QVBoxLayout()
+        dx_input = QLineEdit("0")
+        dy_input = QLineEdit("0")
+        form_layout = QFormLayout()
+        form_layout.addRow("Сдвиг по X, мм:", dx_input)
+        form_layout.addRow("Сдвиг по Y, мм:", dy_input)
+        layout.addLayout(form_layout)
+        btn_layout = QHBoxLayout()
+        ok_btn = QPushButton("Сдвинуть")
+        cancel_btn = QPushButton("Отмена")
+        btn_layout.addWidget(ok_btn)
+        btn_layout.addWidget(cancel_btn)
+        layout.addLayout(btn_layout)
+        dialog.setLayout(layout)
+
+        def save():
+            try:
+                dx = float(dx_input.text().replace(",", "."))
+                dy = float(dy_input.text().replace(",", "."))
+            except ValueError:
+                QMessageBox.critical(dialog, "Ошибка", "Сдвиг должен быть числом!")
+                return
+            if dx or dy:
+                self.move_operations(indices, dx, dy)
+            dialog.accept()
+
+        ok_btn.clicked.connect(save)
+        cancel_btn.clicked.connect(dialog.reject)
+        dialog.exec_()
+
+    def select_operations(self, indices):
+        """Выделение на чертеже (рамка, лассо, Ctrl+щелчок); пустой список — снять."""
+        self.selection = sorted(int(i) for i in set(indices))
+        self.selection_program = self.cad_operations
+        self.plot.show_selection()
+        self.statusBar().showMessage(f"Выделено операций: {len(self.selection)}", 5000)
+
+    def delete_operations(self, indices):
+        """Удаляет несколько операций одним шагом отмены."""
+        self.save_state(f"Удаление операций ({len(indices)})")
+        self.remove_operations(indices)
+        self.refresh_plot()
+
+    def panel_changed(self):
+        self.record_edit("panel", data=self.panel_data)
+
+    def record_edit(self, kind, index=None, data=None):
+        """Дописывает правку в журнал; время от времени сжимает его в снимок."""
+        self.plot.drop_diff()
+        try:
+            if self.journal.append(kind, index, data):
+                self.compact_journal()
+        except OSError as e:
+            metrics.log_event("journal.write_failed", logging.WARNING, error=e)
+        self.autosave_timer.start()  # ← перезапуск: пишем, когда правки утихнут
+
+    def compact_journal(self, dirty=True, reset=False):
+        """Снимок журнала: копия на GUI-потоке, запись — в фоне (autosave.AutosaveWorker)."""
+        snapshot = self.journal.start_compaction(
+            self.file_path, self.panel_data, self.cad_operations, dirty=dirty, reset=reset)
+        self.autosave_worker.submit_compaction(self.journal, snapshot)
+
+    def checkpoint(self, dirty=True, reset=True):
+        """
+        Снимок всего состояния вместо отдельных записей: после открытия,
+        сохранения (dirty=False, reset=False — состояние то же) и отмены
+        (состояние заменяется целиком).
+        """
+        try:
+            self.compact_journal(dirty=dirty, reset=reset)
+        except OSError as e:
+            metrics.log_event("journal.write_failed", logging.WARNING, error=e)
+        if dirty:
+            self.autosave_timer.start()
+        else:
+            self.autosave_timer.stop()
+
+    def autosave_now(self):
+        """Снимок на GUI-потоке, запись — в фоне (autosave.AutosaveWorker)."""
+        self.autosave_worker.submit(
+            autosave.take_snapshot(self.file_path, self.panel_data, self.cad_operations))
+
+    def offer_recovery(self):
+        """
+        При запуске: предлагает восстановить сеансы, оборвавшиеся без сохранения
+        (свежие первыми). Восстановленный сеанс переходит в журнал этого окна,
+        остальные брошенные ждут следующего запуска.
+        """
+        orphans = journal.orphaned_sessions()
+        for number, orphan in enumerate(orphans):
+            try:
+                session = orphan.recover()
+            except Exception as e:
+                metrics.log_event("journal.recover_failed", logging.ERROR, error=e)
+                session = None
+            if session is None:
+                orphan.discard()
+                continue
+
+            name = session["file_path"] or "новая программа"
+            reply = QMessageBox.question(
+                self, "Восстановление",
+                f"Предыдущий сеанс завершился без сохранения.\n{name}\n"
+                f"Операций: {len(session['operations'])}\n\nВосстановить несохранённые правки?",
+                QMessageBox.Yes | QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                orphan.discard()
+                continue
+
+            self.file_path = session["file_path"]
+            self.panel_data = session["panel_data"]
+            self.cad_operations = session["operations"]
+            self.checkpoint()
+            orphan.discard()
+            for rest in orphans[number + 1:]:
+                rest.unlock()
+            self.update_window_title()
+            self.refresh_plot()
+            return
+
     def save_state(self, action_name="Изменение"):
         """
         Сохраняет текущее состояние в стеке отмены.
         """
         import copy
-        state = {
-            "panel_data": copy.deepcopy(self.panel_data),
-            "cad_operations": copy.deepcopy(self.cad_operations),
-            "action": action_name
-        }
+        with metrics.timer("undo_snapshot"):
+            state = {
+                "panel_data": copy.deepcopy(self.panel_data),
+                "cad_operations": copy.deepcopy(self.cad_operations),
+                "action": action_name
+            }
         self.undo_stack.append(state)
         if len(self.undo_stack) > self.max_undo_steps:
             self.undo_stack.pop(0)  # Удаляем самый старый            
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Семейство деталей по шаблону: одна УП с формулами (L-32, W/2...)
+и таблица размеров → по XML на каждую строку.
+
+Таблица — CSV (разделитель ; , или табуляция, дробная часть через запятую
+или точку). Столбцы: L, W, T, имя, количество; заголовок необязателен
+(без него столбцы берутся по порядку):
+
+    L;W;T;name;quantity
+    716;560;16;Бок 716;2
+    896;560;16;Бок 896;2
+
+Каждая программа проходит проверку save_xml (операции с ошибками для этого
+размера не сохраняются) и пишется быстрым сериализатором xml_handler.pretty_xml.
+Строки таблицы распределяются по процессам пула.
+
+    python family.py шаблон.xml размеры.csv папка_вывода/ --jobs 8
+    python family.py --bench 2000
+"""
+import csv
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+import xml_handler
+
+
+COLUMNS = ("L", "W", "T", "name", "quantity")
+HEADER_ALIASES = {
+    "l": "L", "длина": "L",
+    "w": "W", "ширина": "W",
+    "t": "T", "толщина": "T",
+    "name": "name", "имя": "name", "название": "name",
+    "quantity": "quantity", "qty": "quantity", "количество": "quantity", "кол-во": "quantity",
+}
+
+
+class _Semicolon(csv.excel):
+    delimiter = ";"
+
+
+def read_sizes(csv_path):
+    """Строки таблицы размеров: [{"L", "W", "T", "name", "quantity"}, ...]."""
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+        except csv.Error:
+            dialect = _Semicolon
+        rows = [row for row in csv.reader(f, dialect) if any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+
+    header = [HEADER_ALIASES.get(cell.strip().lower()) for cell in rows[0]]
+    if "L" in header and "W" in header:
+        columns = header
+        rows = rows[1:]
+    else:
+        columns = list(COLUMNS)
+
+    sizes = []
+    for line_no, row in enumerate(rows, 1):
+        values = {col: cell.strip() for col, cell in zip(columns, row) if col}
+        try:
+            size = {
+                "L": xml_handler.format_num(_number(values["L"])),
+                "W": xml_handler.format_num(_number(values["W"])),
+                "T": xml_handler.format_num(_number(values.get("T") or "0")),
+                "name": values.get("name", ""),
+                "quantity": values.get("quantity") or "1",
+            }
+        except (KeyError, ValueError) as e:
+            raise ValueError(f"{csv_path}: строка {line_no}: {e}") from None
+        sizes.append(size)
+    return sizes
+
+
+def _number(text):
+    value = float(text.replace(",", "."))
+    if value < 0:
+        raise ValueError(f"отрицательный размер {text}")
+    return str(value)
+
+
+def instantiate(template_panel, size):
+    """panel_data программы для одного размера (операции шаблона не меняются)."""
+    panel_data = dict(template_panel)
+    panel_data["PanelLength"] = size["L"]
+    panel_data["PanelWidth"] = size["W"]
+    if size["T"] != "0":
+        panel_data["PanelThickness"] = size["T"]
+    if size["name"]:
+        panel_data["PanelName"] = size["name"]
+    panel_data["PanelQuantity"] = size["quantity"]
+    return panel_data
+
+
+def output_names(template_path, sizes):
+    """Имена файлов: по имени детали или шаблон_LxWxT; повторы получают _2, _3..."""
+    stem = os.path.splitext(os.path.basename(template_path))[0]
+    used = {}
+    names = []
+    for size in sizes:
+        base = size["name"] or f"{stem}_{size['L']}x{size['W']}x{size['T']}"
+        base = re.sub(r'[\\/:*?"<>|]+', "_", base).strip() or stem
+        n = used.get(base.lower(), 0) + 1
+        used[base.lower()] = n
+        names.append(f"{base}.xml" if n == 1 else f"{base}_{n}.xml")
+    return names
+
+
+# === Пул процессов ===
+
+_template = None
+
+
+def _init_worker(template_path):
+    """Каждый процесс читает шаблон один раз."""
+    global _template
+    logging.getLogger("up_editor").disabled = True
+    _template = xml_handler.load_xml(template_path)
+
+
+def _generate_job(args):
+    size, out_path = args
+    panel_template, operations = _template
+    try:
+        findings = xml_handler.save_xml(out_path, instantiate(panel_template, size), operations)
+    except Exception as e:
+        return out_path, 0, 0, 0, str(e)
+    errors = {f["index"] for f in findings if f["severity"] == "error"}
+    warnings = sum(1 for f in findings if f["severity"] == "warning")
+    return out_path, len(operations) - len(errors), len(errors), warnings, None
+
+
+def generate(template_path, sizes, out_dir, jobs=None):
+    """
+    Пишет по программе на каждую строку sizes в out_dir.
+    Возвращает словарь с итогами (файлы, удалённые операции, ошибки, время, файлов/с).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = [
+        (size, os.path.join(out_dir, name))
+        for size, name in zip(sizes, output_names(template_path, sizes))
+    ]
+
+    start = time.perf_counter()
+    errors = []
+    rejected = []  # (файл, операций не сохранено)
+    operations = 0
+    warnings = 0
+    chunksize = max(1, len(tasks) // ((jobs or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(template_path,)) as pool:
+        for out_path, saved, removed, warned, error in pool.map(_generate_job, tasks, chunksize=chunksize):
+            if error:
+                errors.append((out_path, error))
+                continue
+            if removed:
+                rejected.append((out_path, removed))
+            operations += saved
+            warnings += warned
+    elapsed = time.perf_counter() - start
+
+    metrics.log_event("family.generated", template=template_path, files=len(tasks),
+                      errors=len(errors), seconds=round(elapsed, 3))
+    return {
+        "files": len(tasks),
+        "errors": errors,
+        "rejected": rejected,
+        "operations": operations,
+        "warnings": warnings,
+        "seconds": elapsed,
+        "files_per_sec": len(tasks) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+# === Бенчмарк ===
+
+def benchmark(count=2000, operations=300, jobs=None):
+    """Пропускная способность на count размерах и сравнение pretty_xml с minidom."""
+    import random
+    import tempfile
+    import xml.etree.ElementTree as ET
+    from xml.dom import minidom
+
+    import validation
+
+    logging.getLogger("up_editor").disabled = True
+    folder = tempfile.mkdtemp(prefix="up_family_")
+    template_path = os.path.join(folder, "шаблон.xml")
+    panel_data, ops = validation.make_random_program(operations, L_val=2000, W_val=600)
+    xml_handler.save_xml(template_path, panel_data, ops)
+
+    rng = random.Random(0)
+    sizes = [
+        {"L": str(rng.randrange(300, 2800)), "W": str(rng.randrange(200, 900)), "T": "16",
+         "name": "", "quantity": str(rng.randint(1, 4))}
+        for _ in range(count)
+    ]
+    result = generate(template_path, sizes, os.path.join(folder, "out"), jobs)
+
+    # Сериализатор отдельно: одно дерево, два способа записи
+    root = ET.parse(template_path).getroot()
+    for elem in root.iter():  # отступы файла → дерево, как его строит save_xml
+        if elem.text is not None and not elem.text.strip():
+            elem.text = None
+        elem.tail = None
+    start = time.perf_counter()
+    fast = xml_handler.pretty_xml(root)
+    fast_time = time.perf_counter() - start
+    start = time.perf_counter()
+    pretty = minidom.parseString(ET.tostring(root, "utf-8")).toprettyxml(indent="  ")
+    slow = "\n".join(line for line in pretty.split("\n") if line.strip())
+    slow_time = time.perf_counter() - start
+    assert fast == slow, "pretty_xml расходится с minidom"
+
+    print(f"Шаблон: {operations} операций, размеров: {count}, процессов: {jobs or os.cpu_count()}")
+    print(f"время {result['seconds']:.2f} с, {result['files_per_sec']:.0f} файл/с, "
+          f"ошибок: {len(result['errors'])}, с удалёнными операциями: {len(result['rejected'])}")
+    print(f"сериализация одного файла: pretty_xml {fast_time * 1000:.2f} мс, "
+          f"minidom {slow_time * 1000:.2f} мс (×{slow_time / fast_time:.1f})")
+
+
+def main(argv):
+    import argparse
+
+    if argv and argv[0] == "--bench":
+        benchmark(int(argv[1]) if len(argv) > 1 else 2000)
+        return 0
+
+    parser = argparse.ArgumentParser(description="Семейство деталей по шаблону и таблице размеров")
+    parser.add_argument("template", help="УП-шаблон с формулами L/W")
+    parser.add_argument("sizes", help="CSV: L, W, T, имя, количество")
+    parser.add_argument("out", help="папка для программ")
+    parser.add_argument("--jobs", type=int, default=None, help="число процессов (по умолчанию — все ядра)")
+    args = parser.parse_args(argv)
+
+    metrics.setup_logging()
+    result = generate(args.template, read_sizes(args.sizes), args.out, args.jobs)
+    for path, error in result["errors"]:
+        print(f"{path}: {error}")
+    for path, removed in result["rejected"]:
+        print(f"{path}: не сохранено операций с ошибками: {removed}")
+    print(
+        f"Файлов: {result['files']}, ошибок: {len(result['errors'])}, "
+        f"операций: {result['operations']}, предупреждений: {result['warnings']}, "
+        f"время: {result['seconds']:.2f} с, {result['files_per_sec']:.1f} файл/с"
+    )
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
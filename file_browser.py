@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Панель "Обзор файлов": миниатюры всех УП в папке.
+
+Готовые миниатюры берутся из ThumbnailCache сразу (по индексу: XML не читается
+и не разбирается), новые и изменённые файлы хэшируются и рисуются фоновым
+потоком и появляются по мере готовности.
+Двойной клик открывает программу в редакторе.
+"""
+import logging
+import os
+import queue
+
+from PyQt5.QtCore import Qt, QSize, QThread, pyqtSignal
+from PyQt5.QtGui import QIcon, QPixmap
+from PyQt5.QtWidgets import (
+    QDockWidget, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
+    QListWidget, QListWidgetItem, QListView, QFileDialog
+)
+
+import metrics
+from thumbnails import ThumbnailCache
+
+
+class ThumbnailWorker(QThread):
+    """Фоновый поток: рисует миниатюры из очереди путей."""
+    thumbnail_ready = pyqtSignal(str, str)   # путь к XML, путь к PNG
+    thumbnail_failed = pyqtSignal(str, str)  # путь к XML, ошибка
+
+    def __init__(self, cache, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.queue = queue.Queue()
+        self._generation = 0
+
+    def enqueue(self, paths):
+        """Новая папка — старые задачи отбрасываются."""
+        self._generation += 1
+        for path in paths:
+            self.queue.put((self._generation, path))
+
+    def stop(self):
+        """Оставшиеся в очереди миниатюры не рисуются — ждём только текущую."""
+        self._generation += 1
+        self.queue.put(None)
+        self.wait()
+
+    def run(self):
+        while True:
+            task = self.queue.get()
+            if task is None:
+                break
+            generation, path = task
+            if generation != self._generation:
+                continue
+            try:
+                thumb = self.cache.get(path)
+            except Exception as e:
+                metrics.log_event("thumbnail.failed", logging.WARNING, path=path, error=e)
+                self.thumbnail_failed.emit(path, str(e))
+                continue
+            self.thumbnail_ready.emit(path, thumb)
+            if self.queue.empty():
+                self.cache.save_index()
+
+
+class FileBrowserDock(QDockWidget):
+    def __init__(self, main_window, cache=None):
+        super().__init__("Обзор файлов", main_window)
+        self.main_window = main_window
+        self.cache = cache or ThumbnailCache()
+        self.folder = None
+        self.items = {}  # путь → QListWidgetItem
+
+        self.folder_label = QLabel("Папка не выбрана")
+        self.folder_label.setWordWrap(True)
+        choose_btn = QPushButton("Папка…")
+        choose_btn.clicked.connect(self.choose_folder)
+        refresh_btn = QPushButton("Обновить")
+        refresh_btn.clicked.connect(lambda: self.set_folder(self.folder))
+
+        self.list = QListWidget()
+        self.list.setViewMode(QListView.IconMode)
+        self.list.setIconSize(QSize(192, 128))
+        self.list.setGridSize(QSize(210, 160))
+        self.list.setResizeMode(QListView.Adjust)
+        self.list.setMovement(QListView.Static)
+        self.list.setUniformItemSizes(True)
+        self.list.setLayoutMode(QListView.Batched)
+        self.list.setBatchSize(50)
+        self.list.itemDoubleClicked.connect(self.open_item)
+
+        top = QHBoxLayout()
+        top.addWidget(choose_btn)
+        top.addWidget(refresh_btn)
+        layout = QVBoxLayout()
+        layout.addLayout(top)
+        layout.addWidget(self.folder_label)
+        layout.addWidget(self.list)
+        container = QWidget()
+        container.setLayout(layout)
+        self.setWidget(container)
+
+        self.worker = ThumbnailWorker(self.cache, self)
+        self.worker.thumbnail_ready.connect(self.on_thumbnail_ready)
+        self.worker.thumbnail_failed.connect(self.on_thumbnail_failed)
+        self.worker.start()
+
+    def choose_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Папка с УП", self.folder or "")
+        if folder:
+            self.set_folder(folder)
+
+    def set_folder(self, folder):
+        if not folder:
+            return
+        self.folder = folder
+        self.folder_label.setText(folder)
+        self.list.clear()
+        self.items = {}
+
+        names = sorted(n for n in os.listdir(folder) if n.lower().endswith(".xml"))
+        missing = []
+        for name in names:
+            path = os.path.join(folder, name)
+            item = QListWidgetItem(name)
+            item.setData(Qt.UserRole, path)
+            item.setToolTip(path)
+            # Только по индексу: хэш нового или изменённого файла считает фоновый поток
+            thumb = self.cache.lookup(path, read_file=False)
+            if thumb:
+                item.setIcon(QIcon(QPixmap(thumb)))
+            else:
+                missing.append(path)
+            self.list.addItem(item)
+            self.items[path] = item
+
+        self.worker.enqueue(missing)
+        metrics.log_event("file_browser.folder", folder=folder, files=len(names), to_render=len(missing))
+
+    def on_thumbnail_ready(self, path, thumb):
+        item = self.items.get(path)
+        if item is not None:
+            item.setIcon(QIcon(QPixmap(thumb)))
+
+    def on_thumbnail_failed(self, path, error):
+        item = self.items.get(path)
+        if item is not None:
+            item.setToolTip(f"{path}\nОшибка: {error}")
+
+    def open_item(self, item):
+        self.main_window.load_file(item.data(Qt.UserRole))
+
+    def shutdown(self):
+        """Останавливает фоновый поток (при закрытии главного окна)."""
+        self.worker.stop()
+        self.cache.save_index()
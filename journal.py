@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+"""
+Журнал правок: восстановление сессии после падения редактора.
+
+Каждая правка дописывается в конец файла одной JSON-строкой:
+
+    {"seq": 17, "op": "add",    "index": 120, "data": {...операция...}}
+    {"seq": 18, "op": "modify", "index": 3,   "data": {...}}
+    {"seq": 19, "op": "delete", "index": 7}
+    {"seq": 20, "op": "panel",  "data": {...panel_data...}}
+    {"seq": 21, "op": "batch",  "data": [{"op": "delete", "index": 9}, ...]}
+
+"batch" — действие над выделенным (перемещение, отражение, удаление): одна
+строка и один fsync, так что после падения оно восстанавливается целиком
+или не восстанавливается вовсе.
+
+Запись одной строки стоит микросекунды–миллисекунды независимо от размера
+программы. Время от времени журнал сжимается: текущее состояние целиком пишется
+в снимок (snapshot.json, атомарно через .tmp). Сжатие делится на две части:
+на GUI-потоке — поверхностная копия состояния и переход к новому куску журнала
+(journal.<n>.jsonl), в фоне (autosave.AutosaveWorker) — запись снимка и удаление
+кусков, которые он покрывает.
+
+Кусок, начатый после смены состояния целиком (открытие, отмена,
+восстановление), помечен первой строкой {"op": "segment", "reset": true}:
+его записи применимы только к снимку, снятому в этот момент. Если снимок
+не успел записаться, восстановление на таком куске останавливается.
+
+При запуске снимок читается и к нему применяются записи кусков журнала
+с seq больше, чем у снимка. Оборванная последняя строка (падение посреди
+записи) отбрасывается.
+
+У каждого запущенного редактора своя папка сеанса (<pid>-<случайное>
+в ~/.up_editor/journal), занятая блокировкой файла session.lock. Блокировку
+держит ОС: после падения процесса она снимается, и папка становится
+брошенной — её находит orphaned_sessions() при следующем запуске.
+
+Сравнение стоимости записи в журнал и полного сохранения:
+
+    python journal.py --bench 50000
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import time
+import uuid
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".up_editor", "journal")
+# Сжимать после стольких записей
+COMPACT_EVERY = 500
+
+SNAPSHOT_NAME = "snapshot.json"
+LOCK_NAME = "session.lock"
+SNAPSHOT_VERSION = 2
+_SEGMENT = re.compile(r"^journal\.(\d+)\.jsonl$")
+
+
+def segment_name(number):
+    return f"journal.{number}.jsonl"
+
+
+def apply_record(record, panel_data, operations):
+    """Применяет одну запись журнала к состоянию (на месте)."""
+    kind = record["op"]
+    if kind == "add":
+        operations.insert(record["index"], record["data"])
+    elif kind == "modify":
+        operations[record["index"]] = record["data"]
+    elif kind == "delete":
+        del operations[record["index"]]
+    elif kind == "panel":
+        panel_data.clear()
+        panel_data.update(record["data"])
+    elif kind == "batch":
+        for part in record["data"]:
+            apply_record(part, panel_data, operations)
+    else:
+        raise ValueError(f"неизвестная запись журнала: {kind}")
+
+
+def _try_lock(f):
+    """Неблокирующая исключительная блокировка открытого файла; снимается ОС вместе с процессом."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def new_session(root=None, **kwargs):
+    """Журнал этого процесса: новая папка сеанса под root, занятая блокировкой."""
+    root = root or DEFAULT_DIR
+    journal = Journal(os.path.join(root, f"{os.getpid()}-{uuid.uuid4().hex[:8]}"), **kwargs)
+    if not journal.lock():
+        raise OSError(f"папка журнала занята: {journal.journal_dir}")
+    return journal
+
+
+def orphaned_sessions(root=None):
+    """
+    Журналы сеансов, чей редактор завершился, не удалив их (упал или был убит),
+    свежие первыми. Каждый возвращается уже заблокированным: два одновременно
+    запущенных редактора не восстановят один сеанс дважды.
+    """
+    root = root or DEFAULT_DIR
+    found = []
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return []
+    for entry in entries:
+        if not entry.is_dir():
+            continue
+        journal = Journal(entry.path)
+        if journal.lock():
+            found.append((journal.last_modified(), journal))
+    found.sort(key=lambda item: item[0], reverse=True)
+    return [journal for _, journal in found]
+
+
+class Journal:
+    def __init__(self, journal_dir, compact_every=COMPACT_EVERY, fsync=True):
+        """
+        :param journal_dir: папка сеанса (new_session создаёт её сам)
+        :param fsync: сбрасывать каждую запись на диск (переживает и отключение питания)
+        """
+        self.journal_dir = journal_dir
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.snapshot_path = os.path.join(self.journal_dir, SNAPSHOT_NAME)
+        self.lock_path = os.path.join(self.journal_dir, LOCK_NAME)
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self.seq = 0
+        self.pending = 0  # записей после последнего снимка
+        self.segment = max(self.segments(), default=0) + 1  # следующая запись — в этот кусок
+        self.segment_reset = False
+        self._file = None
+        self._lock_file = None
+
+    # === Блокировка сеанса ===
+
+    def lock(self):
+        """Занимает папку сеанса. False — её держит другой работающий редактор."""
+        if self._lock_file is not None:
+            return True
+        f = open(self.lock_path, "a+")
+        if not _try_lock(f):
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self._lock_file = f
+        return True
+
+    def unlock(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def segments(self):
+        """Номера кусков журнала в папке, по возрастанию."""
+        numbers = []
+        for name in os.listdir(self.journal_dir):
+            match = _SEGMENT.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def last_modified(self):
+        times = [0]
+        for name in os.listdir(self.journal_dir):
+            try:
+                times.append(os.stat(os.path.join(self.journal_dir, name)).st_mtime)
+            except OSError:
+                pass
+        return max(times)
+
+    # === Запись ===
+
+    def _open(self):
+        if self._file is None:
+            path = os.path.join(self.journal_dir, segment_name(self.segment))
+            self._file = open(path, "a", encoding="utf-8")
+            if self.segment_reset and not self._file.tell():
+                self._file.write(json.dumps({"seq": self.seq, "op": "segment", "reset": True}) + "\n")
+        return self._file
+
+    def append(self, kind, index=None, data=None):
+        """Дописывает запись. Возвращает True, если пора сжать журнал."""
+        self.seq += 1
+        record = {"seq": self.seq, "op": kind}
+        if index is not None:
+            record["index"] = index
+        if data is not None:
+            record["data"] = data
+        with metrics.timer("journal_append"):
+            f = self._open()
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self.pending += 1
+        return self.pending >= self.compact_every
+
+    def start_compaction(self, file_path, panel_data, operations, dirty=True, reset=False):
+        """
+        GUI-поток: поверхностная копия состояния и переход к новому куску журнала.
+        Возвращает снимок для write_snapshot (его можно писать в фоне).
+        dirty=False — состояние совпадает с файлом на диске (только что открыт/сохранён);
+        reset — состояние заменено целиком, а не накоплено правками из журнала.
+        """
+        with metrics.timer("journal_compact_start"):
+            self.close()
+            snapshot = {
+                "version": SNAPSHOT_VERSION,
+                "seq": self.seq,
+                "segment": self.segment + 1,  # снимок покрывает куски до этого
+                "file_path": file_path,
+                "dirty": dirty,
+                "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "panel_data": dict(panel_data),
+                "operations": [dict(op) for op in operations],
+            }
+            self.segment += 1
+            self.segment_reset = reset
+        self.pending = 0
+        return snapshot
+
+    def write_snapshot(self, snapshot):
+        """Пишет снимок и удаляет куски журнала, которые он покрывает (можно из фонового потока)."""
+        with metrics.timer("journal_compact"):
+            tmp = self.snapshot_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_path)
+            # Записи кусков до snapshot["segment"] уже в снимке
+            for number in self.segments():
+                if number < snapshot["segment"]:
+                    try:
+                        os.remove(os.path.join(self.journal_dir, segment_name(number)))
+                    except OSError:
+                        pass
+
+    def compact(self, file_path, panel_data, operations, dirty=True, reset=False):
+        """Сжатие целиком на вызывающем потоке."""
+        self.write_snapshot(self.start_compaction(file_path, panel_data, operations, dirty, reset))
+
+    def discard(self):
+        """Чистое завершение (или отказ от восстановления): папка сеанса удаляется."""
+        self.close()
+        self.unlock()
+        shutil.rmtree(self.journal_dir, ignore_errors=True)
+        self.seq = 0
+        self.pending = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # === Восстановление ===
+
+    def recover(self):
+        """
+        Возвращает {"file_path", "panel_data", "operations", "records"}
+        или None, если несохранённых правок нет.
+        Продолжает нумерацию seq с восстановленного места.
+        """
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            if snapshot.get("version") != SNAPSHOT_VERSION:
+                snapshot = None
+        except FileNotFoundError:
+            snapshot = None
+        except (OSError, ValueError) as e:
+            metrics.log_event("journal.snapshot_corrupt", logging.WARNING, error=e)
+            snapshot = None
+
+        if snapshot is None:
+            snapshot = {"seq": 0, "segment": 0, "file_path": None, "dirty": False,
+                        "panel_data": {}, "operations": []}
+        panel_data = snapshot["panel_data"]
+        operations = snapshot["operations"]
+        seq = snapshot["seq"]
+
+        applied = 0
+        for number in self.segments():
+            if number < snapshot["segment"]:
+                continue
+            complete, seq, count = self._replay(number, number == snapshot["segment"],
+                                                panel_data, operations, seq)
+            applied += count
+            if not complete:
+                break
+
+        self.seq = seq
+        self.pending = applied
+        if not applied and not snapshot["dirty"]:
+            return None
+        metrics.log_event("journal.recovered", records=applied, operations=len(operations))
+        return {
+            "file_path": snapshot["file_path"],
+            "panel_data": panel_data,
+            "operations": operations,
+            "records": applied,
+        }
+
+    def _replay(self, number, has_base, panel_data, operations, seq):
+        """
+        Применяет записи куска number: (дочитан ли кусок, seq последней записи, применено).
+        Не дочитан — дальше восстанавливать нельзя (оборванная запись или кусок
+        после смены состояния, чей снимок не записан).
+        """
+        applied = 0
+        path = os.path.join(self.journal_dir, segment_name(number))
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                    if record["op"] == "segment":
+                        if record.get("reset") and not has_base:
+                            metrics.log_event("journal.replay_stopped", logging.WARNING,
+                                              segment=number, error="нет снимка начала куска")
+                            return False, seq, applied
+                        continue
+                    if record["seq"] <= seq:
+                        continue
+                    apply_record(record, panel_data, operations)
+                except (ValueError, KeyError, IndexError) as e:
+                    # Оборванный хвост или запись, не подходящая к снимку — дальше не верим
+                    metrics.log_event("journal.replay_stopped", logging.WARNING,
+                                      segment=number, line=line_no, error=e)
+                    return False, seq, applied
+                seq = record["seq"]
+                applied += 1
+        return True, seq, applied
+
+
+# === Бенчмарк ===
+
+def benchmark(count=50000, edits=200):
+    """Средняя стоимость записи правки в журнал против полного save_xml."""
+    import random
+    import tempfile
+
+    import validation
+    import xml_handler
+
+    logging.getLogger("up_editor").disabled = True
+    folder = tempfile.mkdtemp(prefix="up_journal_")
+    panel_data, operations = validation.make_random_program(count)
+    rng = random.Random(0)
+
+    def edit_stream(journal):
+        start = time.perf_counter()
+        for _ in range(edits):
+            i = rng.randrange(len(operations))
+            op = dict(operations[i], X1=str(rng.randint(0, 2000)))
+            operations[i] = op
+            journal.append("modify", i, op)
+        return (time.perf_counter() - start) / edits
+
+    per_edit = {}
+    for fsync in (False, True):
+        journal = Journal(os.path.join(folder, f"j{int(fsync)}"), compact_every=edits + 1, fsync=fsync)
+        per_edit[fsync] = edit_stream(journal)
+        journal.close()
+
+    xml_path = os.path.join(folder, "full.xml")
+    start = time.perf_counter()
+    xml_handler.save_xml(xml_path, panel_data, operations)
+    full_save = time.perf_counter() - start
+
+    start = time.perf_counter()
+    snapshot = journal.start_compaction(xml_path, panel_data, operations)
+    compact_start = time.perf_counter() - start
+    start = time.perf_counter()
+    journal.write_snapshot(snapshot)
+    compact = time.perf_counter() - start
+
+    recovered = Journal(journal.journal_dir).recover()
+    assert recovered["operations"] == operations, "восстановленная программа отличается"
+
+    print(f"Операций: {count}, правок: {edits}")
+    print(f"запись в журнал:           {per_edit[False] * 1000:8.3f} мс/правка")
+    print(f"запись в журнал + fsync:   {per_edit[True] * 1000:8.3f} мс/правка")
+    print(f"полное сохранение save_xml:{full_save * 1000:8.1f} мс  ×{full_save / per_edit[True]:.0f}")
+    print(f"сжатие журнала: GUI-поток  {compact_start * 1000:8.1f} мс, запись снимка в фоне "
+          f"{compact * 1000:.1f} мс — раз в {COMPACT_EVERY} правок")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 50000)
+    else:
+        print(__doc__)
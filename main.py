@@ -1,9 +1,28 @@
 import sys
 from PyQt5.QtWidgets import QApplication
 from editor_window import EditorWindow
+import metrics
+import profiling
 
 if __name__ == "__main__":
+    # --metrics: таймеры/счётчики и сводка сессии в JSON (см. metrics.py)
+    if "--metrics" in sys.argv:
+        sys.argv.remove("--metrics")
+        metrics.enable()
+    metrics.setup_logging()
+
+    # --profile[=папка]: профили действий и stacks.folded (см. profiling.py)
+    profile_dir = profiling.profile_dir_from(sys.argv)
+    if profile_dir:
+        profiling.install(profile_dir)
+
+    # --scene: чертёж на QGraphicsScene вместо matplotlib (см. scene_view.py)
+    backend = "matplotlib"
+    if "--scene" in sys.argv:
+        sys.argv.remove("--scene")
+        backend = "scene"
+
     app = QApplication(sys.argv)
-    window = EditorWindow()
+    window = EditorWindow(backend=backend)
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
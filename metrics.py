@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Лёгкая инструментация горячих путей редактора: таймеры, счётчики и
+структурный лог.
+
+Включается переменной окружения UPEDITOR_METRICS=1 или флагом --metrics
+в main.py. В выключенном состоянии timer() возвращает общий пустой
+контекст, а count() — одна проверка флага, так что накладные расходы
+практически нулевые.
+
+При выходе из программы сводка сессии пишется в JSON
+(по умолчанию ~/.up_editor/metrics/session-*.json, папку можно задать
+переменной UPEDITOR_METRICS_DIR) — эти файлы собираем с ПК операторов.
+
+События пишутся в логгер "up_editor". Без setup_logging() (скрипты,
+библиотечные вызовы) logging выводит только WARNING и выше — поля при этом
+не теряются, они входят в текст сообщения; чтобы видеть и INFO, вызовите
+setup_logging() или настройте логгер сами.
+"""
+import atexit
+import getpass
+import json
+import logging
+import os
+import platform
+import threading
+import time
+from functools import wraps
+
+
+logger = logging.getLogger("up_editor")
+
+ENABLED = os.environ.get("UPEDITOR_METRICS", "") not in ("", "0")
+
+# name → [count, total_sec, max_sec]
+_timers = {}
+# name → value
+_counters = {}
+_lock = threading.Lock()
+_session_start = time.time()
+_export_registered = False
+
+
+# === Таймеры и счётчики ===
+
+class _NullTimer:
+    """Пустой контекст для выключенных метрик."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def timer(name):
+    """
+    Контекст-таймер:
+
+        with metrics.timer("redraw"):
+            ...
+    """
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(name)
+
+
+def timed(name):
+    """Декоратор-таймер для функций и методов."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _Timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_time(name, seconds):
+    with _lock:
+        entry = _timers.get(name)
+        if entry is None:
+            _timers[name] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+
+def count(name, value=1):
+    """Увеличивает счётчик (операции, артисты, байты...)."""
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+# === Структурный лог ===
+
+def format_fields(fields):
+    """Поля события одной строкой: "index=3 reason=..." """
+    return " ".join(f"{k}={v}" for k, v in fields.items())
+
+
+def log_event(event, level=logging.INFO, **fields):
+    """
+    Пишет событие в лог: имя события + поля.
+    Вместо print — чтобы сообщения можно было собрать и разобрать.
+
+    Поля входят и в текст сообщения, так что их видно при любой настройке
+    logging — в том числе без setup_logging(), когда предупреждения печатает
+    запасной обработчик logging.lastResort. Событие и поля по отдельности
+    лежат в record.event / record.fields (для JsonFormatter).
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if fields:
+        logger.log(level, "%s %s", event, format_fields(fields),
+                   extra={"event": event, "fields": fields})
+    else:
+        logger.log(level, "%s", event, extra={"event": event, "fields": fields})
+
+
+class TextFormatter(logging.Formatter):
+    """Человекочитаемый вывод: "WARNING save_xml.removed index=3 ..." """
+
+    def format(self, record):
+        return f"{record.levelname} {record.getMessage()}"
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на событие."""
+
+    def format(self, record):
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "event": getattr(record, "event", None) or record.getMessage(),
+        }
+        data.update(getattr(record, "fields", None) or {})
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_logging(level=logging.INFO):
+    """Вывод лога в консоль (вызывается из main.py)."""
+    if any(getattr(h, "_up_editor", False) for h in logger.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(TextFormatter())
+    handler._up_editor = True
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+# === Сводка сессии ===
+
+def metrics_dir():
+    path = os.environ.get("UPEDITOR_METRICS_DIR")
+    if not path:
+        path = os.path.join(os.path.expanduser("~"), ".up_editor", "metrics")
+    return path
+
+
+def summary():
+    """Сводка сессии в виде словаря (для JSON)."""
+    with _lock:
+        timers = {
+            name: {
+                "count": c,
+                "total_ms": round(total * 1000, 3),
+                "mean_ms": round(total * 1000 / c, 3),
+                "max_ms": round(mx * 1000, 3),
+            }
+            for name, (c, total, mx) in sorted(_timers.items())
+        }
+        counters = dict(sorted(_counters.items()))
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = ""
+    return {
+        "session_start": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(_session_start)),
+        "duration_sec": round(time.time() - _session_start, 3),
+        "host": platform.node(),
+        "user": user,
+        "platform": platform.platform(),
+        "pid": os.getpid(),
+        "timers": timers,
+        "counters": counters,
+    }
+
+
+def export_summary(path=None):
+    """Записывает сводку сессии в JSON и возвращает путь к файлу."""
+    if path is None:
+        folder = metrics_dir()
+        os.makedirs(folder, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(_session_start))
+        path = os.path.join(folder, f"session-{stamp}-{os.getpid()}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary(), f, ensure_ascii=False, indent=2)
+    return path
+
+
+def _export_at_exit():
+    if not ENABLED:
+        return
+    try:
+        path = export_summary()
+        log_event("metrics.exported", path=path)
+    except Exception as e:
+        log_event("metrics.export_failed", logging.WARNING, error=e)
+
+
+def enable(json_log=True):
+    """
+    Включает метрики: сводка при выходе + JSON-лог событий
+    в папке метрик (events-*.jsonl).
+    """
+    global ENABLED, _export_registered
+    ENABLED = True
+    if not _export_registered:
+        atexit.register(_export_at_exit)
+        _export_registered = True
+    if json_log:
+        folder = metrics_dir()
+        os.makedirs(folder, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(_session_start))
+        handler = logging.FileHandler(
+            os.path.join(folder, f"events-{stamp}-{os.getpid()}.jsonl"), encoding="utf-8"
+        )
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        if logger.level == logging.NOTSET or logger.level > logging.INFO:
+            logger.setLevel(logging.INFO)
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+if ENABLED:
+    enable()
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Сдвиг операций на (dx, dy) мм с сохранением формул координат.
+
+Перетаскивание мышью на чертеже (PlotWidget) и перемещение выделенного
+дают одно и то же: новая операция, у которой координаты переписаны так,
+чтобы формулы остались формулами:
+
+    «120»   + 5  → «125»
+    «L-32»  + 5  → «L-27»
+    «W/2»   + 5  → «W/2+5»
+    «-32»   + 5  → «-27»      (не Path: отсчёт от L/W, как в parse_coord)
+
+Координата, которую сдвиг выводит за кромку, остаётся верной:
+«-3» + 5 → «L+2», «10» - 15 → «0-5».
+
+Отражение (mirrored_operation) тоже переписывает текст: «100» → «L-100»,
+«L-32» → «32», «W/2» → «W-(W/2)»; у дуг пути меняется направление,
+у коррекции фрезы — сторона.
+
+Проверка правил переписывания (код выхода 1 при ошибке):
+
+    python move_ops.py --check
+"""
+import re
+import sys
+
+from operation_index import operation_fields
+from renderer import parse_coord
+from xml_handler import format_num
+
+
+# Знаков после запятой у сдвинутой координаты
+DECIMALS = 2
+
+LINE_FIELDS = (("BeginX", "L"), ("BeginY", "W"), ("EndX", "L"), ("EndY", "W"))
+
+# Сторона коррекции фрезы после отражения: слева ↔ справа
+MIRRORED_CORRECTION = {"1": "2", "2": "1"}
+
+_PLAIN = re.compile(r"^-?\d+(?:\.\d+)?$")
+# Формула, которая заканчивается слагаемым-числом: «L-32», «W/2+16»
+_TRAILING = re.compile(r"^(?P<head>.*?[^\s*/(+-])\s*(?P<sign>[+-])\s*(?P<number>\d+(?:\.\d+)?)$")
+
+
+def _signed(value):
+    """Слагаемое с явным знаком: 5 → «+5», -5 → «-5»."""
+    return ("+" if value > 0 else "-") + format_num(abs(value))
+
+
+def shift_coord(value, delta, axis, is_path=False):
+    """
+    Текст координаты value, сдвинутой на delta мм.
+    :param axis: "L" для X, "W" для Y — от чего отсчитываются отрицательные числа
+    :param is_path: отрицательные числа — абсолютные координаты (Path, Vertical Line)
+    """
+    delta = round(delta, DECIMALS)
+    if not delta:
+        return value
+    text = str(value).strip().replace(",", ".") or "0"
+
+    if _PLAIN.match(text):
+        number = round(float(text) + delta, DECIMALS)
+        if is_path:
+            return format_num(number)
+        if text.startswith("-"):
+            # Отсчёт от кромки L/W: пока остаётся отрицательным — тем же способом
+            if number < 0:
+                return format_num(number)
+            return axis if number == 0 else axis + _signed(number)
+        # Абсолютная координата: отрицательное число здесь означало бы L-… / W-…
+        return format_num(number) if number >= 0 else "0" + _signed(number)
+
+    match = _TRAILING.match(text)
+    if match:
+        term = float(match["number"]) * (1 if match["sign"] == "+" else -1)
+        term = round(term + delta, DECIMALS)
+        return match["head"] if term == 0 else match["head"] + _signed(term)
+    return text + _signed(delta)
+
+
+def moved_operation(op, dx, dy, vertex=None):
+    """
+    Копия операции op, сдвинутая на (dx, dy) мм; op не меняется.
+    :param vertex: номер вершины Path — сдвигается только она, иначе весь путь
+    """
+    moved = dict(op)
+    type_name = op.get("TypeName", "")
+
+    if type_name == "Path":
+        vertexes = list(op.get("Vertexes", []))
+        targets = range(len(vertexes)) if vertex is None else (vertex,)
+        for i in targets:
+            v = dict(vertexes[i])
+            v["X1"] = shift_coord(v.get("X1", "0"), dx, "L", is_path=True)
+            v["Y1"] = shift_coord(v.get("Y1", "0"), dy, "W", is_path=True)
+            vertexes[i] = v
+        moved["Vertexes"] = vertexes
+    elif type_name in ("Line", "Vertical Line"):
+        # Vertical Line считается evaluate_expression — без правила отрицательных чисел
+        is_path = type_name == "Vertical Line"
+        for field, axis in LINE_FIELDS:
+            delta = dx if axis == "L" else dy
+            moved[field] = shift_coord(op.get(field, "0"), delta, axis, is_path)
+    else:
+        moved["X1"] = shift_coord(op.get("X1", "0"), dx, "L")
+        moved["Y1"] = shift_coord(op.get("Y1", "0"), dy, "W")
+    return moved
+
+
+def reference_point(op, L_val, W_val, vertex=None):
+    """
+    Точка, которая при перемещении привязывается к элементам чертежа:
+    центр отверстия, начало линии, вершина vertex пути (по умолчанию — первая).
+    """
+    if op.get("TypeName") == "Path" and vertex is not None:
+        v = op.get("Vertexes", [])[vertex]
+        x, y, is_path = v.get("X1", "0"), v.get("Y1", "0"), True
+    else:
+        x, y, _, _, is_path = operation_fields(op)
+    return (parse_coord(x, L_val, W_val, is_path=is_path),
+            parse_coord(y, L_val, W_val, is_y=True, is_path=is_path))
+
+
+def _absolute(number, is_path):
+    """Текст абсолютной координаты: отрицательное число вне Path означало бы L-… / W-…."""
+    if number >= 0 or is_path:
+        return format_num(number)
+    return "0" + _signed(number)
+
+
+def mirror_coord(value, axis, is_path=False):
+    """Текст координаты value, отражённой относительно середины детали по оси axis ("L"/"W")."""
+    text = str(value).strip().replace(",", ".") or "0"
+    if _PLAIN.match(text):
+        number = float(text)
+        if not is_path and text.startswith("-"):
+            return format_num(-number)  # «-32» (L-32) → «32»
+        return axis if number == 0 else axis + _signed(-number)
+    if text == axis:
+        return "0"
+    match = re.match(r"^" + axis + r"\s*(?P<sign>[+-])\s*(?P<number>\d+(?:\.\d+)?)$", text)
+    if match:
+        number = float(match["number"])
+        return _absolute(number if match["sign"] == "-" else -number, is_path)
+    return f"{axis}-({text})"
+
+
+def mirrored_operation(op, axis):
+    """
+    Копия операции op, отражённая по оси axis: "x" — X → L - X, "y" — Y → W - Y.
+    """
+    size = "L" if axis == "x" else "W"
+    moved = dict(op)
+    type_name = op.get("TypeName", "")
+
+    if type_name == "Path":
+        field = "X1" if axis == "x" else "Y1"
+        vertexes = []
+        for v in op.get("Vertexes", []):
+            v = dict(v)
+            v[field] = mirror_coord(v.get(field, "0"), size, is_path=True)
+            if v.get("type") == "Arc":
+                v["Direction"] = "0" if str(v.get("Direction", "1")).strip() == "1" else "1"
+            vertexes.append(v)
+        moved["Vertexes"] = vertexes
+    elif type_name in ("Line", "Vertical Line"):
+        is_path = type_name == "Vertical Line"
+        for field, field_axis in LINE_FIELDS:
+            if field_axis == size:
+                moved[field] = mirror_coord(op.get(field, "0"), size, is_path)
+    else:
+        field = "X1" if axis == "x" else "Y1"
+        moved[field] = mirror_coord(op.get(field, "0"), size)
+
+    if type_name in ("Path", "Line", "Vertical Line"):
+        correction = str(op.get("Correction", "")).strip()
+        if correction in MIRRORED_CORRECTION:
+            moved["Correction"] = MIRRORED_CORRECTION[correction]
+    return moved
+
+
+# === Самопроверка ===
+
+# (текст, сдвиг, ось, is_path) → ожидаемый текст
+SHIFT_CASES = [
+    ("120", 5, "L", False, "125"),
+    ("L-32", 5, "L", False, "L-27"),
+    ("L-32", 32, "L", False, "L"),
+    ("W/2", 5, "W", False, "W/2+5"),
+    ("W/2+16", -16, "W", False, "W/2"),
+    ("-32", 5, "L", False, "-27"),     # отрицательное вне Path — отсчёт от кромки
+    ("-3", 5, "L", False, "L+2"),
+    ("-3", 3, "W", False, "W"),
+    ("10", -15, "L", False, "0-5"),
+    ("-10", 5, "L", True, "-5"),       # Path/Vertical Line: отрицательное — абсолютное
+    ("-10", -5, "W", True, "-15"),
+    ("12,5", 0.25, "L", False, "12.75"),
+    ("L-32", 0, "L", False, "L-32"),
+]
+
+# (текст, ось, is_path) → ожидаемый текст
+MIRROR_CASES = [
+    ("100", "L", False, "L-100"),
+    ("0", "L", False, "L"),
+    ("L", "L", False, "0"),
+    ("L-32", "L", False, "32"),
+    ("-32", "L", False, "32"),
+    ("W/2", "W", False, "W-(W/2)"),
+    ("-10", "L", True, "L+10"),
+    ("L+10", "L", True, "-10"),
+]
+
+SIZES = ((1000.0, 600.0), (2750.0, 1830.0), (300.0, 180.0))
+
+
+def check():
+    """Правила переписывания координат против parse_coord; возвращает список ошибок."""
+    import random
+
+    errors = []
+
+    def value(text, axis, is_path, size):
+        return parse_coord(text, size[0], size[1], is_y=axis == "W", is_path=is_path)
+
+    for text, delta, axis, is_path, expected in SHIFT_CASES:
+        got = shift_coord(text, delta, axis, is_path)
+        if got != expected:
+            errors.append(f"shift_coord({text!r}, {delta}, {axis}, is_path={is_path}) = {got!r}, ждали {expected!r}")
+    for text, axis, is_path, expected in MIRROR_CASES:
+        got = mirror_coord(text, axis, is_path)
+        if got != expected:
+            errors.append(f"mirror_coord({text!r}, {axis}, is_path={is_path}) = {got!r}, ждали {expected!r}")
+
+    # Значение после переписывания — при любом размере детали (формула осталась формулой)
+    rng = random.Random(0)
+    texts = ["0", "120", "12.5", "-32", "-3", "L", "L-32", "W", "W-16", "W/2", "L/2+8", "(L-100)/2"]
+    for _ in range(2000):
+        text = rng.choice(texts)
+        axis = rng.choice("LW")
+        is_path = rng.random() < 0.5
+        delta = round(rng.uniform(-200, 200), rng.choice((0, 1, 2)))
+        shifted = shift_coord(text, delta, axis, is_path)
+        mirrored = mirror_coord(text, axis, is_path)
+        for size in SIZES:
+            before = value(text, axis, is_path, size)
+            full = size[0] if axis == "L" else size[1]
+            if abs(value(shifted, axis, is_path, size) - (before + delta)) > 1e-6:
+                errors.append(f"shift_coord({text!r}, {delta}, {axis}, is_path={is_path}) = {shifted!r} "
+                              f"при {size}: не сдвигает на {delta}")
+            if abs(value(mirrored, axis, is_path, size) - (full - before)) > 1e-6:
+                errors.append(f"mirror_coord({text!r}, {axis}, is_path={is_path}) = {mirrored!r} "
+                              f"при {size}: не отражает")
+
+    # Операции целиком: точка привязки сдвигается на (dx, dy), Vertical Line — по правилам Path
+    operations = [
+        {"TypeName": "Vertical Hole", "X1": "-32", "Y1": "W/2"},
+        {"TypeName": "Line", "BeginX": "-10", "BeginY": "20", "EndX": "L-10", "EndY": "W-20", "Correction": "1"},
+        {"TypeName": "Vertical Line", "BeginX": "-10", "BeginY": "5", "EndX": "100", "EndY": "5"},
+        {"TypeName": "Path", "Correction": "2", "Vertexes": [
+            {"type": "Point", "X1": "-10", "Y1": "W-50"},
+            {"type": "Arc", "X1": "L/2", "Y1": "40", "Direction": "1"},
+        ]},
+    ]
+    for op in operations:
+        moved = moved_operation(op, 7.5, -4)
+        flipped = mirrored_operation(op, "x")
+        for size in SIZES:
+            x0, y0 = reference_point(op, *size)
+            x1, y1 = reference_point(moved, *size)
+            if abs(x1 - x0 - 7.5) > 1e-6 or abs(y1 - y0 + 4) > 1e-6:
+                errors.append(f"moved_operation {op['TypeName']} при {size}: ({x0}, {y0}) → ({x1}, {y1})")
+            x2, y2 = reference_point(flipped, *size)
+            if abs(x2 - (size[0] - x0)) > 1e-6 or abs(y2 - y0) > 1e-6:
+                errors.append(f"mirrored_operation {op['TypeName']} при {size}: ({x0}, {y0}) → ({x2}, {y2})")
+        if op.get("Correction") and flipped.get("Correction") != MIRRORED_CORRECTION[op["Correction"]]:
+            errors.append(f"mirrored_operation {op['TypeName']}: коррекция {flipped.get('Correction')}")
+    arc = mirrored_operation(operations[3], "y")["Vertexes"][1]
+    if arc["Direction"] != "0":
+        errors.append(f"mirrored_operation: направление дуги {arc['Direction']}")
+    vertex_only = moved_operation(operations[3], 5, 5, vertex=1)["Vertexes"]
+    if vertex_only[0] != operations[3]["Vertexes"][0]:
+        errors.append("moved_operation(vertex=1) сдвинул другую вершину")
+    return errors
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--check":
+        problems = check()
+        for line in problems[:50]:
+            print(line)
+        print(f"Ошибок: {len(problems)}")
+        sys.exit(1 if problems else 0)
+    else:
+        print(__doc__)
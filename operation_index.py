@@ -0,0 +1,522 @@
+# -*- coding: utf-8 -*-
+"""
+Индексы операций программы и запросы к ним.
+
+    торц ø8 край=лев            — торцевые Ø8 на левом торце (X ≈ L)
+    отв x=100..500 y<300 г>12   — отверстия в прямоугольнике глубже 12 мм
+
+Вторичные индексы: по типу, по диаметру (для фрезеровок — ширина фрезы Width),
+по глубине и пространственная сетка GRID_CELL×GRID_CELL мм по габаритам операций.
+Запрос пересекает наборы кандидатов от самого короткого и проверяет точно только их,
+поэтому на 100 тыс. операций отвечает за миллисекунды.
+
+Индекс строится при первом запросе и дальше поправляется по одной правке
+(operation_added/changed/removed). Внутри операции живут под постоянными номерами
+(слотами): удаление не перенумеровывает индексы, номер в программе получается
+поиском по возрастающему массиву слотов.
+"""
+import bisect
+import math
+import re
+import sys
+import time
+
+import numpy as np
+from matplotlib.path import Path as Polygon
+
+import metrics
+from renderer import parse_coord
+from validation import EDGE_TOLERANCE
+
+
+# Сторона ячейки пространственной сетки, мм
+GRID_CELL = 100.0
+# Операция, занимающая больше ячеек (длинные пути), хранится в общей «ячейке» None
+MAX_GRID_CELLS = 64
+
+HOLE_TYPES = ("Vertical Hole", "Back Vertical Hole", "Horizontal Hole")
+MILLING_TYPES = ("Line", "Path", "Vertical Line")
+# Начало слова в запросе → типы операций
+TYPE_WORDS = (
+    ("верх", ("Vertical Hole",)),
+    ("ниж", ("Back Vertical Hole",)),
+    ("торц", ("Horizontal Hole",)),
+    ("отв", HOLE_TYPES),
+    ("лин", ("Line",)),
+    ("пут", ("Path",)),
+    ("пил", ("Vertical Line",)),
+    ("фрез", MILLING_TYPES),
+)
+FIELD_WORDS = {
+    "d": "diameter", "ø": "diameter", "диаметр": "diameter",
+    "г": "depth", "глубина": "depth", "depth": "depth",
+    "x": "x", "y": "y",
+    "край": "edge", "edge": "edge",
+}
+# Края на чертеже: X растёт влево (левый торец — X = L), Y растёт вниз
+EDGE_WORDS = {"лев": "left", "left": "left", "прав": "right", "right": "right",
+              "верх": "top", "top": "top", "ниж": "bottom", "bottom": "bottom"}
+
+CONDITION_RE = re.compile(r"^(?P<field>[^\d=<>.\-]+?)\s*(?P<op>>=|<=|=|>|<)?\s*(?P<value>[-\d.,].*)$")
+
+
+# === Значения операций ===
+
+def operation_fields(op):
+    """
+    Исходные строки X, Y, диаметра, глубины и правило координат:
+    (x, y, диаметр, глубина, is_path). Для фрезеровок X/Y — начальная точка,
+    диаметр — ширина фрезы (Width).
+    """
+    type_name = op.get("TypeName", "")
+    if type_name in ("Line", "Vertical Line"):
+        # Vertical Line считается evaluate_expression — как Path, без правила отрицательных чисел
+        return (op.get("BeginX", ""), op.get("BeginY", ""), op.get("Width", ""), op.get("Depth", ""),
+                type_name == "Vertical Line")
+    if type_name == "Path":
+        vertexes = op.get("Vertexes") or [{}]
+        return (vertexes[0].get("X1", ""), vertexes[0].get("Y1", ""), op.get("Width", ""),
+                op.get("Depth", ""), True)
+    return op.get("X1", ""), op.get("Y1", ""), op.get("Diameter", ""), op.get("Depth", ""), False
+
+
+class ValueResolver:
+    """Значения операций в мм; каждое уникальное выражение вычисляется один раз на размер детали."""
+
+    def __init__(self, L_val=0.0, W_val=0.0):
+        self.L = L_val
+        self.W = W_val
+        self._cache = {}
+
+    def coord(self, value, is_y, is_path):
+        value = str(value).strip()
+        if value == "":
+            return np.nan
+        key = (value, is_y, is_path)
+        result = self._cache.get(key)
+        if result is None:
+            result = self._cache[key] = parse_coord(value, self.L, self.W, is_y=is_y, is_path=is_path)
+        return result
+
+    @staticmethod
+    def number(value):
+        try:
+            return float(str(value).strip().replace(",", "."))
+        except ValueError:
+            return np.nan
+
+    def values(self, op):
+        """(x, y, диаметр, глубина); пустое или нечисловое поле — NaN."""
+        x, y, diameter, depth, is_path = operation_fields(op)
+        return self.coord(x, False, is_path), self.coord(y, True, is_path), self.number(diameter), self.number(depth)
+
+    def points(self, op):
+        """Точки операции: центр отверстия, концы линии или вершины пути; без пустых координат."""
+        type_name = op.get("TypeName", "")
+        if type_name == "Path":
+            points = [(self.coord(v.get("X1", "0"), False, True), self.coord(v.get("Y1", "0"), True, True))
+                      for v in op.get("Vertexes", [])]
+        elif type_name in ("Line", "Vertical Line"):
+            is_path = type_name == "Vertical Line"
+            points = [(self.coord(op.get("BeginX", ""), False, is_path), self.coord(op.get("BeginY", ""), True, is_path)),
+                      (self.coord(op.get("EndX", ""), False, is_path), self.coord(op.get("EndY", ""), True, is_path))]
+        else:
+            x, y, _, _, is_path = operation_fields(op)
+            points = [(self.coord(x, False, is_path), self.coord(y, True, is_path))]
+        return [p for p in points if not (math.isnan(p[0]) or math.isnan(p[1]))]
+
+    def bbox(self, op):
+        """Габарит (x0, y0, x1, y1) по точкам операции (дуги — по концам) или None."""
+        points = self.points(op)
+        if not points:
+            return None
+        xs, ys = zip(*points)
+        return min(xs), min(ys), max(xs), max(ys)
+
+
+# === Запросы ===
+
+def parse_range(text):
+    """'8' → (8, 8), '5..10' → (5, 10); запятая вместо точки допускается."""
+    text = text.replace(",", ".")
+    try:
+        if ".." in text:
+            lo, hi = text.split("..", 1)
+            return (float(lo) if lo else -math.inf), (float(hi) if hi else math.inf)
+        value = float(text)
+    except ValueError:
+        raise ValueError(f"Не число: {text}")
+    return value, value
+
+
+def parse_query(text):
+    """
+    Текст запроса → словарь условий (все условия должны выполняться):
+
+        {"types": set, "diameter": (от, до), "depth": (от, до),
+         "x": (от, до), "y": (от, до), "edge": (край, допуск)}
+
+    Слова: типы (верх, ниж, торц, отв, лин, пут, пил, фрез — по началу слова),
+    ø8 / d=8 / d=5..10 / d>5, г>12 / глубина<=20, x=100..500, y<300,
+    край=лев|прав|верх|ниж[:допуск]. Непонятное слово — ValueError.
+    """
+    query = {}
+    for token in text.lower().replace("Ø", "ø").split():
+        types = [t for prefix, group in TYPE_WORDS if token.startswith(prefix) for t in group]
+        if types:
+            query.setdefault("types", set()).update(types)
+            continue
+        if token.startswith("ø") and token[1:2].isdigit():
+            token = "d=" + token[1:]
+        if token.startswith(("край=", "edge=")):
+            side, _, tolerance = token.split("=", 1)[1].partition(":")
+            edge = next((e for prefix, e in EDGE_WORDS.items() if side.startswith(prefix)), None)
+            if edge is None:
+                raise ValueError(f"Непонятный край: {side}")
+            query["edge"] = (edge, parse_range(tolerance)[0] if tolerance else EDGE_TOLERANCE)
+            continue
+        match = CONDITION_RE.match(token)
+        field = FIELD_WORDS.get(match.group("field")) if match else None
+        if field is None or field == "edge":
+            raise ValueError(f"Непонятное условие: {token}")
+        op, value = match.group("op") or "=", match.group("value")
+        lo, hi = parse_range(value)
+        if op == ">":
+            lo, hi = np.nextafter(lo, math.inf), math.inf
+        elif op == ">=":
+            hi = math.inf
+        elif op == "<":
+            lo, hi = -math.inf, np.nextafter(hi, -math.inf)
+        elif op == "<=":
+            lo = -math.inf
+        old_lo, old_hi = query.get(field, (-math.inf, math.inf))
+        query[field] = (max(lo, old_lo), min(hi, old_hi))
+    return query
+
+
+def in_range(value, bounds):
+    return value is not None and bounds[0] <= value <= bounds[1]
+
+
+class OperationIndex:
+    """
+    Индексы над списком операций (список не копируется). Запись слота:
+    (тип, диаметр, глубина, габарит); NaN хранится как None.
+    """
+
+    def __init__(self, cell_size=GRID_CELL):
+        self.cell_size = cell_size
+        self.operations = None
+        self.resolver = ValueResolver()
+        self.stale = True
+
+    def set_program(self, operations, L_val, W_val):
+        """Новая программа или новый размер детали: индекс перестроится при следующем запросе."""
+        if operations is not self.operations or (L_val, W_val) != (self.resolver.L, self.resolver.W):
+            self.operations = operations
+            self.resolver = ValueResolver(L_val, W_val)
+            self.stale = True
+
+    def build(self):
+        with metrics.timer("operation_index_build"):
+            self.slots = np.arange(len(self.operations), dtype=np.int64)  # номер в программе → слот
+            self.next_slot = len(self.operations)
+            self.entries = {}
+            self.by_type = {}
+            self.by_diameter = {}
+            self.by_depth = {}
+            self.diameter_keys = []  # ключи by_diameter/by_depth по возрастанию
+            self.depth_keys = []
+            self.grid = {}  # ячейка → слоты; None — операции больше MAX_GRID_CELLS ячеек
+            for slot, op in enumerate(self.operations):
+                self._insert(slot, op)
+        self.stale = False
+
+    # === Правки ===
+
+    def operation_added(self, idx):
+        if self.stale:
+            return
+        if idx != len(self.slots):
+            self.stale = True  # вставка в середину: слоты перестали возрастать
+            return
+        slot = self.next_slot
+        self.next_slot += 1
+        self.slots = np.append(self.slots, slot)
+        self._insert(slot, self.operations[idx])
+
+    def operation_changed(self, idx):
+        if self.stale:
+            return
+        slot = int(self.slots[idx])
+        self._remove(slot)
+        self._insert(slot, self.operations[idx])
+
+    def operation_removed(self, idx):
+        if self.stale:
+            return
+        self._remove(int(self.slots[idx]))
+        self.slots = np.delete(self.slots, idx)
+
+    # Правки пачкой (выделенное на чертеже): массив слотов меняется один раз
+
+    def operations_changed(self, indices):
+        for idx in indices:
+            self.operation_changed(idx)
+
+    def operations_added(self, first):
+        """Операции с first до конца дописаны в программу."""
+        if self.stale:
+            return
+        if first != len(self.slots):
+            self.stale = True
+            return
+        count = len(self.operations) - first
+        new = np.arange(self.next_slot, self.next_slot + count, dtype=self.slots.dtype)
+        self.next_slot += count
+        self.slots = np.concatenate((self.slots, new))
+        for idx, slot in zip(range(first, len(self.operations)), new):
+            self._insert(int(slot), self.operations[idx])
+
+    def operations_removed(self, indices):
+        """Операции indices (номера до удаления) удалены из программы."""
+        if self.stale:
+            return
+        for idx in indices:
+            self._remove(int(self.slots[idx]))
+        self.slots = np.delete(self.slots, indices)
+
+    def entry(self, op):
+        _, _, diameter, depth = self.resolver.values(op)
+        return (op.get("TypeName", ""),
+                None if math.isnan(diameter) else diameter,
+                None if math.isnan(depth) else depth,
+                self.resolver.bbox(op))
+
+    def _insert(self, slot, op):
+        entry = self.entry(op)
+        type_name, diameter, depth, bbox = entry
+        self.entries[slot] = entry
+        self.by_type.setdefault(type_name, set()).add(slot)
+        self._add_key(self.by_diameter, self.diameter_keys, diameter, slot)
+        self._add_key(self.by_depth, self.depth_keys, depth, slot)
+        for cell in self._cells(bbox):
+            self.grid.setdefault(cell, set()).add(slot)
+
+    def _remove(self, slot):
+        type_name, diameter, depth, bbox = self.entries.pop(slot)
+        self._discard(self.by_type, None, type_name, slot)
+        self._discard(self.by_diameter, self.diameter_keys, diameter, slot)
+        self._discard(self.by_depth, self.depth_keys, depth, slot)
+        for cell in self._cells(bbox):
+            self._discard(self.grid, None, cell, slot)
+
+    @staticmethod
+    def _add_key(index, keys, key, slot):
+        if key is None:
+            return
+        slots = index.get(key)
+        if slots is None:
+            slots = index[key] = set()
+            bisect.insort(keys, key)
+        slots.add(slot)
+
+    @staticmethod
+    def _discard(index, keys, key, slot):
+        slots = index.get(key)
+        if slots is None:
+            return
+        slots.discard(slot)
+        if not slots:
+            del index[key]
+            if keys is not None:
+                del keys[bisect.bisect_left(keys, key)]
+
+    def _cells(self, bbox):
+        """Ячейки сетки габарита; слишком большой габарит — одна «ячейка» self.large."""
+        if bbox is None:
+            return []
+        cx0, cy0 = math.floor(bbox[0] / self.cell_size), math.floor(bbox[1] / self.cell_size)
+        cx1, cy1 = math.floor(bbox[2] / self.cell_size), math.floor(bbox[3] / self.cell_size)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > MAX_GRID_CELLS:
+            return [None]
+        return [(cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1)]
+
+    # === Запросы ===
+
+    def region(self, query):
+        """Прямоугольник (x0, y0, x1, y1) из условий x, y и края или None — без ограничений."""
+        if not ({"x", "y", "edge"} & query.keys()):
+            return None
+        x0, x1 = query.get("x", (-math.inf, math.inf))
+        y0, y1 = query.get("y", (-math.inf, math.inf))
+        if "edge" in query:
+            edge, tolerance = query["edge"]
+            L_val, W_val = self.resolver.L, self.resolver.W
+            if edge == "left":
+                x0, x1 = max(x0, L_val - tolerance), min(x1, L_val + tolerance)
+            elif edge == "right":
+                x0, x1 = max(x0, -tolerance), min(x1, tolerance)
+            elif edge == "top":
+                y0, y1 = max(y0, -tolerance), min(y1, tolerance)
+            else:
+                y0, y1 = max(y0, W_val - tolerance), min(y1, W_val + tolerance)
+        return x0, y0, x1, y1
+
+    def entry_matches(self, entry, query, region):
+        type_name, diameter, depth, bbox = entry
+        if "types" in query and type_name not in query["types"]:
+            return False
+        if "diameter" in query and not in_range(diameter, query["diameter"]):
+            return False
+        if "depth" in query and not in_range(depth, query["depth"]):
+            return False
+        if region is not None:
+            # Операция целиком внутри прямоугольника
+            if bbox is None or not (region[0] <= bbox[0] and bbox[2] <= region[2]
+                                    and region[1] <= bbox[1] and bbox[3] <= region[3]):
+                return False
+        return True
+
+    def matches(self, query, idx):
+        """Подходит ли операция idx под запрос (для правок по одной)."""
+        return self.entry_matches(self.entry(self.operations[idx]), query, self.region(query))
+
+    def query(self, query):
+        """Номера операций (по возрастанию), подходящих под запрос."""
+        if self.stale:
+            self.build()
+        with metrics.timer("operation_query"):
+            region = self.region(query)
+            candidates = []
+            if "types" in query:
+                candidates.append(set().union(*(self.by_type.get(t, ()) for t in query["types"])))
+            for field, index, keys in (("diameter", self.by_diameter, self.diameter_keys),
+                                       ("depth", self.by_depth, self.depth_keys)):
+                if field in query:
+                    lo, hi = query[field]
+                    chosen = keys[bisect.bisect_left(keys, lo):bisect.bisect_right(keys, hi)]
+                    candidates.append(set().union(*(index[k] for k in chosen)))
+            if region is not None:
+                candidates.append(self._region_candidates(region))
+
+            if candidates:
+                candidates.sort(key=len)
+                found = candidates[0].intersection(*candidates[1:])
+            else:
+                found = self.entries.keys()
+            if region is not None:
+                found = [s for s in found if self.entry_matches(self.entries[s], query, region)]
+            slots = np.fromiter(found, dtype=np.int64, count=len(found))
+            slots.sort()
+            return np.searchsorted(self.slots, slots)
+
+    def in_rect(self, x0, y0, x1, y1):
+        """Номера операций, целиком лежащих в прямоугольнике (рамка выделения)."""
+        return self.query({"x": (min(x0, x1), max(x0, x1)), "y": (min(y0, y1), max(y0, y1))})
+
+    def in_polygon(self, polygon):
+        """
+        Номера операций, все точки которых внутри многоугольника (лассо): кандидаты —
+        из сетки по габариту многоугольника, точная проверка — только для них.
+        """
+        polygon = np.asarray(polygon, dtype=float).reshape(-1, 2)
+        if len(polygon) < 3:
+            return np.empty(0, dtype=np.int64)
+        candidates = self.in_rect(*polygon.min(axis=0), *polygon.max(axis=0))
+        if not len(candidates):
+            return candidates
+        with metrics.timer("operation_lasso"):
+            # Все точки кандидатов — одной проверкой; операция внутри, если внутри все её точки
+            points = [self.resolver.points(self.operations[idx]) for idx in candidates]
+            counts = np.fromiter((len(p) for p in points), dtype=np.int64, count=len(points))
+            inside = Polygon(polygon).contains_points([xy for p in points for xy in p])
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            return candidates[np.logical_and.reduceat(inside, starts)]
+
+    def footprints(self, indices):
+        """
+        Занятые операциями прямоугольники (x0, y0, x1, y1), массив (n, 4): габарит,
+        расширенный на радиус отверстия или полуширину фрезы; без координат — NaN.
+        """
+        if self.stale:
+            self.build()
+        result = np.full((len(indices), 4), np.nan)
+        for row, idx in enumerate(indices):
+            _, diameter, _, bbox = self.entries[int(self.slots[idx])]
+            if bbox is not None:
+                margin = (diameter or 0.0) / 2
+                result[row] = bbox[0] - margin, bbox[1] - margin, bbox[2] + margin, bbox[3] + margin
+        return result
+
+    def _region_candidates(self, region):
+        size = self.cell_size
+        bounds = [math.floor(v / size) if math.isfinite(v) else v for v in region]
+        cx0, cy0, cx1, cy1 = bounds
+        result = set(self.grid.get(None, ()))
+        if (math.isfinite(cx0) and math.isfinite(cx1) and math.isfinite(cy0) and math.isfinite(cy1)
+                and (cx1 - cx0 + 1) * (cy1 - cy0 + 1) <= len(self.grid)):
+            cells = ((cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1))
+        else:
+            cells = (c for c in self.grid if c is not None and cx0 <= c[0] <= cx1 and cy0 <= c[1] <= cy1)
+        for cell in cells:
+            result |= self.grid.get(cell, set())
+        return result
+
+
+# === Бенчмарк ===
+
+def benchmark(count=100000, repeats=5):
+    """Построение индекса, запросы и правки на синтетической программе."""
+    import logging
+    import random
+
+    import renderer
+    import validation
+
+    logging.getLogger("up_editor").disabled = True
+    panel_data, operations = validation.make_random_program(count)
+    L_val, W_val = renderer.panel_size(panel_data)
+    index = OperationIndex()
+    index.set_program(operations, L_val, W_val)
+    start = time.perf_counter()
+    index.build()
+    print(f"Операций: {count}, построение индекса {(time.perf_counter() - start) * 1000:.0f} мс, "
+          f"лучшее из {repeats}")
+
+    def best(fn):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+        return min(times), result
+
+    for text in ("торц ø8 край=лев", "отв x=100..500 y=0..300 г>12", "ø35", "верх г>=13 край=прав:50"):
+        query = parse_query(text)
+        elapsed, found = best(lambda: index.query(query))
+        # Проверка прямым перебором
+        region = index.region(query)
+        expected = [i for i, op in enumerate(operations) if index.entry_matches(index.entry(op), query, region)]
+        assert list(found) == expected, text
+        print(f"{text:32}{elapsed * 1000:8.2f} мс, найдено {len(found)}")
+
+    rng = random.Random(0)
+
+    def edit():
+        i = rng.randrange(len(operations))
+        operations[i] = dict(operations[i], X1=str(rng.randrange(int(L_val))))
+        index.operation_changed(i)
+        operations.append(dict(operations[i]))
+        index.operation_added(len(operations) - 1)
+        del operations[0]
+        index.operation_removed(0)
+    elapsed, _ = best(edit)
+    print(f"{'правка + добавление + удаление':32}{elapsed * 1000:8.2f} мс")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 100000)
+    else:
+        print(__doc__)
@@ -0,0 +1,590 @@
+# -*- coding: utf-8 -*-
+"""
+Панель "Операции": список всех операций программы (тип, X, Y, диаметр, глубина).
+
+Модель ленивая: строка форматируется только когда вид её запрашивает,
+поэтому открытие программы на 100 тыс. операций не стоит ничего.
+Порядок строк — массив номеров операций numpy; сортировка и фильтр по типу
+пересобирают только этот массив. Ключи сортировки считаются при первой
+сортировке по столбцу (каждое уникальное выражение — один раз, как в validation)
+и дальше поправляются точечно.
+
+Правки редактора (добавление, замена, удаление) приходят в модель по одной:
+строка вставляется, удаляется или переезжает на новое место сортировки,
+без сброса модели — выделение и прокрутка сохраняются.
+Клик по строке подсвечивает операцию на чертеже, двойной клик — открывает её.
+
+Строка запроса (operation_index.parse_query, например «торц ø8 край=лев»)
+оставляет в списке только подходящие операции и выделяет их все —
+для действий над группой (удаление одним шагом отмены).
+
+    python operations_view.py --bench 100000
+"""
+import logging
+import sys
+import time
+
+import numpy as np
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtWidgets import (
+    QAbstractItemView, QComboBox, QDockWidget, QHBoxLayout, QHeaderView, QLabel,
+    QLineEdit, QMessageBox, QPushButton, QTableView, QVBoxLayout, QWidget
+)
+
+import metrics
+from operation_index import ValueResolver, operation_fields, parse_query
+
+
+COLUMNS = ("№", "Тип", "X", "Y", "Диаметр", "Глубина")
+COLUMN_INDEX, COLUMN_TYPE = 0, 1
+# Столбцы со значениями: X, Y, Диаметр (ширина фрезы для фрезеровок), Глубина
+VALUE_COLUMNS = (2, 3, 4, 5)
+
+TYPE_NAMES = {
+    "Vertical Hole": "Верхняя плоскость",
+    "Back Vertical Hole": "Нижняя плоскость",
+    "Horizontal Hole": "Торцевое",
+    "Line": "Линейная фрезеровка",
+    "Path": "Путь фрезеровки",
+    "Vertical Line": "Фрезеровка пилой",
+}
+TYPE_ORDER = list(TYPE_NAMES)
+ROW_HEIGHT = 20
+# Отформатированных строк в памяти (видимая часть и немного вокруг)
+FORMAT_CACHE_SIZE = 2000
+
+
+def type_code(op):
+    """Код типа для сортировки и фильтра; незнакомые типы — в конце."""
+    try:
+        return TYPE_ORDER.index(op.get("TypeName", ""))
+    except ValueError:
+        return len(TYPE_ORDER)
+
+
+def format_value(value):
+    return "" if np.isnan(value) else f"{value:g}"
+
+
+class OperationsModel(QAbstractTableModel):
+    """
+    Таблица операций поверх списка cad_operations (список не копируется).
+    rows — номера операций в порядке показа (после фильтра и сортировки).
+    Запрос (query) отвечает по operation_index — индексу той же программы.
+    """
+
+    def __init__(self, parent=None, operation_index=None):
+        super().__init__(parent)
+        self.operation_index = operation_index
+        self.query = None        # словарь parse_query или None
+        self.operations = []
+        self.resolver = ValueResolver()
+        self.rows = np.zeros(0, dtype=np.int64)
+        self.sort_column = COLUMN_INDEX
+        self.sort_order = Qt.AscendingOrder
+        self.type_filter = None  # код типа или None — все
+        self._types = None       # коды типов всех операций, считаются при первом фильтре/сортировке
+        self._values = None      # (n, 4) значения столбцов VALUE_COLUMNS — при первой сортировке по ним
+        self._formatted = {}     # номер операции → кортеж строк
+
+    # === Данные для вида ===
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.format_row(int(self.rows[index.row()]))[index.column()]
+        if role == Qt.TextAlignmentRole and index.column() != COLUMN_TYPE:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        if role == Qt.ToolTipRole and index.column() in (2, 3):
+            # Формула, если координата задана не числом
+            raw = str(operation_fields(self.operations[int(self.rows[index.row()])])[index.column() - 2]).strip()
+            text = self.format_row(int(self.rows[index.row()]))[index.column()]
+            return raw if raw and raw != text else None
+        return None
+
+    def format_row(self, idx):
+        row = self._formatted.get(idx)
+        if row is None:
+            op = self.operations[idx]
+            type_name = op.get("TypeName", "")
+            values = self._values[idx] if self._values is not None else self.resolver.values(op)
+            row = (str(idx + 1), TYPE_NAMES.get(type_name, type_name)) + tuple(format_value(v) for v in values)
+            if len(self._formatted) >= FORMAT_CACHE_SIZE:
+                self._formatted.clear()
+            self._formatted[idx] = row
+        return row
+
+    def source_index(self, row):
+        """Номер операции в cad_operations для строки таблицы."""
+        return int(self.rows[row])
+
+    def row_of(self, idx):
+        """Строка таблицы операции idx или -1 (скрыта фильтром)."""
+        found = np.flatnonzero(self.rows == idx)
+        return int(found[0]) if len(found) else -1
+
+    # === Программа целиком ===
+
+    def set_operations(self, operations, L_val, W_val):
+        """Новая программа (открытие, отмена, восстановление): сброс модели."""
+        self.beginResetModel()
+        self.operations = operations
+        self.resolver = ValueResolver(L_val, W_val)
+        self._types = None
+        self._values = None
+        self._formatted.clear()
+        self.rows = self._arranged(self._visible(np.arange(len(operations))))
+        self.endResetModel()
+
+    def set_panel_size(self, L_val, W_val):
+        """Размер детали изменился: значения по формулам пересчитываются, строки остаются."""
+        self.resolver = ValueResolver(L_val, W_val)
+        self._values = None
+        self._formatted.clear()
+        if self.query is not None and {"x", "y", "edge"} & self.query.keys():
+            # Координаты по формулам сдвинулись — состав выборки мог измениться
+            self._refilter()
+            return
+        if self.sort_column in VALUE_COLUMNS:
+            self._relayout(self._arranged(self.rows))
+        if len(self.rows):
+            self.dataChanged.emit(self.index(0, VALUE_COLUMNS[0]),
+                                  self.index(len(self.rows) - 1, VALUE_COLUMNS[-1]))
+
+    def set_type_filter(self, code):
+        """Фильтр по коду типа (TYPE_ORDER) или None — все операции."""
+        self.type_filter = code
+        self._refilter()
+
+    def set_query(self, query):
+        """Запрос (словарь parse_query) или None — без запроса."""
+        self.query = query
+        self._refilter()
+
+    def _refilter(self):
+        self.beginResetModel()
+        self.rows = self._arranged(self._visible(np.arange(len(self.operations))))
+        self.endResetModel()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        with metrics.timer("operations_sort"):
+            self._relayout(self._arranged(self.rows))
+
+    # === Правки по одной операции ===
+
+    def operation_added(self, idx):
+        """Операция вставлена в cad_operations на место idx."""
+        op = self.operations[idx]
+        self.rows[self.rows >= idx] += 1
+        if self._types is not None:
+            self._types = np.insert(self._types, idx, type_code(op))
+        if self._values is not None:
+            self._values = np.insert(self._values, idx, self.resolver.values(op), axis=0)
+        self._formatted.clear()
+        if self._is_visible(idx):
+            pos = self._insert_position(self.rows, idx)
+            self.beginInsertRows(QModelIndex(), pos, pos)
+            self.rows = np.insert(self.rows, pos, idx)
+            self.endInsertRows()
+        self._renumbered()
+
+    def operation_changed(self, idx):
+        """Операция idx заменена: строка обновляется или переезжает на новое место."""
+        op = self.operations[idx]
+        if self._types is not None:
+            self._types[idx] = type_code(op)
+        if self._values is not None:
+            self._values[idx] = self.resolver.values(op)
+        self._formatted.pop(idx, None)
+
+        row = self.row_of(idx)
+        visible = self._is_visible(idx)
+        if row < 0:
+            if visible:
+                pos = self._insert_position(self.rows, idx)
+                self.beginInsertRows(QModelIndex(), pos, pos)
+                self.rows = np.insert(self.rows, pos, idx)
+                self.endInsertRows()
+            return
+        if not visible:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            self.rows = np.delete(self.rows, row)
+            self.endRemoveRows()
+            return
+        others = np.delete(self.rows, row)
+        pos = self._insert_position(others, idx)
+        if pos != row:
+            # destinationChild — место до переноса: при переносе вниз на одну больше
+            self.beginMoveRows(QModelIndex(), row, row, QModelIndex(), pos + 1 if pos > row else pos)
+            self.rows = np.insert(others, pos, idx)
+            self.endMoveRows()
+            row = pos
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(COLUMNS) - 1))
+
+    def operation_removed(self, idx):
+        """Операция idx удалена из cad_operations; номера следующих сдвигаются."""
+        row = self.row_of(idx)
+        if row >= 0:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            self.rows = np.delete(self.rows, row)
+            self.endRemoveRows()
+        self.rows[self.rows > idx] -= 1
+        if self._types is not None:
+            self._types = np.delete(self._types, idx)
+        if self._values is not None:
+            self._values = np.delete(self._values, idx, axis=0)
+        self._formatted.clear()
+        self._renumbered()
+
+    # === Правки пачкой (выделенное на чертеже) ===
+
+    def operations_changed(self, indices):
+        """Операции indices заменены: значения пересчитываются разом, порядок строк — один раз."""
+        indices = np.asarray(indices, dtype=np.int64)
+        if self._types is not None:
+            self._types[indices] = [type_code(self.operations[i]) for i in indices]
+        if self._values is not None and len(indices):
+            self._values[indices] = [self.resolver.values(self.operations[i]) for i in indices]
+        self._formatted.clear()
+        self._rearrange()
+
+    def operations_added(self, first):
+        """Операции с first до конца дописаны в cad_operations."""
+        new = self.operations[first:]
+        if self._types is not None:
+            self._types = np.concatenate((self._types, np.array([type_code(op) for op in new], dtype=np.int64)))
+        if self._values is not None:
+            values = np.array([self.resolver.values(op) for op in new], dtype=float)
+            self._values = np.concatenate((self._values, values.reshape(len(new), len(VALUE_COLUMNS))))
+        self._rearrange()
+
+    def operations_removed(self, indices):
+        """Операции indices (номера до удаления, по возрастанию) удалены из cad_operations."""
+        deleted = np.asarray(indices, dtype=np.int64)
+        self.beginResetModel()
+        kept = self.rows[~np.isin(self.rows, deleted)]
+        # Порядок оставшихся не меняется: ключи те же, номера сдвигаются монотонно
+        self.rows = kept - np.searchsorted(deleted, kept)
+        if self._types is not None:
+            self._types = np.delete(self._types, deleted)
+        if self._values is not None:
+            self._values = np.delete(self._values, deleted, axis=0)
+        self._formatted.clear()
+        self.endResetModel()
+
+    def _rearrange(self):
+        """Строки после правки пачкой: тот же состав — перестановка, иначе сброс модели."""
+        rows = self._arranged(self._visible(np.arange(len(self.operations))))
+        if len(rows) == len(self.rows) and np.array_equal(np.sort(rows), np.sort(self.rows)):
+            self._relayout(rows)
+            if len(rows):
+                self.dataChanged.emit(self.index(0, 0), self.index(len(rows) - 1, len(COLUMNS) - 1))
+        else:
+            self.beginResetModel()
+            self.rows = rows
+            self.endResetModel()
+
+    # === Порядок строк ===
+
+    def _type_codes(self):
+        if self._types is None:
+            self._types = np.fromiter((type_code(op) for op in self.operations),
+                                      dtype=np.int64, count=len(self.operations))
+        return self._types
+
+    def _value_array(self):
+        if self._values is None:
+            with metrics.timer("operations_values"):
+                values = np.array([self.resolver.values(op) for op in self.operations], dtype=float)
+            self._values = values.reshape(len(self.operations), len(VALUE_COLUMNS))
+        return self._values
+
+    def _sort_keys(self, indices):
+        """Ключи сортировки операций indices; NaN — в конец при любом направлении."""
+        if self.sort_column == COLUMN_INDEX:
+            return indices.astype(float)
+        if self.sort_column == COLUMN_TYPE:
+            return self._type_codes()[indices].astype(float)
+        keys = self._value_array()[indices, VALUE_COLUMNS.index(self.sort_column)]
+        return np.where(np.isnan(keys), np.inf, keys)
+
+    def _visible(self, indices):
+        if self.type_filter is not None:
+            indices = indices[self._type_codes()[indices] == self.type_filter]
+        if self.query is not None:
+            with metrics.timer("operations_query"):
+                indices = indices[np.isin(indices, self.operation_index.query(self.query), assume_unique=True)]
+        return indices
+
+    def _is_visible(self, idx):
+        if self.type_filter is not None and self._type_codes()[idx] != self.type_filter:
+            return False
+        return self.query is None or self.operation_index.matches(self.query, idx)
+
+    def _arranged(self, indices):
+        """indices в порядке показа: по ключу, при равных — по номеру операции."""
+        if self.sort_column == COLUMN_INDEX:
+            ordered = np.sort(indices)
+        else:
+            ordered = indices[np.lexsort((indices, self._sort_keys(indices)))]
+        return ordered[::-1].copy() if self.sort_order == Qt.DescendingOrder else ordered
+
+    def _insert_position(self, rows, idx):
+        """Место операции idx среди уже упорядоченных rows."""
+        keys = self._sort_keys(rows)
+        key = self._sort_keys(np.array([idx]))[0]
+        before = int(np.count_nonzero((keys < key) | ((keys == key) & (rows < idx))))
+        return len(rows) - before if self.sort_order == Qt.DescendingOrder else before
+
+    def _relayout(self, new_rows):
+        """Новый порядок тех же строк; выделение и текущая строка идут за своими операциями."""
+        self.layoutAboutToBeChanged.emit()
+        position = np.full(len(self.operations), -1, dtype=np.int64)
+        position[new_rows] = np.arange(len(new_rows))
+        old = self.persistentIndexList()
+        new = [self.index(int(position[self.rows[i.row()]]), i.column()) if i.row() < len(self.rows)
+               else QModelIndex() for i in old]
+        self.rows = new_rows
+        self.changePersistentIndexList(old, new)
+        self.layoutChanged.emit()
+
+    def _renumbered(self):
+        """После вставки/удаления сдвигаются номера — обновляется только столбец №."""
+        if len(self.rows):
+            self.dataChanged.emit(self.index(0, COLUMN_INDEX), self.index(len(self.rows) - 1, COLUMN_INDEX))
+
+
+class OperationsDock(QDockWidget):
+    def __init__(self, main_window):
+        super().__init__("Операции", main_window)
+        self.main_window = main_window
+        self.model = OperationsModel(self, main_window.operation_index)
+
+        self.type_combo = QComboBox()
+        self.type_combo.addItem("Все типы", None)
+        for code, type_name in enumerate(TYPE_ORDER):
+            self.type_combo.addItem(TYPE_NAMES[type_name], code)
+        self.type_combo.currentIndexChanged.connect(self.on_filter_changed)
+        self.count_label = QLabel()
+        self.query_input = QLineEdit()
+        self.query_input.setPlaceholderText("Запрос: торц ø8 край=лев, отв x=100..500 г>12")
+        self.query_input.setClearButtonEnabled(True)
+        self.query_input.returnPressed.connect(self.apply_query)
+        self.query_input.textChanged.connect(lambda text: text or self.apply_query())
+        delete_btn = QPushButton("Удалить выбранные")
+        delete_btn.clicked.connect(self.delete_selected)
+
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(COLUMN_INDEX, Qt.AscendingOrder)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setWordWrap(False)
+        self.table.verticalHeader().hide()
+        # Постоянная высота строк: вид не измеряет 100 тыс. строк
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(ROW_HEIGHT)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.horizontalHeader().setDefaultSectionSize(70)
+        self.table.setColumnWidth(COLUMN_INDEX, 55)
+        self.table.setColumnWidth(COLUMN_TYPE, 150)
+        self.table.selectionModel().currentRowChanged.connect(self.on_current_changed)
+        self.table.doubleClicked.connect(self.on_double_clicked)
+        self.model.rowsInserted.connect(self.update_count)
+        self.model.rowsRemoved.connect(self.update_count)
+        self.model.modelReset.connect(self.update_count)
+
+        top = QHBoxLayout()
+        top.addWidget(self.type_combo)
+        top.addWidget(self.count_label, 1)
+        bottom = QHBoxLayout()
+        bottom.addStretch(1)
+        bottom.addWidget(delete_btn)
+        layout = QVBoxLayout()
+        layout.addLayout(top)
+        layout.addWidget(self.query_input)
+        layout.addWidget(self.table)
+        layout.addLayout(bottom)
+        container = QWidget()
+        container.setLayout(layout)
+        self.setWidget(container)
+        self.update_count()
+
+    def set_program(self, operations, L_val, W_val):
+        """Из refresh_plot: новая программа — сброс, тот же список — только размер детали."""
+        if operations is not self.model.operations:
+            with metrics.timer("operations_reset"):
+                self.model.set_operations(operations, L_val, W_val)
+        elif (L_val, W_val) != (self.model.resolver.L, self.model.resolver.W):
+            self.model.set_panel_size(L_val, W_val)
+
+    def operation_added(self, idx):
+        if self._in_sync():
+            self.model.operation_added(idx)
+
+    def operation_changed(self, idx):
+        if self._in_sync():
+            self.model.operation_changed(idx)
+
+    def operation_removed(self, idx):
+        if self._in_sync():
+            self.model.operation_removed(idx)
+
+    def operations_changed(self, indices):
+        if self._in_sync():
+            self.model.operations_changed(indices)
+
+    def operations_added(self, first):
+        if self._in_sync():
+            self.model.operations_added(first)
+
+    def operations_removed(self, indices):
+        if self._in_sync():
+            self.model.operations_removed(indices)
+
+    def _in_sync(self):
+        """Список операций заменён целиком (отмена, открытие) — модель сбросит set_program."""
+        return self.model.operations is self.main_window.cad_operations
+
+    def select_operation(self, idx):
+        row = self.model.row_of(idx)
+        if row >= 0:
+            self.table.selectRow(row)
+            self.table.scrollTo(self.model.index(row, 0))
+
+    def on_filter_changed(self, _):
+        self.model.set_type_filter(self.type_combo.currentData())
+
+    def apply_query(self):
+        """Фильтр по строке запроса; найденные операции выделяются все."""
+        text = self.query_input.text().strip()
+        try:
+            query = parse_query(text) if text else None
+        except ValueError as e:
+            self.count_label.setText(f"Ошибка запроса: {e}")
+            return
+        self.model.set_query(query)
+        metrics.log_event("operations.query", query=text, found=self.model.rowCount())
+        if query is not None:
+            self.table.selectAll()
+
+    def selected_operations(self):
+        """Номера выделенных операций в программе."""
+        return [self.model.source_index(index.row()) for index in self.table.selectionModel().selectedRows()]
+
+    def delete_selected(self):
+        indices = self.selected_operations()
+        if not indices:
+            return
+        reply = QMessageBox.question(self, "Удаление", f"Удалить выбранные операции ({len(indices)})?",
+                                     QMessageBox.Yes | QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            self.main_window.delete_operations(indices)
+
+    def on_current_changed(self, current, _previous):
+        if current.isValid():
+            try:
+                self.main_window.plot.highlight_element(self.model.source_index(current.row()))
+            except Exception as e:
+                metrics.log_event("operations.highlight_failed", logging.WARNING, error=e)
+
+    def on_double_clicked(self, index):
+        self.main_window.edit_operation(self.model.source_index(index.row()))
+
+    def update_count(self, *_):
+        shown, total = self.model.rowCount(), len(self.model.operations)
+        self.count_label.setText(f"Операций: {total}" if shown == total else f"Показано {shown} из {total}")
+
+
+# === Бенчмарк ===
+
+def benchmark(count=100000, repeats=5):
+    """Сброс модели, прокрутка, сортировка по столбцам, фильтр и правки на count операциях."""
+    import random
+
+    from PyQt5.QtWidgets import QApplication
+
+    import renderer
+    import validation
+
+    logging.getLogger("up_editor").disabled = True
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    panel_data, operations = validation.make_random_program(count)
+    L_val, W_val = renderer.panel_size(panel_data)
+
+    def best(fn):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    model = OperationsModel()
+    view = QTableView()
+    view.setModel(model)
+    view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+    view.verticalHeader().setDefaultSectionSize(ROW_HEIGHT)
+    view.resize(700, 600)
+    view.show()
+
+    results = [("открытие (сброс модели)", best(lambda: model.set_operations(operations, L_val, W_val)))]
+    app.processEvents()
+    bar = view.verticalScrollBar()
+    rng = random.Random(0)
+
+    def scroll():
+        bar.setValue(rng.randrange(bar.maximum() + 1))
+        view.viewport().repaint()
+    results.append(("прокрутка в случайное место", best(scroll)))
+
+    start = time.perf_counter()
+    model.sort(2)
+    results.append(("первая сортировка по X (ключи)", time.perf_counter() - start))
+    for column in (COLUMN_TYPE, 4, 3, COLUMN_INDEX):
+        results.append((f"сортировка по «{COLUMNS[column]}»", best(lambda: model.sort(column, Qt.DescendingOrder))))
+    results.append(("фильтр по типу", best(lambda: model.set_type_filter(1))))
+    model.set_type_filter(None)
+    model.sort(2)
+
+    def edit():
+        i = rng.randrange(len(operations))
+        operations[i] = dict(operations[i], X1=str(rng.randrange(int(L_val))))
+        model.operation_changed(i)
+    results.append(("правка операции (сортировка по X)", best(edit)))
+
+    def add_remove():
+        operations.append(dict(operations[0]))
+        model.operation_added(len(operations) - 1)
+        del operations[0]
+        model.operation_removed(0)
+    results.append(("добавление + удаление", best(add_remove)))
+
+    print(f"Операций: {count}, лучшее из {repeats}")
+    for name, elapsed in results:
+        print(f"{name:40}{elapsed * 1000:10.2f} мс")
+    view.close()
+    del app
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 100000)
+    else:
+        print(__doc__)
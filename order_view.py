@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+"""
+Обзор заказа: все детали папки плиткой.
+
+Программы читаются xml_handler.load_xml и рисуются в растр пулом процессов
+(в GUI-поток возвращается только картинка и сводка — операции не пересылаются).
+Плитки появляются по мере готовности; растр каждой детали рисуется один раз
+и дальше только копируется. При прокрутке уже нарисованная часть окна
+сдвигается, перерисовываются лишь открывшиеся полосы и только видимые плитки.
+Клик по плитке открывает деталь в редакторе.
+
+    python order_view.py --bench 500
+"""
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PyQt5.QtCore import Qt, QRect, QThread, pyqtSignal
+from PyQt5.QtGui import QColor, QImage, QPainter, QPixmap
+from PyQt5.QtWidgets import (
+    QAbstractScrollArea, QDockWidget, QFileDialog, QHBoxLayout, QLabel,
+    QPushButton, QVBoxLayout, QWidget
+)
+
+import metrics
+import renderer
+
+
+# Растр детали: дюймы × dpi
+TILE_IMAGE_SIZE = (2.2, 1.4)
+TILE_DPI = 100
+# Ячейка плитки в окне, пикселей: растр + подпись
+CELL_WIDTH = 236
+CELL_HEIGHT = 176
+CAPTION_HEIGHT = 20
+MARGIN = 8
+
+
+def render_tile(panel_data, operations, dpi=TILE_DPI):
+    """Растр детали без заголовка: (ширина, высота, байты RGBA)."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = renderer.render_figure(panel_data, operations, TILE_IMAGE_SIZE[0], TILE_IMAGE_SIZE[1],
+                                 dpi, show_title=False)
+    canvas = FigureCanvasAgg(fig)
+    canvas.draw()
+    width, height = canvas.get_width_height()
+    return width, height, bytes(canvas.buffer_rgba())
+
+
+def _init_worker():
+    logging.getLogger("up_editor").disabled = True
+
+
+def prepare_tile(path):
+    """Задача пула: чтение программы и растр. Ошибка не роняет обзор — она в поле error."""
+    import xml_handler
+
+    try:
+        panel_data, operations = xml_handler.load_xml(path)
+        raster = render_tile(panel_data, operations)
+    except Exception as e:
+        return {"path": path, "error": str(e)}
+    length, width = renderer.panel_size(panel_data)
+    return {
+        "path": path,
+        "name": panel_data.get("PanelName") or os.path.basename(path),
+        "size": f"{length:g}×{width:g}",
+        "operations": len(operations),
+        "raster": raster,
+        "error": None,
+    }
+
+
+class OrderLoader(QThread):
+    """Раздаёт файлы пулу процессов и передаёт готовые плитки в GUI-поток."""
+    tile_ready = pyqtSignal(int, object)  # номер плитки, сводка с QImage
+    done = pyqtSignal(float)              # секунд на всю папку
+
+    def __init__(self, paths, jobs=None, parent=None):
+        super().__init__(parent)
+        self.paths = paths
+        self.jobs = jobs
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+        self.wait()
+
+    def run(self):
+        start = time.perf_counter()
+        pool = ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker)
+        try:
+            # Порядок отправки — порядок плиток: первый экран готов раньше
+            futures = {pool.submit(prepare_tile, path): i for i, path in enumerate(self.paths)}
+            for future in as_completed(futures):
+                if self._cancelled:
+                    break
+                tile = future.result()
+                raster = tile.pop("raster", None)
+                if raster is not None:
+                    # QImage можно собирать вне GUI-потока; QPixmap — только в нём
+                    width, height, data = raster
+                    tile["image"] = QImage(data, width, height, width * 4, QImage.Format_RGBA8888).copy()
+                self.tile_ready.emit(futures[future], tile)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+        elapsed = time.perf_counter() - start
+        if not self._cancelled:
+            metrics.log_event("order_view.loaded", files=len(self.paths), seconds=round(elapsed, 3))
+            self.done.emit(elapsed)
+
+
+class OrderView(QAbstractScrollArea):
+    """Сетка плиток с прокруткой; рисуются только попавшие в область перерисовки."""
+    tile_clicked = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.tiles = []    # сводка плитки или None, пока не готова
+        self.pixmaps = {}  # номер → QPixmap (растр копируется в окно, не перерисовывается)
+        self.viewport().setBackgroundRole(self.viewport().backgroundRole())
+        self.verticalScrollBar().setSingleStep(CELL_HEIGHT // 4)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+
+    def set_count(self, count):
+        self.tiles = [None] * count
+        self.pixmaps = {}
+        self.verticalScrollBar().setValue(0)
+        self.update_scrollbar()
+        self.viewport().update()
+
+    def set_tile(self, index, tile):
+        self.tiles[index] = tile
+        rect = self.tile_rect(index)
+        if rect.intersects(self.viewport().rect()):
+            self.viewport().update(rect)
+
+    # === Раскладка ===
+
+    def columns(self):
+        return max(1, self.viewport().width() // CELL_WIDTH)
+
+    def update_scrollbar(self):
+        rows = -(-len(self.tiles) // self.columns())
+        bar = self.verticalScrollBar()
+        bar.setPageStep(self.viewport().height())
+        bar.setRange(0, max(0, rows * CELL_HEIGHT - self.viewport().height()))
+
+    def tile_rect(self, index):
+        row, col = divmod(index, self.columns())
+        return QRect(col * CELL_WIDTH, row * CELL_HEIGHT - self.verticalScrollBar().value(),
+                     CELL_WIDTH, CELL_HEIGHT)
+
+    def index_at(self, pos):
+        col = pos.x() // CELL_WIDTH
+        if col >= self.columns():
+            return None
+        index = (pos.y() + self.verticalScrollBar().value()) // CELL_HEIGHT * self.columns() + col
+        return index if 0 <= index < len(self.tiles) else None
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_scrollbar()
+
+    def scrollContentsBy(self, dx, dy):
+        # Сдвиг готового изображения; paintEvent получит только открывшуюся полосу
+        self.viewport().scroll(dx, dy)
+
+    # === Рисование ===
+
+    def paintEvent(self, event):
+        area = event.rect()
+        columns = self.columns()
+        offset = self.verticalScrollBar().value()
+        first_row = max(0, (area.top() + offset) // CELL_HEIGHT)
+        last_row = (area.bottom() + offset) // CELL_HEIGHT
+        first_col = area.left() // CELL_WIDTH
+        last_col = min(columns - 1, area.right() // CELL_WIDTH)
+
+        painter = QPainter(self.viewport())
+        painter.fillRect(area, self.palette().base())
+        painted = 0
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                index = row * columns + col
+                if index >= len(self.tiles):
+                    break
+                self.paint_tile(painter, index)
+                painted += 1
+        painter.end()
+        metrics.count("order_tiles_painted", painted)
+
+    def paint_tile(self, painter, index):
+        cell = self.tile_rect(index)
+        image_rect = cell.adjusted(MARGIN, MARGIN, -MARGIN, -MARGIN - CAPTION_HEIGHT)
+        caption_rect = QRect(cell.left() + MARGIN, image_rect.bottom() + 2,
+                             cell.width() - 2 * MARGIN, CAPTION_HEIGHT)
+        tile = self.tiles[index]
+
+        if tile is None:
+            painter.fillRect(image_rect, QColor(235, 235, 235))
+            painter.drawText(image_rect, Qt.AlignCenter, "…")
+            return
+        if tile["error"]:
+            painter.fillRect(image_rect, QColor(255, 225, 225))
+            painter.drawText(image_rect, Qt.AlignCenter | Qt.TextWordWrap, "Ошибка чтения")
+            painter.drawText(caption_rect, Qt.AlignLeft | Qt.AlignVCenter,
+                             os.path.basename(tile["path"]))
+            return
+
+        pixmap = self.pixmaps.get(index)
+        if pixmap is None:
+            pixmap = QPixmap.fromImage(tile.pop("image"))
+            self.pixmaps[index] = pixmap
+        target = pixmap.size().scaled(image_rect.size(), Qt.KeepAspectRatio)
+        painter.drawPixmap(
+            QRect(image_rect.left() + (image_rect.width() - target.width()) // 2,
+                  image_rect.top() + (image_rect.height() - target.height()) // 2,
+                  target.width(), target.height()),
+            pixmap
+        )
+        caption = painter.fontMetrics().elidedText(
+            f"{tile['name']}  {tile['size']}", Qt.ElideRight, caption_rect.width())
+        painter.drawText(caption_rect, Qt.AlignLeft | Qt.AlignVCenter, caption)
+
+    # === Мышь ===
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            index = self.index_at(event.pos())
+            tile = self.tiles[index] if index is not None else None
+            if tile and not tile["error"]:
+                self.tile_clicked.emit(tile["path"])
+        super().mouseReleaseEvent(event)
+
+    def viewportEvent(self, event):
+        if event.type() == event.ToolTip:
+            index = self.index_at(event.pos())
+            tile = self.tiles[index] if index is not None else None
+            if tile:
+                text = tile["path"] if not tile["error"] else f"{tile['path']}\nОшибка: {tile['error']}"
+                if not tile["error"]:
+                    text += f"\nОпераций: {tile['operations']}"
+                self.setToolTip(text)
+            else:
+                self.setToolTip("")
+        return super().viewportEvent(event)
+
+
+class OrderDock(QDockWidget):
+    def __init__(self, main_window, jobs=None):
+        super().__init__("Обзор заказа", main_window)
+        self.main_window = main_window
+        self.jobs = jobs
+        self.folder = None
+        self.loader = None
+        self.loaded = 0
+
+        self.status_label = QLabel("Папка не выбрана")
+        self.status_label.setWordWrap(True)
+        choose_btn = QPushButton("Папка заказа…")
+        choose_btn.clicked.connect(self.choose_folder)
+        refresh_btn = QPushButton("Обновить")
+        refresh_btn.clicked.connect(lambda: self.set_folder(self.folder))
+
+        self.view = OrderView()
+        self.view.tile_clicked.connect(self.main_window.load_file)
+
+        top = QHBoxLayout()
+        top.addWidget(choose_btn)
+        top.addWidget(refresh_btn)
+        layout = QVBoxLayout()
+        layout.addLayout(top)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.view)
+        container = QWidget()
+        container.setLayout(layout)
+        self.setWidget(container)
+
+    def choose_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Папка заказа", self.folder or "")
+        if folder:
+            self.set_folder(folder)
+
+    def set_folder(self, folder):
+        if not folder:
+            return
+        self.stop_loader()
+        self.folder = folder
+        paths = [os.path.join(folder, n) for n in sorted(os.listdir(folder)) if n.lower().endswith(".xml")]
+        self.loaded = 0
+        self.view.set_count(len(paths))
+        self.status_label.setText(f"{folder}: 0 / {len(paths)}")
+
+        self.loader = OrderLoader(paths, self.jobs, self)
+        self.loader.tile_ready.connect(self.on_tile_ready)
+        self.loader.done.connect(self.on_done)
+        self.loader.start()
+
+    def on_tile_ready(self, index, tile):
+        # Плитки прежней папки, уже стоявшие в очереди событий при смене папки
+        if self.sender() is not self.loader or not 0 <= index < len(self.view.tiles):
+            return
+        self.view.set_tile(index, tile)
+        self.loaded += 1
+        self.status_label.setText(f"{self.folder}: {self.loaded} / {len(self.view.tiles)}")
+
+    def on_done(self, seconds):
+        if self.sender() is not self.loader:
+            return
+        errors = sum(1 for tile in self.view.tiles if tile and tile["error"])
+        text = f"{self.folder}: {len(self.view.tiles)} деталей за {seconds:.1f} с"
+        if errors:
+            text += f", ошибок чтения: {errors}"
+        self.status_label.setText(text)
+
+    def stop_loader(self):
+        if self.loader is not None:
+            loader, self.loader = self.loader, None
+            loader.tile_ready.disconnect(self.on_tile_ready)
+            loader.done.disconnect(self.on_done)
+            loader.cancel()
+            loader.deleteLater()
+
+    def shutdown(self):
+        """Останавливает загрузку (при закрытии главного окна)."""
+        self.stop_loader()
+
+
+# === Бенчмарк ===
+
+def benchmark(count=500, operations=200, jobs=None):
+    """Подготовка плиток для count программ: чтение + растр в пуле процессов."""
+    import random
+    import tempfile
+
+    import validation
+    import xml_handler
+
+    logging.getLogger("up_editor").disabled = True
+    folder = tempfile.mkdtemp(prefix="up_order_")
+    rng = random.Random(0)
+    paths = []
+    for i in range(count):
+        panel_data, ops = validation.make_random_program(
+            rng.randrange(operations // 2, operations * 2), L_val=rng.randrange(300, 2800),
+            W_val=rng.randrange(200, 900), seed=i)
+        path = os.path.join(folder, f"деталь_{i:04d}.xml")
+        xml_handler.save_xml(path, panel_data, ops)
+        paths.append(path)
+
+    start = time.perf_counter()
+    first = None
+    errors = 0
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker) as pool:
+        for tile in pool.map(prepare_tile, paths, chunksize=1):
+            if first is None:
+                first = time.perf_counter() - start
+            errors += bool(tile["error"])
+    elapsed = time.perf_counter() - start
+
+    print(f"Деталей: {count}, процессов: {jobs or os.cpu_count()}, ошибок: {errors}")
+    print(f"первая плитка через {first * 1000:.0f} мс, все — {elapsed:.1f} с "
+          f"({count / elapsed:.1f} деталей/с)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 500)
+    else:
+        print(__doc__)
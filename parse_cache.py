@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+Бинарный кэш разобранных программ: повторное открытие файла без ET.parse.
+
+Для каждого XML в папке кэша лежит <sha1 пути>.bin:
+
+    заголовок   — сигнатура, версия, размер файла, mtime_ns, sha1 содержимого
+    строки      — все строки программы (ключи и значения), склеенные через \\0
+    структура   — массив uint32: индексы строк для panel_data и cad_operations
+
+При открытии заголовок сверяется с файлом по размеру и mtime_ns — тёплое
+открытие не читает XML. Хэш содержимого проверяется, только если mtime
+изменился (файл скопировали или тронули) или включён verify_hash;
+при любом несовпадении или ошибке чтения — обычный разбор xml_handler.load_xml
+и перезапись кэша. Размер папки ограничен, старые записи удаляются (LRU по mtime).
+
+Сравнение холодного и тёплого открытия:
+
+    python parse_cache.py --bench 50000
+"""
+import hashlib
+import logging
+import os
+import struct
+import sys
+import time
+from array import array
+
+import metrics
+import xml_handler
+
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".up_editor", "parse_cache")
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+
+MAGIC = b"UPPC"
+VERSION = 1
+# сигнатура, версия, размер XML, mtime_ns, sha1 содержимого, длина строк, длина структуры
+HEADER = struct.Struct("<4sHQq20sQQ")
+
+# Значение поля "Vertexes": дальше в структуре идёт список вершин
+VERTEX_LIST = 0xFFFFFFFF
+
+
+# === Кодирование ===
+
+def encode_program(panel_data, operations):
+    """(panel_data, operations) → (байты строк, байты структуры)."""
+    strings = {}
+    table = []
+
+    def sid(text):
+        i = strings.get(text)
+        if i is None:
+            i = strings[text] = len(table)
+            table.append(text)
+        return i
+
+    out = array("I")
+    out.append(len(panel_data))
+    for key, value in panel_data.items():
+        out.append(sid(key))
+        out.append(sid(str(value)))
+
+    out.append(len(operations))
+    for op in operations:
+        out.append(len(op))
+        for key, value in op.items():
+            out.append(sid(key))
+            if isinstance(value, list):
+                out.append(VERTEX_LIST)
+                out.append(len(value))
+                for v in value:
+                    out.append(len(v))
+                    for vk, vv in v.items():
+                        out.append(sid(vk))
+                        out.append(sid(str(vv)))
+            else:
+                out.append(sid(str(value)))
+
+    blob = "\0".join(table).encode("utf-8")
+    if out.itemsize != 4:
+        raise RuntimeError("array('I') не 32-битный на этой платформе")
+    if sys.byteorder != "little":
+        out.byteswap()
+    return blob, out.tobytes()
+
+
+def decode_program(blob, structure):
+    """Обратное к encode_program."""
+    table = blob.decode("utf-8").split("\0")
+    data = array("I")
+    data.frombytes(structure)
+    if sys.byteorder != "little":
+        data.byteswap()
+    values = data.tolist()
+
+    pos = 0
+    n = values[pos]
+    pos += 1
+    panel_data = {}
+    for _ in range(n):
+        panel_data[table[values[pos]]] = table[values[pos + 1]]
+        pos += 2
+
+    n_ops = values[pos]
+    pos += 1
+    operations = []
+    append = operations.append
+    for _ in range(n_ops):
+        n_fields = values[pos]
+        pos += 1
+        op = {}
+        for _ in range(n_fields):
+            key = table[values[pos]]
+            ref = values[pos + 1]
+            pos += 2
+            if ref == VERTEX_LIST:
+                n_vert = values[pos]
+                pos += 1
+                vertexes = []
+                for _ in range(n_vert):
+                    n_vf = values[pos]
+                    pos += 1
+                    end = pos + 2 * n_vf
+                    refs = values[pos:end]
+                    vertexes.append({table[refs[j]]: table[refs[j + 1]] for j in range(0, 2 * n_vf, 2)})
+                    pos = end
+                op[key] = vertexes
+            else:
+                op[key] = table[ref]
+        append(op)
+
+    if pos != len(values):
+        raise ValueError("лишние данные в структуре кэша")
+    return panel_data, operations
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+# === Кэш ===
+
+class ParseCache:
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, verify_hash=False):
+        """
+        :param verify_hash: сверять sha1 содержимого при каждом открытии, даже
+                            если размер и mtime совпали (читает весь файл)
+        """
+        self.cache_dir = cache_dir or DEFAULT_DIR
+        self.max_bytes = max_bytes
+        self.verify_hash = verify_hash
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def entry_path(self, file_path):
+        key = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key + ".bin")
+
+    def load(self, file_path):
+        """
+        Возвращает (panel_data, operations) из кэша или None.
+        """
+        entry = self.entry_path(file_path)
+        try:
+            st = os.stat(file_path)
+            with open(entry, "rb") as f:
+                header = f.read(HEADER.size)
+                magic, version, size, mtime_ns, sha1, blob_len, struct_len = HEADER.unpack(header)
+                if magic != MAGIC or version != VERSION or size != st.st_size:
+                    return None
+                if mtime_ns != st.st_mtime_ns or self.verify_hash:
+                    if file_sha1(file_path) != sha1:
+                        return None
+                blob = f.read(blob_len)
+                structure = f.read(struct_len)
+            if len(blob) != blob_len or len(structure) != struct_len:
+                return None
+            result = decode_program(blob, structure)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            metrics.log_event("parse_cache.corrupt", logging.WARNING, path=file_path, error=e)
+            return None
+
+        if mtime_ns != st.st_mtime_ns:
+            # Содержимое то же (файл скопировали/тронули) — обновим заголовок
+            self.store(file_path, *result, sha1=sha1)
+        else:
+            # LRU: время последнего использования — mtime записи
+            try:
+                os.utime(entry)
+            except OSError:
+                pass
+        return result
+
+    def store(self, file_path, panel_data, operations, sha1=None):
+        st = os.stat(file_path)
+        if sha1 is None:
+            sha1 = file_sha1(file_path)
+        blob, structure = encode_program(panel_data, operations)
+        entry = self.entry_path(file_path)
+        tmp = f"{entry}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, st.st_size, st.st_mtime_ns, sha1, len(blob), len(structure)))
+            f.write(blob)
+            f.write(structure)
+        os.replace(tmp, entry)
+        metrics.count("parse_cache_bytes_written", HEADER.size + len(blob) + len(structure))
+        self.evict()
+
+    def evict(self):
+        """Удаляет самые старые записи, пока папка больше max_bytes."""
+        entries = []
+        total = 0
+        for e in os.scandir(self.cache_dir):
+            if e.name.endswith(".bin"):
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return 0
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+_default_cache = None
+
+
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ParseCache()
+    return _default_cache
+
+
+def load_xml_cached(file_path, cache=None):
+    """
+    Как xml_handler.load_xml, но с бинарным кэшем.
+    """
+    cache = cache or default_cache()
+    with metrics.timer("parse_cache_load"):
+        result = cache.load(file_path)
+    if result is not None:
+        metrics.count("parse_cache_hits")
+        return result
+
+    metrics.count("parse_cache_misses")
+    panel_data, operations = xml_handler.load_xml(file_path)
+    try:
+        cache.store(file_path, panel_data, operations)
+    except Exception as e:
+        metrics.log_event("parse_cache.store_failed", logging.WARNING, path=file_path, error=e)
+    return panel_data, operations
+
+
+# === Бенчмарк ===
+
+def benchmark(count=50000, repeat=3):
+    import tempfile
+    import validation
+
+    folder = tempfile.mkdtemp(prefix="up_parse_cache_")
+    xml_path = os.path.join(folder, "bench.xml")
+    panel_data, operations = validation.make_random_program(count)
+    logging.getLogger("up_editor").disabled = True
+    xml_handler.save_xml(xml_path, panel_data, operations)
+    cache = ParseCache(os.path.join(folder, "cache"))
+
+    def best(func):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            times.append(time.perf_counter() - start)
+        return min(times), result
+
+    cold, reference = best(lambda: xml_handler.load_xml(xml_path))
+    load_xml_cached(xml_path, cache)  # заполняем кэш
+    warm, cached = best(lambda: load_xml_cached(xml_path, cache))
+    cache.verify_hash = True
+    warm_hash, _ = best(lambda: load_xml_cached(xml_path, cache))
+
+    assert cached == reference, "кэш вернул другую программу"
+    size_xml = os.path.getsize(xml_path)
+    size_bin = os.path.getsize(cache.entry_path(xml_path))
+    print(f"Операций: {len(reference[1])}, XML {size_xml / 1e6:.1f} МБ, кэш {size_bin / 1e6:.1f} МБ")
+    print(f"холодное (ET.parse):          {cold * 1000:8.1f} мс")
+    print(f"тёплое (кэш, размер + mtime): {warm * 1000:8.1f} мс  ×{cold / warm:.1f}")
+    print(f"тёплое (кэш + sha1):          {warm_hash * 1000:8.1f} мс  ×{cold / warm_hash:.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 50000)
+    else:
+        print(__doc__)
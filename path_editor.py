@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Таблица вершин пути фрезеровки (Path) для edit_path_dialog.
+
+VertexModel работает прямо со списком словарей вершин — тем же, что уходит
+в операцию при сохранении: ни виджетов в ячейках, ни обратного чтения таблицы.
+Выпадающие списки типа и направления дуги создаёт VertexDelegate только
+на время правки одной ячейки, поэтому контур в тысячи вершин открывается сразу.
+
+Вставка и удаление — пачками (beginInsertRows/beginRemoveRows на диапазон),
+в том числе вставка вершин из буфера обмена (строки «X Y», «X Y R [D]»
+или «Тип X Y [R D]», разделители — табуляция, «;» или пробелы).
+Первая вершина всегда начальная точка (Point).
+"""
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PyQt5.QtWidgets import QComboBox, QStyledItemDelegate
+
+
+COLUMNS = ("Тип", "X1", "Y1", "Radius", "Напр.")
+COLUMN_TYPE, COLUMN_X, COLUMN_Y, COLUMN_RADIUS, COLUMN_DIRECTION = range(5)
+VERTEX_TYPES = ("Line", "Arc")
+DIRECTIONS = ("0", "1")
+FIELDS = {COLUMN_X: "X1", COLUMN_Y: "Y1", COLUMN_RADIUS: "Radius", COLUMN_DIRECTION: "Direction"}
+
+
+def make_vertex(vertex_type, x="0", y="0", radius="0", direction="1"):
+    """Вершина в формате xml_handler (Point/Line/Arc)."""
+    vertex = {"type": vertex_type, "X1": x, "Y1": y, "Z1": "0.00", "VertexType": "0"}
+    if vertex_type == "Arc":
+        vertex["Radius"] = radius
+        vertex["Direction"] = direction
+    return vertex
+
+
+def parse_vertices(text):
+    """
+    Вершины из текста (по строке на вершину). Пустые строки пропускаются;
+    строка, из которой не выходит вершина, — ValueError с её номером.
+    """
+    vertices = []
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        if "\t" in line:
+            fields = [f.strip() for f in line.split("\t")]
+        elif ";" in line:
+            fields = [f.strip() for f in line.split(";")]
+        else:
+            fields = line.split()
+        fields = [f.replace(",", ".") for f in fields if f]
+        vertex_type = None
+        if fields and fields[0].capitalize() in ("Point",) + VERTEX_TYPES:
+            vertex_type = fields.pop(0).capitalize()
+        if len(fields) < 2 or len(fields) > 4:
+            raise ValueError(f"Строка {number}: нужно «X Y», «X Y R» или «X Y R D»")
+        if vertex_type is None:
+            vertex_type = "Arc" if len(fields) > 2 else "Line"
+        if vertex_type == "Arc":
+            radius = fields[2] if len(fields) > 2 else "0"
+            direction = fields[3] if len(fields) > 3 else "1"
+            if direction not in DIRECTIONS:
+                raise ValueError(f"Строка {number}: направление дуги — 0 или 1")
+            vertices.append(make_vertex("Arc", fields[0], fields[1], radius, direction))
+        else:
+            vertices.append(make_vertex(vertex_type, fields[0], fields[1]))
+    return vertices
+
+
+class VertexModel(QAbstractTableModel):
+    """Вершины пути; vertexes — список словарей, который правится на месте."""
+
+    def __init__(self, vertexes, parent=None):
+        super().__init__(parent)
+        self.vertexes = vertexes
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.vertexes)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        return COLUMNS[section] if orientation == Qt.Horizontal else str(section + 1)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        row, column = index.row(), index.column()
+        vertex = self.vertexes[row]
+        if column == COLUMN_TYPE:
+            return "Point" if row == 0 else vertex.get("type", "Line")
+        if column in (COLUMN_RADIUS, COLUMN_DIRECTION) and not self.is_arc(row):
+            return ""
+        return vertex.get(FIELDS[column], "")
+
+    def flags(self, index):
+        flags = super().flags(index)
+        row, column = index.row(), index.column()
+        if column == COLUMN_TYPE and row == 0:
+            return flags
+        if column in (COLUMN_RADIUS, COLUMN_DIRECTION) and not self.is_arc(row):
+            return flags
+        return flags | Qt.ItemIsEditable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        row, column = index.row(), index.column()
+        vertex = self.vertexes[row]
+        value = str(value).strip()
+        if column == COLUMN_TYPE:
+            if row == 0 or value not in VERTEX_TYPES or value == vertex.get("type"):
+                return False
+            vertex["type"] = value
+            if value == "Arc":
+                vertex.setdefault("Radius", "0")
+                vertex.setdefault("Direction", "1")
+            else:
+                vertex.pop("Radius", None)
+                vertex.pop("Direction", None)
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(COLUMNS) - 1))
+            return True
+        if column == COLUMN_DIRECTION and value not in DIRECTIONS:
+            return False
+        if vertex.get(FIELDS[column]) == value:
+            return False
+        vertex[FIELDS[column]] = value
+        self.dataChanged.emit(index, index)
+        return True
+
+    def is_arc(self, row):
+        return row > 0 and self.vertexes[row].get("type") == "Arc"
+
+    # === Вставка и удаление пачками ===
+
+    def insert_vertices(self, row, vertices):
+        """Вставляет вершины перед строкой row (row = rowCount() — в конец)."""
+        if not vertices:
+            return
+        self.beginInsertRows(QModelIndex(), row, row + len(vertices) - 1)
+        self.vertexes[row:row] = vertices
+        self.endInsertRows()
+        if row == 0:
+            self._normalize_start()
+
+    def remove_vertices(self, rows):
+        """Удаляет строки rows: каждый непрерывный диапазон — одним сигналом, с конца."""
+        rows = sorted(set(rows))
+        if not rows:
+            return
+        ranges = []
+        start = end = rows[0]
+        for row in rows[1:]:
+            if row == end + 1:
+                end = row
+            else:
+                ranges.append((start, end))
+                start = end = row
+        ranges.append((start, end))
+        for first, last in reversed(ranges):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.vertexes[first:last + 1]
+            self.endRemoveRows()
+        if rows[0] == 0:
+            self._normalize_start()
+
+    def _normalize_start(self):
+        """Новая первая вершина становится начальной точкой."""
+        if not self.vertexes:
+            return
+        vertex = self.vertexes[0]
+        if vertex.get("type") != "Point":
+            vertex["type"] = "Point"
+            vertex.pop("Radius", None)
+            vertex.pop("Direction", None)
+            self.dataChanged.emit(self.index(0, 0), self.index(0, len(COLUMNS) - 1))
+
+
+class VertexDelegate(QStyledItemDelegate):
+    """Выпадающие списки типа вершины и направления дуги — только на время правки."""
+
+    def createEditor(self, parent, option, index):
+        choices = {COLUMN_TYPE: VERTEX_TYPES, COLUMN_DIRECTION: DIRECTIONS}.get(index.column())
+        if choices is None:
+            return super().createEditor(parent, option, index)
+        editor = QComboBox(parent)
+        editor.addItems(choices)
+        # Выбор из списка сразу записывается в модель
+        editor.activated.connect(lambda _: (self.commitData.emit(editor), self.closeEditor.emit(editor)))
+        return editor
+
+    def setEditorData(self, editor, index):
+        if isinstance(editor, QComboBox):
+            editor.setCurrentText(index.data(Qt.EditRole))
+        else:
+            super().setEditorData(editor, index)
+
+    def setModelData(self, editor, model, index):
+        if isinstance(editor, QComboBox):
+            model.setData(index, editor.currentText(), Qt.EditRole)
+        else:
+            super().setModelData(editor, model, index)
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+Упрощение путей фрезеровки (Path) из CAD: тысячи мелких Line-вершин
+заменяются длинными отрезками и дугами.
+
+Алгоритм — Дуглас–Пейкер, но все диапазоны одного уровня обрабатываются
+вместе массивами numpy, поэтому число проходов Python ~ log(число вершин):
+
+    1. диапазон, все точки которого ближе tolerance к хорде, — один Line;
+    2. иначе — окружность через концы и самую далёкую точку: если все точки
+       и середины отрезков ближе tolerance к ней, дуга меньше MAX_SWEEP и точки
+       идут по ней по порядку — один Arc (Radius, Direction);
+    3. иначе диапазон делится в самой далёкой от хорды точке.
+
+Вершины, которые остаются, сохраняют исходные строки координат. Удаляются
+только вершины с числовыми координатами между числовыми соседями с той же Z1 —
+пути с формулами L/W остаются верными при любом размере детали.
+
+    python path_simplify.py вход.xml выход.xml --tolerance 0.05
+    python path_simplify.py --bench 100000
+"""
+import math
+import sys
+import time
+
+import numpy as np
+
+from renderer import panel_size, parse_coord
+
+
+# Допуск отклонения, мм
+TOLERANCE = 0.05
+# Наибольший угол дуги, градусы (у полуокружности центр неустойчив к округлению радиуса)
+MAX_SWEEP = 170.0
+# Больший радиус — это уже прямая
+MAX_RADIUS = 100000.0
+# Знаков радиуса в XML
+RADIUS_DECIMALS = 3
+
+
+def _is_number(text):
+    text = str(text).strip()
+    if text.startswith('-'):
+        text = text[1:]
+    return text.replace('.', '', 1).isdigit()
+
+
+def vertex_points(vertexes, L_val, W_val):
+    """
+    Координаты вершин (n, 2) и маска вершин с числовыми X1/Y1.
+    Выгрузки CAD — сплошь числа: тогда одно преобразование массивом.
+    """
+    xs = [v.get("X1", "0") for v in vertexes]
+    ys = [v.get("Y1", "0") for v in vertexes]
+    try:
+        points = np.column_stack((np.array(xs, dtype=float), np.array(ys, dtype=float)))
+        return points, np.ones(len(vertexes), dtype=bool)
+    except ValueError:
+        pass
+    points = np.array([
+        (parse_coord(x, L_val, W_val, is_path=True), parse_coord(y, L_val, W_val, is_y=True, is_path=True))
+        for x, y in zip(xs, ys)
+    ])
+    numeric = np.array([_is_number(x) and _is_number(y) for x, y in zip(xs, ys)])
+    return points, numeric
+
+
+def removable_mask(vertexes, numeric):
+    """
+    Какие вершины можно удалять: Line с числовыми X1/Y1, следующая тоже Line,
+    соседи с числовыми координатами, Z1 и VertexType как у соседей.
+    """
+    n = len(vertexes)
+    mask = np.zeros(n, dtype=bool)
+    if n < 3:
+        return mask
+    is_line = np.array([v.get("type") == "Line" for v in vertexes])
+    level = np.array([f'{v.get("Z1", "0")}'.strip() + "|" + f'{v.get("VertexType", "0")}'.strip()
+                      for v in vertexes])
+    mask[1:-1] = (
+        is_line[1:-1] & is_line[2:]
+        & numeric[:-2] & numeric[1:-1] & numeric[2:]
+        & (level[:-2] == level[1:-1]) & (level[1:-1] == level[2:])
+    )
+    return mask
+
+
+def _segment_ranges(starts, ends):
+    """Индексы внутренних точек всех диапазонов (starts, ends] подряд и номер диапазона для каждой."""
+    counts = ends - starts
+    seg = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    idx = np.arange(counts.sum()) - offsets[seg] + starts[seg] + 1
+    return idx, seg, offsets
+
+
+def simplify_points(points, removable, tolerance=TOLERANCE):
+    """
+    points — массив (n, 2) координат, removable — маска удаляемых вершин.
+    Возвращает (keep, radius, direction):
+        keep      — маска оставшихся вершин;
+        radius    — радиус дуги, которая заканчивается в вершине (nan — отрезок);
+        direction — 1/0 для дуг (как в renderer.calculate_arc_center).
+    """
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    keep = ~removable
+    keep[0] = keep[-1] = True
+    radius = np.full(n, np.nan)
+    direction = np.zeros(n, dtype=int)
+
+    fixed = np.flatnonzero(keep)
+    starts, ends = fixed[:-1], fixed[1:]
+    busy = ends - starts > 1
+    starts, ends = starts[busy], ends[busy]
+    max_sweep = math.radians(MAX_SWEEP)
+
+    while len(starts):
+        inner = ends - starts - 1
+        # Все точки диапазона кроме начальной (включая конечную): S+1 .. E
+        idx, seg, offsets = _segment_ranges(starts, ends)
+        A = points[starts][seg]
+        B = points[ends][seg]
+        Q = points[idx]
+
+        # 1. Расстояние до хорды (до отрезка — ловит и возвраты назад)
+        AB = B - A
+        AQ = Q - A
+        ab2 = np.einsum("ij,ij->i", AB, AB)
+        t = np.clip(np.einsum("ij,ij->i", AQ, AB) / np.where(ab2 > 0, ab2, 1.0), 0.0, 1.0)
+        dist = np.hypot(*(AQ - t[:, None] * AB).T)
+        dmax = np.maximum.reduceat(dist, offsets)
+        line_ok = dmax <= tolerance
+
+        first = np.flatnonzero(dist == dmax[seg])
+        _, pos = np.unique(seg[first], return_index=True)
+        split_at = idx[first[pos]]
+
+        # 2. Дуга через начало, самую далёкую точку и конец
+        S = points[starts]
+        M = points[split_at]
+        E = points[ends]
+        ax_, ay_ = S.T
+        bx_, by_ = M.T
+        cx_, cy_ = E.T
+        d = 2 * (ax_ * (by_ - cy_) + bx_ * (cy_ - ay_) + cx_ * (ay_ - by_))
+        ok = np.abs(d) > 1e-12
+        d = np.where(ok, d, 1.0)
+        a2 = ax_ ** 2 + ay_ ** 2
+        b2 = bx_ ** 2 + by_ ** 2
+        c2 = cx_ ** 2 + cy_ ** 2
+        centers = np.column_stack((
+            (a2 * (by_ - cy_) + b2 * (cy_ - ay_) + c2 * (ay_ - by_)) / d,
+            (a2 * (cx_ - bx_) + b2 * (ax_ - cx_) + c2 * (bx_ - ax_)) / d,
+        ))
+        # Радиус — как он будет записан (вверх, чтобы не стал меньше половины хорды),
+        # центр — как его построит renderer.calculate_arc_center по радиусу и стороне
+        scale = 10 ** RADIUS_DECIMALS
+        R = np.ceil(np.hypot(*(S - centers).T) * scale) / scale
+        chord = E - S
+        half_chord = np.hypot(*chord.T) / 2
+        ok &= half_chord > 0
+        normal = np.column_stack((-chord[:, 1], chord[:, 0])) / np.where(ok, 2 * half_chord, 1.0)[:, None]
+        mid = (S + E) / 2
+        side = np.where(np.einsum("ij,ij->i", centers - mid, normal) >= 0, 1.0, -1.0)
+        centers = mid + (side * np.sqrt(np.maximum(R ** 2 - half_chord ** 2, 0.0)))[:, None] * normal
+        ok &= ~line_ok & (inner >= 2) & (R <= MAX_RADIUS)
+
+        C = centers[seg]
+        Rs = R[seg]
+        CQ = Q - C
+        dev = np.abs(np.hypot(*CQ.T) - Rs)
+        # Середина каждого отрезка отстоит от дуги на стрелку прогиба
+        P_prev = points[idx - 1]
+        half = np.hypot(*(Q - P_prev).T) / 2
+        sagitta = Rs - np.sqrt(np.maximum(Rs ** 2 - half ** 2, 0.0))
+        dev = np.maximum(dev, sagitta)
+        arc_dev = np.maximum.reduceat(dev, offsets)
+
+        # Точки идут по дуге монотонно в одну сторону, дуга < MAX_SWEEP
+        orient = np.sign((M[:, 0] - S[:, 0]) * (E[:, 1] - S[:, 1]) - (M[:, 1] - S[:, 1]) * (E[:, 0] - S[:, 0]))
+        theta0 = np.arctan2(S[:, 1] - centers[:, 1], S[:, 0] - centers[:, 0])
+        ang = (np.arctan2(CQ[:, 1], CQ[:, 0]) - theta0[seg]) * orient[seg]
+        ang = np.mod(ang, 2 * np.pi)
+        prev_ang = np.concatenate(([0.0], ang[:-1]))
+        prev_ang[offsets] = 0.0
+        step = ang - prev_ang
+        sweep = ang[offsets + inner]
+        monotonic = np.minimum.reduceat(step, offsets) > -1e-9
+        arc_ok = ok & (arc_dev <= tolerance) & monotonic & (sweep <= max_sweep) & (sweep > 0)
+
+        if arc_ok.any():
+            ends_arc = ends[arc_ok]
+            radius[ends_arc] = R[arc_ok]
+            # Сторона центра относительно хорды: нормаль (-uy, ux), как в calculate_arc_center
+            direction[ends_arc] = (side[arc_ok] > 0).astype(int)
+
+        # 3. Остальное делим в самой далёкой точке
+        split = ~line_ok & ~arc_ok
+        s_at = split_at[split]
+        keep[s_at] = True
+        new_starts = np.concatenate((starts[split], s_at))
+        new_ends = np.concatenate((s_at, ends[split]))
+        busy = new_ends - new_starts > 1
+        starts, ends = new_starts[busy], new_ends[busy]
+
+    return keep, radius, direction
+
+
+def format_radius(value):
+    # Уже округлён вверх в simplify_points
+    return f"{value:.{RADIUS_DECIMALS}f}".rstrip('0').rstrip('.')
+
+
+def simplify_path(op, L_val, W_val, tolerance=TOLERANCE):
+    """
+    Упрощённая копия операции Path и счётчики {"before", "after", "arcs"}.
+    """
+    vertexes = op.get("Vertexes", [])
+    stats = {"before": len(vertexes), "after": len(vertexes), "arcs": 0}
+    if len(vertexes) < 3:
+        return op, stats
+
+    points, numeric = vertex_points(vertexes, L_val, W_val)
+    removable = removable_mask(vertexes, numeric)
+    if not removable.any():
+        return op, stats
+    keep, radius, direction = simplify_points(points, removable, tolerance)
+
+    new_vertexes = []
+    for k in np.flatnonzero(keep):
+        v = vertexes[k]
+        if not np.isnan(radius[k]):
+            v = {
+                "type": "Arc",
+                "X1": v.get("X1", "0"),
+                "Y1": v.get("Y1", "0"),
+                "Z1": v.get("Z1", "0.00"),
+                "VertexType": v.get("VertexType", "0"),
+                "Radius": format_radius(radius[k]),
+                "Direction": str(direction[k]),
+            }
+            stats["arcs"] += 1
+        new_vertexes.append(v)
+
+    new_op = dict(op)
+    new_op["Vertexes"] = new_vertexes
+    stats["after"] = len(new_vertexes)
+    return new_op, stats
+
+
+def simplify_program(panel_data, operations, tolerance=TOLERANCE):
+    """
+    Упрощает все Path программы.
+    Возвращает (новый список операций, {индекс: stats} изменённых путей).
+    """
+    L_val, W_val = panel_size(panel_data)
+    result = []
+    changed = {}
+    for idx, op in enumerate(operations):
+        if op.get("TypeName") == "Path":
+            new_op, stats = simplify_path(op, L_val, W_val, tolerance)
+            if stats["after"] < stats["before"]:
+                changed[idx] = stats
+                op = new_op
+        result.append(op)
+    return result, changed
+
+
+def format_stats(changed):
+    before = sum(s["before"] for s in changed.values())
+    after = sum(s["after"] for s in changed.values())
+    arcs = sum(s["arcs"] for s in changed.values())
+    if not changed:
+        return "Упрощать нечего."
+    return (f"Путей упрощено: {len(changed)}, вершин: {before} → {after} "
+            f"(−{100 * (before - after) / before:.1f}%), из них дуг: {arcs}")
+
+
+# === Бенчмарк ===
+
+def make_cad_path(count, seed=0, step=0.5):
+    """Синтетический путь из CAD: прямые и дуги, нарезанные на отрезки по step мм, с шумом."""
+    rng = np.random.default_rng(seed)
+    points = [(0.0, 0.0)]
+    heading = 0.0
+    while len(points) < count:
+        x, y = points[-1]
+        n = int(rng.integers(20, 400))
+        if rng.random() < 0.5:
+            for i in range(1, n + 1):
+                points.append((x + i * step * math.cos(heading), y + i * step * math.sin(heading)))
+        else:
+            r = float(rng.uniform(20, 300))
+            turn = 1 if rng.random() < 0.5 else -1
+            cx = x - turn * r * math.sin(heading)
+            cy = y + turn * r * math.cos(heading)
+            a0 = math.atan2(y - cy, x - cx)
+            for i in range(1, n + 1):
+                a = a0 + turn * i * step / r
+                points.append((cx + r * math.cos(a), cy + r * math.sin(a)))
+            heading += turn * n * step / r
+    points = np.array(points[:count]) + rng.normal(0, 0.005, (count, 2))
+    vertexes = [{"type": "Point" if i == 0 else "Line", "X1": f"{x:.3f}", "Y1": f"{y:.3f}",
+                 "Z1": "0.00", "VertexType": "0"} for i, (x, y) in enumerate(points)]
+    return {"TypeName": "Path", "Width": "8", "Depth": "5", "Correction": "2", "CorrectionExtra": "0",
+            "Close": "0", "Empty": "0", "Relative": "0", "Enable": "1", "Vertexes": vertexes}
+
+
+def benchmark(count=100000, tolerance=TOLERANCE):
+    op = make_cad_path(count)
+    start = time.perf_counter()
+    new_op, stats = simplify_path(op, 10000.0, 10000.0, tolerance)
+    elapsed = time.perf_counter() - start
+    print(f"Вершин: {stats['before']} → {stats['after']} (дуг {stats['arcs']}), "
+          f"допуск {tolerance} мм, время {elapsed * 1000:.0f} мс")
+    return elapsed
+
+
+def main(argv):
+    import argparse
+
+    if argv and argv[0] == "--bench":
+        benchmark(int(argv[1]) if len(argv) > 1 else 100000)
+        return 0
+
+    import xml_handler
+
+    parser = argparse.ArgumentParser(description="Упрощение путей фрезеровки")
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="допуск, мм")
+    args = parser.parse_args(argv)
+
+    panel_data, operations = xml_handler.load_xml(args.src)
+    operations, changed = simplify_program(panel_data, operations, args.tolerance)
+    xml_handler.save_xml(args.dst, panel_data, operations)
+    print(format_stats(changed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Режим профилирования редактора.
+
+Включается флагом --profile в main.py (или --profile=папка) либо
+переменной окружения UPEDITOR_PROFILE=1 / UPEDITOR_PROFILE=папка.
+Оборачивает действия:
+
+    EditorWindow.load_file, EditorWindow.redraw_plot,
+    PlotWidget.on_click, xml_handler.save_xml
+
+Каждое действие профилируется cProfile (накопительно по всем вызовам),
+параллельно фоновый поток снимает стеки главного потока (сэмплинг).
+При выходе в папку пишутся:
+
+    <действие>.prof   — дамп cProfile (snakeviz, pstats)
+    <действие>.txt    — топ функций по cumtime
+    stacks.folded     — стеки в формате "a;b;c N" для flamegraph.pl / speedscope
+
+refresh_plot только помечает чертёж к перерисовке — сама перерисовка
+(redraw_plot) выполняется отдельно, после действия. Вложенные вызовы
+учитываются во внешнем действии — cProfile не умеет профилировать два действия сразу.
+Профилируется только главный поток: те же функции, вызванные из фоновых
+потоков (xml_handler.save_xml в автосохранении), выполняются без обёртки и
+не трогают состояние текущего действия.
+"""
+import atexit
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from functools import wraps
+
+import metrics
+
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".up_editor", "profiles")
+
+
+class Profiler:
+    def __init__(self, out_dir, interval=0.002):
+        """
+        :param out_dir: папка для дампов
+        :param interval: период сэмплинга стеков, сек
+        """
+        self.out_dir = out_dir
+        self.interval = interval
+        self.profiles = {}       # действие → cProfile.Profile
+        self.calls = {}          # действие → число вызовов
+        self.stacks = {}         # "действие;кадр;кадр" → число сэмплов
+        self._active = None      # текущее внешнее действие
+        self._depth = 0
+        self._main_ident = threading.main_thread().ident
+        self._stop = threading.Event()
+        self._sampler = None
+
+    # === Обёртки ===
+
+    def wrap(self, owner, attr, action=None):
+        """
+        Заменяет owner.attr (метод класса или функцию модуля) профилирующей обёрткой.
+        Вызывать до создания окна — mpl_connect запоминает связанный метод.
+        """
+        func = getattr(owner, attr)
+        action = action or f"{getattr(owner, '__name__', owner)}.{attr}"
+        profiler = self
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return profiler.run(action, func, *args, **kwargs)
+
+        setattr(owner, attr, wrapper)
+        return wrapper
+
+    def run(self, action, func, *args, **kwargs):
+        if threading.get_ident() != self._main_ident:
+            # Фоновый поток: сэмплер видит только главный, а _active/_depth — его действие
+            return func(*args, **kwargs)
+        self.calls[action] = self.calls.get(action, 0) + 1
+        if self._depth > 0:
+            # Вложенный вызов — уже внутри внешнего профиля
+            self._depth += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._depth -= 1
+
+        profile = self.profiles.get(action)
+        if profile is None:
+            profile = self.profiles[action] = cProfile.Profile()
+        self._depth = 1
+        self._active = action
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            self._active = None
+            self._depth = 0
+            metrics.log_event("profile.action", action=action,
+                              ms=round((time.perf_counter() - start) * 1000, 1))
+
+    # === Сэмплинг стеков ===
+
+    def start_sampler(self):
+        if self._sampler is not None:
+            return
+        self._sampler = threading.Thread(target=self._sample_loop, name="profile-sampler", daemon=True)
+        self._sampler.start()
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            action = self._active
+            if action is None:
+                continue
+            frame = sys._current_frames().get(self._main_ident)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                # Собственные обёртки профилировщика в стек не пишем
+                if code.co_filename != __file__:
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            names.append(action)
+            key = ";".join(reversed(names))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    # === Запись результатов ===
+
+    def dump(self):
+        self._stop.set()
+        os.makedirs(self.out_dir, exist_ok=True)
+        for action, profile in self.profiles.items():
+            name = action.replace(".", "_")
+            profile.dump_stats(os.path.join(self.out_dir, f"{name}.prof"))
+
+            text = io.StringIO()
+            stats = pstats.Stats(profile, stream=text)
+            stats.sort_stats("cumulative").print_stats(30)
+            with open(os.path.join(self.out_dir, f"{name}.txt"), "w", encoding="utf-8") as f:
+                f.write(f"{action}: вызовов {self.calls.get(action, 0)}\n\n")
+                f.write(text.getvalue())
+
+        with open(os.path.join(self.out_dir, "stacks.folded"), "w", encoding="utf-8") as f:
+            for key, n in sorted(self.stacks.items()):
+                f.write(f"{key} {n}\n")
+        return self.out_dir
+
+
+def profile_dir_from(argv, environ=os.environ):
+    """
+    Разбирает --profile / --profile=папка (удаляя их из argv) и UPEDITOR_PROFILE.
+    Возвращает папку для дампов или None, если профилирование выключено.
+    """
+    out_dir = None
+    for arg in list(argv):
+        if arg == "--profile" or arg.startswith("--profile="):
+            argv.remove(arg)
+            out_dir = arg.partition("=")[2] or ""
+    if out_dir is None:
+        env = environ.get("UPEDITOR_PROFILE", "")
+        if env in ("", "0"):
+            return None
+        out_dir = "" if env == "1" else env
+    if not out_dir:
+        out_dir = os.path.join(DEFAULT_DIR, time.strftime("%Y%m%d-%H%M%S"))
+    return out_dir
+
+
+def install(out_dir):
+    """Оборачивает действия редактора и регистрирует запись дампов при выходе."""
+    import editor_window
+    import xml_handler
+
+    profiler = Profiler(out_dir)
+    profiler.wrap(editor_window.EditorWindow, "load_file")
+    profiler.wrap(editor_window.EditorWindow, "redraw_plot")
+    profiler.wrap(editor_window.PlotWidget, "on_click")
+    profiler.wrap(xml_handler, "save_xml", "xml_handler.save_xml")
+    profiler.start_sampler()
+
+    def _dump():
+        path = profiler.dump()
+        metrics.log_event("profile.saved", path=path)
+
+    atexit.register(_dump)
+    return profiler
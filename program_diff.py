@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Сравнение двух программ по операциям, а не по тексту XML.
+
+Каждая операция нормализуется: координаты вычисляются (L-32 → число) так же,
+как при отрисовке, и округляются. Дальше:
+
+1. совпадение по хэшу полной нормализованной операции → без изменений;
+2. оставшиеся с одинаковой "формой" (тип, диаметр, глубина, форма пути)
+   сопоставляются по ближайшей точке привязки через сетку → перемещены;
+3. оставшиеся того же типа в той же точке → изменены (диаметр, глубина...);
+4. остальное — добавлено / удалено.
+
+Все шаги — словари и сетка, так что время почти линейное от числа операций.
+
+    python program_diff.py старый.xml новый.xml
+"""
+import sys
+from functools import lru_cache
+
+from renderer import panel_size, parse_coord, to_float
+
+
+# Округление координат, мм
+PRECISION = 2
+# Дальше этого перемещённой операцию не считаем, мм
+MAX_MOVE = 200.0
+
+
+def _r(value):
+    return round(value, PRECISION)
+
+
+def normalize(op, L_val, W_val, coord=None):
+    """
+    Возвращает (полный ключ, ключ формы, точка привязки (x, y)).
+    Ключ формы не зависит от положения операции.
+    coord(value, is_y, is_path) — вычисление координаты (по умолчанию parse_coord).
+    """
+    if coord is None:
+        def coord(value, is_y=False, is_path=False):
+            return parse_coord(value, L_val, W_val, is_y=is_y, is_path=is_path)
+    type_name = op.get("TypeName", "")
+    depth = _r(to_float(op.get("Depth", "0")))
+
+    if type_name in ("Line", "Vertical Line"):
+        # Координаты вертикальной линии вычисляются как у пути (renderer: evaluate_expression)
+        is_path = type_name == "Vertical Line"
+        x1 = coord(op.get("BeginX", "0"), is_path=is_path)
+        y1 = coord(op.get("BeginY", "0"), is_y=True, is_path=is_path)
+        x2 = coord(op.get("EndX", "0"), is_path=is_path)
+        y2 = coord(op.get("EndY", "0"), is_y=True, is_path=is_path)
+        width = _r(to_float(op.get("Width", "0")))
+        shape = (type_name, width, depth, _r(x2 - x1), _r(y2 - y1))
+        anchor = (x1, y1)
+
+    elif type_name == "Path":
+        points = []
+        for v in op.get("Vertexes", []):
+            x = coord(v.get("X1", "0"), is_path=True)
+            y = coord(v.get("Y1", "0"), is_y=True, is_path=True)
+            points.append((v.get("type", ""), x, y,
+                           _r(to_float(v.get("Radius", "0"))), v.get("Direction", "")))
+        anchor = (points[0][1], points[0][2]) if points else (0.0, 0.0)
+        relative = tuple(
+            (t, _r(x - anchor[0]), _r(y - anchor[1]), radius, direction)
+            for t, x, y, radius, direction in points
+        )
+        width = _r(to_float(op.get("Width", "0")))
+        shape = (type_name, width, depth, op.get("Correction", ""), relative)
+
+    else:
+        x = coord(op.get("X1", "0"))
+        y = coord(op.get("Y1", "0"), is_y=True)
+        diameter = _r(to_float(op.get("Diameter", "0")))
+        shape = (type_name, diameter, depth, _r(to_float(op.get("Z1", "0"))))
+        anchor = (x, y)
+
+    full = (shape, _r(anchor[0]), _r(anchor[1]))
+    return full, shape, anchor
+
+
+def normalize_program(panel_data, operations):
+    L_val, W_val = panel_size(panel_data)
+
+    # Формулы в программе повторяются (L-32, W/2...) — считаем каждую один раз
+    @lru_cache(maxsize=None)
+    def coord(value, is_y=False, is_path=False):
+        return parse_coord(value, L_val, W_val, is_y=is_y, is_path=is_path)
+
+    return [normalize(op, L_val, W_val, coord) for op in operations]
+
+
+def _cell(x, y, size):
+    return int(x // size), int(y // size)
+
+
+def diff_programs(old_program, new_program, max_move=MAX_MOVE):
+    """
+    old_program, new_program — (panel_data, operations).
+    Возвращает словарь:
+        unchanged — [(i_old, i_new)]
+        moved     — [{"old", "new", "from": (x, y), "to": (x, y)}]
+        changed   — [{"old", "new", "at": (x, y)}]
+        added     — [{"index", "at": (x, y)}]
+        removed   — [{"index", "at": (x, y)}]
+    """
+    old_norm = normalize_program(*old_program)
+    new_norm = normalize_program(*new_program)
+
+    # 1. Точные совпадения (мультимножество по полному ключу)
+    by_full = {}
+    for i, (full, _, _) in enumerate(old_norm):
+        by_full.setdefault(full, []).append(i)
+    unchanged = []
+    new_left = []
+    for j, (full, _, _) in enumerate(new_norm):
+        bucket = by_full.get(full)
+        if bucket:
+            unchanged.append((bucket.pop(), j))
+        else:
+            new_left.append(j)
+    old_left = [i for bucket in by_full.values() for i in bucket]
+
+    # 2. Перемещения: та же форма, ближайшая точка привязки в сетке
+    grid = {}
+    for i in old_left:
+        _, shape, (x, y) = old_norm[i]
+        grid.setdefault((shape, _cell(x, y, max_move)), []).append(i)
+    matched_old = set()
+    moved = []
+    still_new = []
+    for j in new_left:
+        _, shape, (x, y) = new_norm[j]
+        cx, cy = _cell(x, y, max_move)
+        best = None
+        best_d2 = max_move * max_move
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for i in grid.get((shape, (gx, gy)), ()):
+                    if i in matched_old:
+                        continue
+                    ox, oy = old_norm[i][2]
+                    d2 = (ox - x) ** 2 + (oy - y) ** 2
+                    if d2 <= best_d2:
+                        best, best_d2 = i, d2
+        if best is None:
+            still_new.append(j)
+        else:
+            matched_old.add(best)
+            moved.append({"old": best, "new": j, "from": old_norm[best][2], "to": (x, y)})
+
+    # 3. Изменённые: тот же тип в той же точке
+    by_place = {}
+    for i in old_left:
+        if i in matched_old:
+            continue
+        _, shape, (x, y) = old_norm[i]
+        by_place.setdefault((shape[0], _r(x), _r(y)), []).append(i)
+    changed = []
+    added = []
+    for j in still_new:
+        _, shape, (x, y) = new_norm[j]
+        bucket = by_place.get((shape[0], _r(x), _r(y)))
+        if bucket:
+            i = bucket.pop()
+            matched_old.add(i)
+            changed.append({"old": i, "new": j, "at": (x, y)})
+        else:
+            added.append({"index": j, "at": (x, y)})
+
+    removed = [
+        {"index": i, "at": old_norm[i][2]}
+        for i in sorted(old_left) if i not in matched_old
+    ]
+    return {
+        "unchanged": unchanged,
+        "moved": moved,
+        "changed": changed,
+        "added": added,
+        "removed": removed,
+    }
+
+
+def format_diff(diff, old_ops=None, new_ops=None):
+    """Текстовый отчёт."""
+    def name(ops, i):
+        return ops[i].get("TypeName", "") if ops is not None else ""
+
+    lines = [
+        f"Без изменений: {len(diff['unchanged'])}, перемещено: {len(diff['moved'])}, "
+        f"изменено: {len(diff['changed'])}, добавлено: {len(diff['added'])}, "
+        f"удалено: {len(diff['removed'])}"
+    ]
+    for m in diff["moved"]:
+        (x0, y0), (x1, y1) = m["from"], m["to"]
+        lines.append(f"~ #{m['old'] + 1} → #{m['new'] + 1} {name(new_ops, m['new'])}: "
+                     f"({x0:.1f}, {y0:.1f}) → ({x1:.1f}, {y1:.1f})")
+    for c in diff["changed"]:
+        lines.append(f"* #{c['old'] + 1} → #{c['new'] + 1} {name(new_ops, c['new'])} "
+                     f"в ({c['at'][0]:.1f}, {c['at'][1]:.1f})")
+    for a in diff["added"]:
+        lines.append(f"+ #{a['index'] + 1} {name(new_ops, a['index'])} "
+                     f"({a['at'][0]:.1f}, {a['at'][1]:.1f})")
+    for r in diff["removed"]:
+        lines.append(f"- #{r['index'] + 1} {name(old_ops, r['index'])} "
+                     f"({r['at'][0]:.1f}, {r['at'][1]:.1f})")
+    return "\n".join(lines)
+
+
+def main(argv):
+    import xml_handler
+
+    if len(argv) != 2:
+        print("Использование: python program_diff.py старый.xml новый.xml")
+        return 2
+    old_program = xml_handler.load_xml(argv[0])
+    new_program = xml_handler.load_xml(argv[1])
+    diff = diff_programs(old_program, new_program)
+    print(format_diff(diff, old_program[1], new_program[1]))
+    identical = not (diff["moved"] or diff["changed"] or diff["added"] or diff["removed"])
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Отложенная перерисовка чертежа.
+
+Правка помечает чертёж «грязным» (request), а сама перерисовка выполняется
+один раз, когда цикл событий дойдёт до таймера с нулевым интервалом, — то есть
+после всех правок текущего действия. Зеркалирование с копированием, отмена,
+пакетные правки и т.п. дают одну перерисовку вместо десятков.
+
+Виды перерисовки: SIZE — изменился только размер детали (перерисовываются
+зависящие от L/W операции), FULL — изменились операции; FULL поглощает SIZE.
+Счётчики requested/performed (и в metrics: redraws_requested/redraws_performed)
+показывают, сколько перерисовок запрошено и сколько выполнено на самом деле.
+"""
+from PyQt5.QtCore import QObject, QTimer
+
+import metrics
+
+
+SIZE = "size"
+FULL = "full"
+
+
+class RedrawScheduler(QObject):
+    def __init__(self, perform, parent=None):
+        """
+        :param perform: perform(kind) — перерисовка вида SIZE или FULL
+        """
+        super().__init__(parent)
+        self.perform = perform
+        self.pending = None
+        self.requested = 0
+        self.performed = 0
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.flush)
+
+    def request(self, kind=FULL):
+        self.requested += 1
+        metrics.count("redraws_requested")
+        if self.pending != FULL:
+            self.pending = kind
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        """Выполняет отложенную перерисовку сейчас; False — перерисовывать нечего."""
+        self.timer.stop()
+        if self.pending is None:
+            return False
+        kind, self.pending = self.pending, None
+        self.performed += 1
+        metrics.count("redraws_performed")
+        self.perform(kind)
+        return True
+
+    def cancel(self):
+        self.timer.stop()
+        self.pending = None
+
+    def stats(self):
+        return {"requested": self.requested, "performed": self.performed,
+                "coalesced": self.requested - self.performed}
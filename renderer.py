@@ -0,0 +1,615 @@
+# -*- coding: utf-8 -*-
+"""
+Отрисовка чертежа детали без привязки к Qt.
+
+Функции работают с любыми осями matplotlib: PlotWidget рисует ими в окне,
+а render_to_file — в Agg/SVG/PDF без графического интерфейса.
+
+Пакетный режим (чертежи всех деталей заказа):
+
+    python renderer.py папка_УП папка_чертежей --format pdf --jobs 8
+"""
+import math
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.collections import LineCollection, PatchCollection
+from matplotlib.figure import Figure
+from matplotlib.patches import Arc, Circle, Rectangle
+
+import metrics
+from xml_handler import evaluate_expression
+
+
+MARGIN = 50
+# gid контура детали — по нему update_axes находит прямоугольник
+PANEL_GID = "panel"
+
+# Цвета легенды
+COLOR_LINE = 'brown'
+COLOR_SAW = 'red'
+COLOR_PATH = 'purple'
+COLOR_HORIZONTAL = 'blue'
+COLOR_THROUGH = 'yellow'
+COLOR_TOP = 'green'
+COLOR_BACK = 'magenta'
+
+
+def calculate_arc_center(A, B, radius, direction):
+    """
+    Вычисляет центр дуги, соединяющей A и B с заданным радиусом и направлением.
+
+    :param A: (x1, y1) — начальная точка
+    :param B: (x2, y2) — конечная точка
+    :param radius: радиус дуги
+    :param direction: 1 = по часовой, 0 = против часовой
+    :return: (cx, cy) — координаты центра дуги
+    """
+    x1, y1 = A
+    x2, y2 = B
+
+    # Вектор от A к B
+    dx = x2 - x1
+    dy = y2 - y1
+    chord_length = math.hypot(dx, dy)
+
+    # Проверка: радиус должен быть >= половине хорды
+    half_chord = chord_length / 2
+    if radius < half_chord:
+        raise ValueError(f"Радиус {radius} слишком мал для соединения точек на расстоянии {chord_length}")
+
+    # Середина хорды AB
+    mx = (x1 + x2) / 2
+    my = (y1 + y2) / 2
+
+    # Единичный вектор вдоль хорды
+    ux = dx / chord_length
+    uy = dy / chord_length
+
+    # Единичный перпендикуляр (вращение на 90°)
+    nx = -uy  # нормаль
+    ny = ux
+
+    # Расстояние от середины хорды до центра дуги
+    dist_to_center = math.sqrt(radius**2 - half_chord**2)
+
+    # Выбор стороны: direction определяет, в какую сторону отклониться
+    # В системе координат с Y вниз (как у станка) — может быть наоборот
+    sign = 1 if direction == 1 else -1
+
+    center_x = mx + sign * dist_to_center * nx
+    center_y = my + sign * dist_to_center * ny
+
+    return (center_x, center_y)
+
+
+def arc_angles(A, B, radius, direction):
+    """
+    Центр и углы (theta1, theta2) дуги A→B для matplotlib.patches.Arc.
+    """
+    # Определяем порядок точек для расчёта угла
+    if direction == 0:
+        # Для Direction = 0: рисуем от B к A (обратно)
+        start_point = B
+        end_point = A
+    else:
+        # Для Direction = 1: от A к B
+        start_point = A
+        end_point = B
+
+    center_x, center_y = calculate_arc_center(A, B, radius, direction)
+
+    # Углы от центра к точкам
+    start_angle = math.degrees(math.atan2(start_point[1] - center_y, start_point[0] - center_x))
+    end_angle = math.degrees(math.atan2(end_point[1] - center_y, end_point[0] - center_x))
+
+    # Нормализуем углы
+    start_angle = start_angle % 360
+    end_angle = end_angle % 360
+
+    # Корректируем конечный угол, чтобы дуга шла в нужную сторону
+    # (matplotlib всегда рисует против часовой)
+    if end_angle >= start_angle + 180:
+        end_angle -= 360
+    elif end_angle <= start_angle - 180:
+        end_angle += 360
+
+    return (center_x, center_y), start_angle, end_angle
+
+
+def parse_coord(value, L_val, W_val, is_y=False, is_path=False):
+    """
+    Парсит координату.
+    :param is_path: если True — отключаем обработку `-1` как `L-1`, т.к. это Path
+    """
+    if not isinstance(value, str):
+        value = str(value)
+    value = value.strip()
+    if value == "":
+        return 0.0
+
+    # Для Path: отрицательные числа — абсолютные координаты
+    if is_path:
+        try:
+            if value.startswith('-') and value[1:].replace('.', '', 1).isdigit():
+                return float(value)
+            elif value.replace('.', '', 1).isdigit():
+                return float(value)
+        except:
+            pass
+        return evaluate_expression(value, L_val, W_val)
+
+    # Для остальных: -1 → L - 1 (если is_y=False) или W - 1 (если is_y=True)
+    if value.startswith('-') and value[1:].replace('.', '', 1).isdigit():
+        try:
+            num = float(value)
+            if is_y:
+                return W_val + num  # W - 10 → W + (-10)
+            else:
+                return L_val + num  # L - 10 → L + (-10)
+        except:
+            pass
+
+    return evaluate_expression(value, L_val, W_val)
+
+
+def to_float(value, default=0.0):
+    try:
+        return float(str(value).replace(',', '.'))
+    except:
+        return default
+
+
+def coord_dependencies(value, axis, is_path=False):
+    """
+    От каких размеров детали зависит координата: подмножество {"L", "W"}.
+    Правила те же, что в parse_coord: формула с L/W или (не для Path)
+    отрицательное число, которое отсчитывается от L или W по оси axis.
+    """
+    value = str(value).strip()
+    deps = set()
+    if "L" in value:
+        deps.add("L")
+    if "W" in value:
+        deps.add("W")
+    if not is_path and value.startswith('-') and value[1:].replace('.', '', 1).isdigit():
+        deps.add(axis)
+    return deps
+
+
+def operation_dependencies(op):
+    """
+    Размеры детали, от которых зависит отрисовка операции: frozenset из "L", "W".
+    Пустое множество — геометрия постоянная.
+    """
+    type_name = op.get("TypeName", "")
+    if type_name == "Horizontal Hole":
+        # Форма торцевого зависит от того, у какой кромки оно стоит
+        return frozenset(("L", "W"))
+
+    deps = set()
+    if type_name in ("Line", "Vertical Line"):
+        # Vertical Line считается evaluate_expression — без правила отрицательных чисел
+        is_path = type_name == "Vertical Line"
+        for field, axis in (("BeginX", "L"), ("EndX", "L"), ("BeginY", "W"), ("EndY", "W")):
+            deps |= coord_dependencies(op.get(field, "0"), axis, is_path)
+    elif type_name == "Path":
+        for v in op.get("Vertexes", []):
+            deps |= coord_dependencies(v.get("X1", "0"), "L", is_path=True)
+            deps |= coord_dependencies(v.get("Y1", "0"), "W", is_path=True)
+    else:
+        deps |= coord_dependencies(op.get("X1", "0"), "L")
+        deps |= coord_dependencies(op.get("Y1", "0"), "W")
+    return frozenset(deps)
+
+
+def path_points(op, L_val, W_val):
+    """Координаты вершин Path (в мм)."""
+    points = []
+    for v in op.get("Vertexes", []):
+        x = parse_coord(v.get("X1", "0"), L_val, W_val, is_path=True)
+        y = parse_coord(v.get("Y1", "0"), L_val, W_val, is_y=True, is_path=True)
+        points.append((x, y))
+    return points
+
+
+# === Отрисовка ===
+
+def setup_axes(ax, panel_data, panel_length, panel_width):
+    """
+    Оси чертежа: начало координат — правый верхний угол,
+    X растёт влево, Y — вниз. Рисует контур детали и заголовок.
+    """
+    ax.set_xlim(panel_length + MARGIN, -MARGIN)  # X: справа (0) → слева (L)
+    ax.set_ylim(panel_width + MARGIN, -MARGIN)   # Y: сверху (0) → снизу (W)
+    ax.set_aspect('equal', adjustable='box')
+    ax.set_title(panel_title(panel_data, panel_length, panel_width), fontsize=12, loc='left')
+    ax.axis('off')
+
+    rectangle = Rectangle(
+        (0, 0), panel_length, panel_width,
+        linewidth=2, edgecolor='black', facecolor='lightblue', alpha=0.5, zorder=1
+    )
+    rectangle.set_gid(PANEL_GID)
+    ax.add_patch(rectangle)
+    return rectangle
+
+
+def panel_title(panel_data, panel_length, panel_width):
+    L_val = to_float(panel_length)
+    W_val = to_float(panel_width)
+    T_val = to_float(panel_data.get("PanelThickness", "0"))
+    name = panel_data.get("PanelName", "Без имени")
+
+    title = f"Чертёж детали: {name}"
+    subtitle = f"Размеры: {L_val:.1f} × {W_val:.1f} × {T_val:.1f} мм"
+    return f"{title}\n{subtitle}"
+
+
+def update_axes(ax, panel_data, panel_length, panel_width):
+    """
+    Новые размеры/имя детали на уже нарисованных осях (setup_axes без очистки):
+    пределы, заголовок и контур детали.
+    """
+    ax.set_xlim(panel_length + MARGIN, -MARGIN)
+    ax.set_ylim(panel_width + MARGIN, -MARGIN)
+    ax.set_title(panel_title(panel_data, panel_length, panel_width), fontsize=12, loc='left')
+    for patch in ax.patches:
+        if patch.get_gid() == PANEL_GID:
+            patch.set_width(panel_length)
+            patch.set_height(panel_width)
+
+
+def operation_shapes(op, idx, L_val, W_val):
+    """
+    Геометрия операции без привязки к matplotlib (общая для всех способов отрисовки).
+    Возвращает (фигуры, элемент легенды (подпись, цвет) или None); фигуры:
+
+        ("line", x1, y1, x2, y2, цвет)
+        ("arc", cx, cy, радиус, theta1, theta2, цвет)   — углы в градусах, против часовой
+        ("rect", x, y, ширина, высота, цвет)             — залитый прямоугольник
+        ("circle", cx, cy, радиус, цвет)                 — окружность без заливки
+        ("marker", x, y, маркер, размер, цвет)           — маркер matplotlib ('x', 'o')
+    """
+    shapes = []
+    legend = None
+    type_name = op["TypeName"]
+
+    if type_name == "Line":
+        begin_x = parse_coord(op.get("BeginX", "0"), L_val, W_val)
+        begin_y = parse_coord(op.get("BeginY", "0"), L_val, W_val, is_y=True)
+        end_x = parse_coord(op.get("EndX", "0"), L_val, W_val)
+        end_y = parse_coord(op.get("EndY", "0"), L_val, W_val, is_y=True)
+        shapes.append(("line", begin_x, begin_y, end_x, end_y, COLOR_LINE))
+        legend = ("Фрезеровка", COLOR_LINE)
+
+    elif type_name == "Vertical Line":
+        x1_str = op.get("BeginX", "0").strip()
+        y1_str = op.get("BeginY", "0").strip()
+        x2_str = op.get("EndX", "0").strip()
+        y2_str = op.get("EndY", "0").strip()
+
+        # Проверяем, не пустые ли строки
+        if not x1_str or not y1_str or not x2_str or not y2_str:
+            metrics.log_event("draw.skipped", logging.WARNING, index=idx,
+                              type_name=type_name, reason="пустые координаты")
+            return shapes, None
+
+        begin_x = evaluate_expression(x1_str, L_val, W_val)
+        begin_y = evaluate_expression(y1_str, L_val, W_val)
+        end_x = evaluate_expression(x2_str, L_val, W_val)
+        end_y = evaluate_expression(y2_str, L_val, W_val)
+        shapes.append(("line", begin_x, begin_y, end_x, end_y, COLOR_SAW))
+        legend = ("Фрезеровка пилой", COLOR_SAW)
+
+    elif type_name == "Path":
+        vertexes = op.get("Vertexes", [])
+        if len(vertexes) < 2:
+            return shapes, None
+        points = path_points(op, L_val, W_val)
+
+        for i in range(1, len(points)):
+            prev = points[i-1]
+            curr = points[i]
+            v = vertexes[i]  # <-- vertexes[i], т.к. vertexes[0] = Point
+
+            if v["type"] == "Line":
+                shapes.append(("line", prev[0], prev[1], curr[0], curr[1], COLOR_PATH))
+            elif v["type"] == "Arc":
+                try:
+                    radius = float(v.get("Radius", 10))
+                    direction = int(v.get("Direction", 1))
+                    center, theta1, theta2 = arc_angles(prev, curr, radius, direction)
+                    shapes.append(("arc", center[0], center[1], radius, theta1, theta2, COLOR_PATH))
+                except Exception as e:
+                    metrics.log_event("draw.arc_fallback", logging.WARNING, index=idx, error=e)
+                    # Резерв: рисуем линию
+                    shapes.append(("line", prev[0], prev[1], curr[0], curr[1], COLOR_PATH))
+
+    elif type_name == "Horizontal Hole":
+        x_val = parse_coord(op.get("X1", "0"), L_val, W_val)
+        y_val = parse_coord(op.get("Y1", "0"), L_val, W_val, is_y=True)
+        depth_val = to_float(op.get("Depth", "0"), 0.0)
+        diameter_val = to_float(op.get("Diameter", "5"), 5.0)
+        if x_val < 10:
+            xy, w, h = (x_val, y_val - diameter_val / 2), depth_val, diameter_val
+        elif x_val > L_val - 10:
+            xy, w, h = (x_val - depth_val, y_val - diameter_val / 2), depth_val, diameter_val
+        elif y_val < 10:
+            xy, w, h = (x_val - diameter_val / 2, y_val), diameter_val, depth_val
+        elif y_val > W_val - 10:
+            xy, w, h = (x_val - diameter_val / 2, y_val - depth_val), diameter_val, depth_val
+        else:
+            xy = None
+        if xy is not None:
+            shapes.append(("rect", xy[0], xy[1], w, h, COLOR_HORIZONTAL))
+        else:
+            shapes.append(("marker", x_val, y_val, "o", 4, COLOR_HORIZONTAL))
+        legend = ("Торцевое", COLOR_HORIZONTAL)
+
+    else:
+        x_val = parse_coord(op.get("X1", "0"), L_val, W_val)
+        y_val = parse_coord(op.get("Y1", "0"), L_val, W_val, is_y=True)
+        diameter = float(op.get("Diameter", "0") or 0)
+        depth_val = to_float(op.get("Depth", "0"), 0.0)
+        if depth_val >= 16.0:
+            color = COLOR_THROUGH
+            label = "Сквозное"
+        elif type_name == "Vertical Hole":
+            color = COLOR_TOP
+            label = "Верхняя плоскость"
+        elif type_name == "Back Vertical Hole":
+            color = COLOR_BACK
+            label = "Нижняя плоскость"
+        else:
+            color = 'red'
+            label = "Отверстие"
+        shapes.append(("circle", x_val, y_val, diameter / 2, color))
+        shapes.append(("marker", x_val, y_val, "x", 5, color))
+        legend = (label, color)
+
+    return shapes, legend
+
+
+def draw_shape(ax, shape):
+    """Артист matplotlib для фигуры из operation_shapes."""
+    kind = shape[0]
+    if kind == "line":
+        _, x1, y1, x2, y2, color = shape
+        line, = ax.plot([x1, x2], [y1, y2], color=color, linewidth=2, zorder=2)
+        return line
+    if kind == "arc":
+        _, cx, cy, radius, theta1, theta2, color = shape
+        patch = Arc((cx, cy), 2 * radius, 2 * radius, theta1=theta1, theta2=theta2,
+                    color=color, linewidth=2, zorder=2)
+    elif kind == "rect":
+        _, x, y, w, h, color = shape
+        patch = Rectangle((x, y), w, h, facecolor=color, alpha=0.7, zorder=2)
+    elif kind == "circle":
+        _, cx, cy, radius, color = shape
+        patch = Circle((cx, cy), radius, color=color, fill=False, linewidth=1.5, zorder=2)
+    elif kind == "marker":
+        _, x, y, marker, size, color = shape
+        point, = ax.plot(x, y, marker, color=color, markersize=size, zorder=2)
+        return point
+    else:
+        raise ValueError(f"неизвестная фигура: {kind}")
+    ax.add_patch(patch)
+    return patch
+
+
+def draw_shape_collections(ax, shapes):
+    """
+    Фигуры из operation_shapes одним артистом на вид (линии и дуги, окружности,
+    прямоугольники, маркеры), а не артистом на фигуру: так быстро рисуются
+    временные копии сотен операций (перетаскивание выделенного).
+    Дуги — ломаными. Возвращает список артистов.
+    """
+    segments, segment_colors = [], []
+    circles, circle_colors = [], []
+    rects, rect_colors = [], []
+    markers = {}  # (маркер, размер) → (точки, цвета)
+    for shape in shapes:
+        kind = shape[0]
+        if kind == "line":
+            _, x1, y1, x2, y2, color = shape
+            segments.append([(x1, y1), (x2, y2)])
+            segment_colors.append(color)
+        elif kind == "arc":
+            _, cx, cy, radius, theta1, theta2, color = shape
+            if theta2 < theta1:
+                theta2 += 360  # как у Arc: против часовой от theta1 до theta2
+            angles = np.radians(np.linspace(theta1, theta2, 33))
+            segments.append(np.column_stack((cx + radius * np.cos(angles), cy + radius * np.sin(angles))))
+            segment_colors.append(color)
+        elif kind == "circle":
+            _, cx, cy, radius, color = shape
+            circles.append(Circle((cx, cy), radius))
+            circle_colors.append(color)
+        elif kind == "rect":
+            _, x, y, w, h, color = shape
+            rects.append(Rectangle((x, y), w, h))
+            rect_colors.append(color)
+        elif kind == "marker":
+            _, x, y, marker, size, color = shape
+            points, colors = markers.setdefault((marker, size), ([], []))
+            points.append((x, y))
+            colors.append(color)
+        else:
+            raise ValueError(f"неизвестная фигура: {kind}")
+
+    artists = []
+    if segments:
+        artists.append(ax.add_collection(
+            LineCollection(segments, colors=segment_colors, linewidths=2, zorder=2), autolim=False))
+    if circles:
+        artists.append(ax.add_collection(
+            PatchCollection(circles, facecolors='none', edgecolors=circle_colors, linewidths=1.5, zorder=2),
+            autolim=False))
+    if rects:
+        artists.append(ax.add_collection(
+            PatchCollection(rects, facecolors=rect_colors, alpha=0.7, zorder=2), autolim=False))
+    for (marker, size), (points, colors) in markers.items():
+        points = np.array(points)
+        artists.append(ax.scatter(points[:, 0], points[:, 1], marker=marker, c=colors, s=size ** 2, zorder=2))
+    return artists
+
+
+def draw_operation(ax, op, idx, L_val, W_val):
+    """
+    Рисует одну операцию.
+    Возвращает (список артистов, элемент легенды (подпись, цвет) или None).
+    """
+    shapes, legend = operation_shapes(op, idx, L_val, W_val)
+    return [draw_shape(ax, shape) for shape in shapes], legend
+
+
+def draw_panel(ax, panel_data, operations, panel_length, panel_width, layers=None):
+    """
+    Рисует деталь и все операции на осях ax.
+    Возвращает (operation_patches, types_in_use):
+    operation_patches — список (артист, индекс операции) для поиска кликом.
+    layers — если передан список, в него добавляется (артисты, легенда)
+    для каждой операции по порядку (для перерисовки отдельных операций).
+    """
+    setup_axes(ax, panel_data, panel_length, panel_width)
+    L_val = to_float(panel_length)
+    W_val = to_float(panel_width)
+
+    operation_patches = []
+    types_in_use = set()
+    for idx, op in enumerate(operations):
+        try:
+            artists, legend = draw_operation(ax, op, idx, L_val, W_val)
+        except Exception as e:
+            metrics.log_event("draw.failed", logging.WARNING, index=idx, error=e)
+            artists, legend = [], None
+        if layers is not None:
+            layers.append((artists, legend))
+        operation_patches.extend((artist, idx) for artist in artists)
+        if legend:
+            types_in_use.add(legend)
+
+    return operation_patches, sorted(types_in_use, key=lambda x: x[0])
+
+
+def panel_size(panel_data):
+    """(L, W) детали для отрисовки, как в EditorWindow.refresh_plot."""
+    return to_float(panel_data.get("PanelLength", 0)), to_float(panel_data.get("PanelWidth", 0))
+
+
+def render_figure(panel_data, operations, width=10, height=6, dpi=100, show_title=True):
+    """
+    Создаёт Figure с чертежом детали (без pyplot и без Qt).
+    :param show_title: False — без заголовка (миниатюры)
+    """
+    fig = Figure(figsize=(width, height), dpi=dpi)
+    if show_title:
+        ax = fig.add_subplot(111)
+    else:
+        ax = fig.add_axes([0.02, 0.02, 0.96, 0.96])
+    length, width_mm = panel_size(panel_data)
+    if length > 0 and width_mm > 0:
+        draw_panel(ax, panel_data, operations, length, width_mm)
+        if not show_title:
+            ax.set_title("")
+    else:
+        ax.axis('off')
+        ax.text(0.5, 0.5, 'Укажите размеры детали', transform=ax.transAxes, ha='center')
+    return fig
+
+
+def render_to_file(panel_data, operations, out_path, fmt=None, dpi=100, width=10, height=6,
+                   show_title=True):
+    """
+    Сохраняет чертёж в файл. Формат — по расширению или fmt (png, svg, pdf).
+    """
+    fig = render_figure(panel_data, operations, width, height, dpi, show_title)
+    fmt = fmt or os.path.splitext(out_path)[1].lstrip('.').lower() or "png"
+    if fmt == "png":
+        from matplotlib.backends.backend_agg import FigureCanvasAgg as Canvas
+    elif fmt == "svg":
+        from matplotlib.backends.backend_svg import FigureCanvasSVG as Canvas
+    elif fmt == "pdf":
+        from matplotlib.backends.backend_pdf import FigureCanvasPdf as Canvas
+    else:
+        raise ValueError(f"Неподдерживаемый формат: {fmt}")
+    Canvas(fig)
+    fig.savefig(out_path, format=fmt, dpi=dpi)
+    return out_path
+
+
+def render_file(xml_path, out_path, fmt=None, dpi=100):
+    """Загружает УП и рисует её в файл. Возвращает число операций."""
+    import xml_handler
+    panel_data, operations = xml_handler.load_xml(xml_path)
+    render_to_file(panel_data, operations, out_path, fmt, dpi)
+    return len(operations)
+
+
+def _render_job(args):
+    xml_path, out_path, fmt, dpi = args
+    try:
+        return xml_path, render_file(xml_path, out_path, fmt, dpi), None
+    except Exception as e:
+        return xml_path, 0, str(e)
+
+
+def render_folder(src_dir, out_dir, fmt="png", jobs=None, dpi=100):
+    """
+    Рисует все *.xml из src_dir в out_dir пулом процессов.
+    Возвращает словарь с итогами (файлы, ошибки, время, файлов/с).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    names = sorted(n for n in os.listdir(src_dir) if n.lower().endswith(".xml"))
+    tasks = [
+        (os.path.join(src_dir, n), os.path.join(out_dir, os.path.splitext(n)[0] + "." + fmt), fmt, dpi)
+        for n in names
+    ]
+
+    start = time.perf_counter()
+    errors = []
+    operations = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for xml_path, op_count, error in pool.map(_render_job, tasks, chunksize=4):
+            if error:
+                errors.append((xml_path, error))
+            operations += op_count
+    elapsed = time.perf_counter() - start
+
+    return {
+        "files": len(tasks),
+        "errors": errors,
+        "operations": operations,
+        "seconds": elapsed,
+        "files_per_sec": len(tasks) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description="Пакетная отрисовка чертежей деталей")
+    parser.add_argument("src", help="папка с XML")
+    parser.add_argument("out", help="папка для чертежей")
+    parser.add_argument("--format", default="png", choices=["png", "svg", "pdf"])
+    parser.add_argument("--jobs", type=int, default=None, help="число процессов (по умолчанию — все ядра)")
+    parser.add_argument("--dpi", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    result = render_folder(args.src, args.out, args.format, args.jobs, args.dpi)
+    for path, error in result["errors"]:
+        print(f"{path}: {error}")
+    print(
+        f"Файлов: {result['files']}, ошибок: {len(result['errors'])}, "
+        f"операций: {result['operations']}, время: {result['seconds']:.2f} с, "
+        f"{result['files_per_sec']:.1f} файл/с"
+    )
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,746 @@
+# -*- coding: utf-8 -*-
+"""
+Чертёж на QGraphicsScene — замена PlotWidget без конвейера matplotlib/Agg.
+
+Геометрия та же (renderer.operation_shapes), каждая фигура — элемент сцены
+с индексом BSP-дерева: перерисовка при прокрутке и масштабе затрагивает только
+видимые элементы, поиск под курсором — встроенный (QGraphicsView.items).
+Координаты сцены — миллиметры станка: начало в правом верхнем углу,
+X растёт влево (вид отражён по X), Y — вниз. Толщины линий и маркеры
+заданы в пикселях экрана, как в matplotlib, и от масштаба не зависят.
+
+Включается при запуске:
+
+    python main.py --scene
+
+Неизменная часть чертежа (контур, операции) лежит в отдельной сцене и выводится
+растровыми плитками tile_cache.TileCache; правка операции сбрасывает только плитки
+под её габаритом. Подсветка и сравнение — в основной сцене, поверх плиток.
+
+Сравнение с matplotlib (построение, отрисовка, прокрутка, правка, поиск под курсором):
+
+    python scene_view.py --bench 20000
+"""
+import logging
+import sys
+import time
+
+from matplotlib.colors import to_hex
+from PyQt5.QtCore import QPointF, QRect, QRectF, Qt
+from PyQt5.QtGui import QBrush, QColor, QPainter, QPainterPath, QPen, QPolygonF, QTransform
+from PyQt5.QtWidgets import (
+    QGraphicsEllipseItem, QGraphicsItem, QGraphicsLineItem, QGraphicsPathItem,
+    QGraphicsRectItem, QGraphicsScene, QGraphicsView, QLabel
+)
+
+import metrics
+import renderer
+import tile_cache
+import toolpath
+
+
+# Номер операции хранится в данных элемента под этим ключом
+INDEX_KEY = 0
+# Допуск поиска под курсором, мм (как в PlotWidget.find_operation_at)
+PICK_TOLERANCE = 10
+# Шаг масштаба колесом мыши
+ZOOM_STEP = 1.25
+# Легенда слоя сравнения (цвета PlotWidget.draw_diff_overlay)
+DIFF_LEGEND = [("Добавлено", "limegreen"), ("Удалено", "red"),
+               ("Изменено", "royalblue"), ("Перемещено", "darkorange")]
+
+_colors = {}
+
+
+def qcolor(name, alpha=1.0):
+    """QColor по имени цвета matplotlib (оттенки совпадают с чертежом matplotlib)."""
+    key = (name, alpha)
+    color = _colors.get(key)
+    if color is None:
+        color = QColor(to_hex(name))
+        color.setAlphaF(alpha)
+        _colors[key] = color
+    return color
+
+
+def cosmetic_pen(color, width):
+    """Перо постоянной толщины в пикселях (linewidth matplotlib в пунктах ≈ пикселях при 72–100 dpi)."""
+    pen = QPen(color, width)
+    pen.setCosmetic(True)
+    return pen
+
+
+def arc_path(cx, cy, radius, theta1, theta2):
+    """
+    Дуга matplotlib.patches.Arc в QPainterPath. У matplotlib угол отсчитывается
+    к +Y данных, у Qt — к −Y, поэтому знаки углов меняются.
+    """
+    rect = QRectF(cx - radius, cy - radius, 2 * radius, 2 * radius)
+    path = QPainterPath()
+    path.arcMoveTo(rect, -theta1)
+    path.arcTo(rect, -theta1, -(theta2 - theta1))
+    return path
+
+
+def marker_path(marker, size):
+    """Маркер в пикселях вокруг (0, 0) — элемент не масштабируется вместе со сценой."""
+    half = size / 2
+    path = QPainterPath()
+    if marker == "x":
+        path.moveTo(-half, -half)
+        path.lineTo(half, half)
+        path.moveTo(-half, half)
+        path.lineTo(half, -half)
+    else:
+        path.addEllipse(QPointF(0, 0), half, half)
+    return path
+
+
+def shape_item(shape):
+    """Элемент сцены для фигуры из renderer.operation_shapes (стили как в renderer.draw_shape)."""
+    kind = shape[0]
+    if kind == "line":
+        _, x1, y1, x2, y2, color = shape
+        item = QGraphicsLineItem(x1, y1, x2, y2)
+        item.setPen(cosmetic_pen(qcolor(color), 2))
+    elif kind == "arc":
+        _, cx, cy, radius, theta1, theta2, color = shape
+        item = QGraphicsPathItem(arc_path(cx, cy, radius, theta1, theta2))
+        item.setPen(cosmetic_pen(qcolor(color), 2))
+    elif kind == "rect":
+        _, x, y, w, h, color = shape
+        item = QGraphicsRectItem(QRectF(x, y, w, h).normalized())
+        item.setPen(QPen(Qt.NoPen))
+        item.setBrush(QBrush(qcolor(color, 0.7)))
+    elif kind == "circle":
+        _, cx, cy, radius, color = shape
+        item = QGraphicsEllipseItem(cx - radius, cy - radius, 2 * radius, 2 * radius)
+        item.setPen(cosmetic_pen(qcolor(color), 1.5))
+    elif kind == "marker":
+        _, x, y, marker, size, color = shape
+        item = QGraphicsPathItem(marker_path(marker, size))
+        item.setPos(x, y)
+        item.setFlag(QGraphicsItem.ItemIgnoresTransformations)
+        if marker == "x":
+            item.setPen(cosmetic_pen(qcolor(color), 1.5))
+        else:
+            item.setPen(QPen(Qt.NoPen))
+            item.setBrush(QBrush(qcolor(color)))
+    else:
+        raise ValueError(f"неизвестная фигура: {kind}")
+    item.setZValue(2)
+    return item
+
+
+def operation_signature(op):
+    """Снимок полей операции для сравнения с уже нарисованной (операции правятся на месте)."""
+    return tuple(
+        (key, tuple(tuple(v.items()) for v in value) if key == "Vertexes" else value)
+        for key, value in op.items()
+    )
+
+
+def changed_span(old, new):
+    """
+    Отличие нового списка подписей операций от нарисованного: (prefix, removed, added) —
+    общее начало длиной prefix, дальше removed старых заменены added новыми, конец общий.
+    """
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    return prefix, len(old) - prefix - suffix, len(new) - prefix - suffix
+
+
+def toolpath_item(polygon, color):
+    item = QGraphicsPathItem()
+    path = QPainterPath()
+    path.addPolygon(QPolygonF([QPointF(x, y) for x, y in polygon.tolist()]))
+    path.closeSubpath()
+    path.setFillRule(Qt.WindingFill)
+    item.setPath(path)
+    item.setPen(QPen(Qt.NoPen))
+    item.setBrush(QBrush(qcolor(color, 0.25)))
+    item.setZValue(1.5)
+    return item
+
+
+def build_scene(scene, panel_data, operations, panel_length, panel_width, layers=None, toolpaths=None):
+    """
+    Заполняет сцену: контур детали и операции (аналог renderer.draw_panel).
+    toolpaths — ToolpathCache, если нужны полосы фрезы.
+    Возвращает (контур детали, operation_patches, types_in_use) — элементы вместо артистов.
+    """
+    panel = QGraphicsRectItem(0, 0, panel_length, panel_width)
+    panel.setPen(cosmetic_pen(QColor("black"), 2))
+    panel.setBrush(QBrush(qcolor("lightblue", 0.5)))
+    panel.setZValue(1)
+    scene.addItem(panel)
+    scene.setSceneRect(-renderer.MARGIN, -renderer.MARGIN,
+                       panel_length + 2 * renderer.MARGIN, panel_width + 2 * renderer.MARGIN)
+
+    L_val = renderer.to_float(panel_length)
+    W_val = renderer.to_float(panel_width)
+    operation_patches = []
+    types_in_use = set()
+    for idx, op in enumerate(operations):
+        items, legend = operation_items(op, idx, L_val, W_val, toolpaths)
+        for item in items:
+            scene.addItem(item)
+        if layers is not None:
+            layers.append((items, legend))
+        operation_patches.extend((item, idx) for item in items)
+        if legend:
+            types_in_use.add(legend)
+    return panel, operation_patches, sorted(types_in_use, key=lambda x: x[0])
+
+
+def operation_items(op, idx, L_val, W_val, toolpaths=None):
+    """Элементы одной операции (ещё не добавленные в сцену) и элемент легенды."""
+    try:
+        shapes, legend = renderer.operation_shapes(op, idx, L_val, W_val)
+    except Exception as e:
+        metrics.log_event("draw.failed", logging.WARNING, index=idx, error=e)
+        return [], None
+    items = [shape_item(shape) for shape in shapes]
+    if toolpaths is not None:
+        try:
+            polygon = toolpaths.polygon(op, L_val, W_val)
+        except Exception as e:
+            metrics.log_event("toolpath.failed", type_name=op.get("TypeName", ""), error=e)
+            polygon = None
+        if polygon is not None:
+            color = renderer.COLOR_PATH if op.get("TypeName") == "Path" else renderer.COLOR_LINE
+            items.append(toolpath_item(polygon, color))
+    for item in items:
+        item.setData(INDEX_KEY, idx)
+    return items, legend
+
+
+class SceneWidget(QGraphicsView):
+    """
+    Чертёж на QGraphicsScene с тем же интерфейсом, что у PlotWidget
+    (draw_operations, update_panel_size, highlight_element, show_diff, set_show_toolpaths).
+
+    Две сцены: static_scene — контур и операции (рисуется плитками tile_cache.TileCache
+    в drawBackground), scene — подсветка и сравнение поверх плиток.
+    """
+
+    def __init__(self, main_window, tiles=True):
+        """
+        :param tiles: False — статичная сцена рисуется напрямую при каждой перерисовке
+        """
+        super().__init__()
+        self.main_window = main_window
+        self.static_scene = QGraphicsScene(self)
+        self.static_scene.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+        self.scene = QGraphicsScene(self)
+        self.setScene(self.scene)
+        self.tile_cache = tile_cache.TileCache(self.render_static) if tiles else None
+        self.setRenderHint(QPainter.Antialiasing)
+        self.setRenderHint(QPainter.SmoothPixmapTransform)
+        self.setViewportUpdateMode(QGraphicsView.MinimalViewportUpdate)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+
+        self.operation_patches = []
+        self.types_in_use = []
+        self.layers = None
+        self.signatures = None    # operation_signature нарисованных операций
+        self.dependencies = None
+        self.drawn_size = None
+        self.message = None
+        self.highlight_item = None
+        self.preview_item = None
+        self.diff_overlay = None
+        self.show_toolpaths = False
+        self.toolpath_cache = toolpath.ToolpathCache()
+        self.panel_item = None
+
+        self.title_label = QLabel(self)
+        self.legend_label = QLabel(self)
+        self.legend_label.setTextFormat(Qt.RichText)
+        for label in (self.title_label, self.legend_label):
+            label.setAttribute(Qt.WA_TransparentForMouseEvents)
+
+    # === Совместимость с PlotWidget ===
+
+    def draw(self):
+        self.viewport().update()
+
+    def clear_plot(self):
+        self.static_scene.clear()
+        self.scene.clear()
+        if self.tile_cache is not None:
+            self.tile_cache.clear()
+        self.operation_patches = []
+        self.layers = None
+        self.signatures = None
+        self.dependencies = None
+        self.highlight_item = None
+        self.preview_item = None
+        self.panel_item = None
+        self.message = None
+
+    def show_message(self, text):
+        """Чертежа нет — только надпись в центре."""
+        self.clear_plot()
+        self.drawn_size = None
+        self.message = text
+        self.update_labels()
+        self.viewport().update()
+
+    # === Статичная сцена и плитки ===
+
+    def render_static(self, painter, target, source):
+        self.static_scene.render(painter, target, source, Qt.IgnoreAspectRatio)
+
+    def drawBackground(self, painter, rect):
+        painter.fillRect(rect, Qt.white)
+        if self.tile_cache is None:
+            self.render_static(painter, rect, rect)
+            return
+        scale = abs(self.transform().m11())
+        # Без сглаживания края соседних плиток попадают в пиксели встык, без швов
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        for target, image, source in self.tile_cache.tiles(rect, scale):
+            painter.drawImage(target, image, source)
+        painter.setRenderHint(QPainter.Antialiasing)
+
+    def add_static(self, items):
+        for item in items:
+            self.static_scene.addItem(item)
+            self.invalidate_static(item.sceneBoundingRect())
+
+    def remove_static(self, items):
+        for item in items:
+            self.invalidate_static(item.sceneBoundingRect())
+            self.static_scene.removeItem(item)
+
+    def invalidate_static(self, rect):
+        if self.tile_cache is not None:
+            self.tile_cache.invalidate(rect)
+
+    def set_scene_rect(self, panel_length, panel_width):
+        rect = QRectF(-renderer.MARGIN, -renderer.MARGIN,
+                      panel_length + 2 * renderer.MARGIN, panel_width + 2 * renderer.MARGIN)
+        self.static_scene.setSceneRect(rect)
+        self.scene.setSceneRect(rect)
+
+    # === Отрисовка ===
+
+    @metrics.timed("redraw")
+    def draw_operations(self, operations, panel_length, panel_width):
+        if (self.layers is not None and self.drawn_size == (panel_length, panel_width)
+                and not self.diff_overlay and self.sync_operations(operations, panel_length, panel_width)):
+            return
+        self.clear_plot()
+        self.layers = []
+        self.panel_item, self.operation_patches, self.types_in_use = build_scene(
+            self.static_scene, self.main_window.panel_data, operations, panel_length, panel_width,
+            layers=self.layers, toolpaths=self.toolpath_cache if self.show_toolpaths else None
+        )
+        self.set_scene_rect(panel_length, panel_width)
+        self.signatures = [operation_signature(op) for op in operations]
+        resized = self.drawn_size != (panel_length, panel_width)
+        self.drawn_size = (panel_length, panel_width)
+        metrics.count("redraws")
+        metrics.count("operations_drawn", len(operations))
+        metrics.count("artists_created", len(self.operation_patches))
+        self.draw_diff_overlay()
+        if resized:
+            self.fit_panel()
+        self.update_labels()
+        self.viewport().update()
+
+    def sync_operations(self, operations, panel_length, panel_width):
+        """
+        Перерисовка после правки: общие начало и конец списка операций остаются,
+        заменяются элементы только между ними (и плитки под их габаритами).
+        False — изменилось слишком много, выгоднее построить сцену заново.
+        """
+        with metrics.timer("redraw_sync"):
+            new = [operation_signature(op) for op in operations]
+            prefix, removed, added = changed_span(self.signatures, new)
+            if removed + added > max(16, len(new) // 4):
+                return False
+
+            self.clear_highlight()
+            L_val = renderer.to_float(panel_length)
+            W_val = renderer.to_float(panel_width)
+            for items, _ in self.layers[prefix:prefix + removed]:
+                self.remove_static(items)
+            toolpaths = self.toolpath_cache if self.show_toolpaths else None
+            fresh = []
+            for idx in range(prefix, prefix + added):
+                items, legend = operation_items(operations[idx], idx, L_val, W_val, toolpaths)
+                self.add_static(items)
+                fresh.append((items, legend))
+            self.layers[prefix:prefix + removed] = fresh
+            if added != removed:
+                # Хвост сдвинулся — геометрия та же, меняются только номера
+                for idx in range(prefix + added, len(self.layers)):
+                    for item in self.layers[idx][0]:
+                        item.setData(INDEX_KEY, idx)
+            self.signatures = new
+            self.dependencies = None
+            self.operation_patches = [
+                (item, idx) for idx, (items, _) in enumerate(self.layers) for item in items
+            ]
+            self.types_in_use = sorted({legend for _, legend in self.layers if legend}, key=lambda x: x[0])
+        metrics.count("operations_redrawn", added)
+        self.update_labels()
+        self.viewport().update()
+        return True
+
+    @metrics.timed("redraw_resize")
+    def update_panel_size(self, operations, panel_length, panel_width):
+        """Как PlotWidget.update_panel_size: заменяются только элементы операций, зависящих от L/W."""
+        if (self.layers is None or self.drawn_size is None or self.diff_overlay
+                or len(self.layers) != len(operations)):
+            self.draw_operations(operations, panel_length, panel_width)
+            return
+
+        old_length, old_width = self.drawn_size
+        changed = set()
+        if panel_length != old_length:
+            changed.add("L")
+        if panel_width != old_width:
+            changed.add("W")
+        if changed and self.dependencies is None:
+            with metrics.timer("dependency_index"):
+                self.dependencies = [renderer.operation_dependencies(op) for op in operations]
+        affected = [i for i, deps in enumerate(self.dependencies) if deps & changed] if changed else []
+
+        self.clear_highlight()
+        # Контур: меняется только полоса между старым и новым краем
+        if "L" in changed:
+            self.invalidate_static(QRectF(min(old_length, panel_length), 0,
+                                          abs(panel_length - old_length), max(old_width, panel_width)))
+        if "W" in changed:
+            self.invalidate_static(QRectF(0, min(old_width, panel_width),
+                                          max(old_length, panel_length), abs(panel_width - old_width)))
+        self.panel_item.setRect(0, 0, panel_length, panel_width)
+        self.set_scene_rect(panel_length, panel_width)
+
+        L_val = renderer.to_float(panel_length)
+        W_val = renderer.to_float(panel_width)
+        toolpaths = self.toolpath_cache if self.show_toolpaths else None
+        for idx in affected:
+            self.remove_static(self.layers[idx][0])
+            self.layers[idx] = operation_items(operations[idx], idx, L_val, W_val, toolpaths)
+            self.add_static(self.layers[idx][0])
+        if affected:
+            self.operation_patches = [
+                (item, idx) for idx, (items, _) in enumerate(self.layers) for item in items
+            ]
+            self.types_in_use = sorted({legend for _, legend in self.layers if legend}, key=lambda x: x[0])
+            self.signatures = [operation_signature(op) for op in operations]
+
+        self.drawn_size = (panel_length, panel_width)
+        metrics.count("operations_redrawn", len(affected))
+        self.fit_panel()
+        self.update_labels()
+        self.viewport().update()
+
+    def fit_panel(self):
+        """Вся деталь в окне; X отражён — начало координат справа."""
+        self.setTransform(QTransform.fromScale(-1, 1))
+        self.fitInView(self.scene.sceneRect(), Qt.KeepAspectRatio)
+
+    def set_show_toolpaths(self, show):
+        """Полосы фрезы — часть статичной сцены: переключение строит её заново."""
+        self.show_toolpaths = show
+        if self.drawn_size is None:
+            return
+        self.layers = None
+        self.draw_operations(self.main_window.cad_operations, *self.drawn_size)
+
+    # === Заголовок и легенда ===
+    # Надписи — дочерние виджеты вида, а не viewport: прокрутка сдвигает готовое
+    # изображение viewport, надписи при этом остаются на месте.
+
+    def update_labels(self):
+        if self.message:
+            self.title_label.setText(self.message)
+            self.legend_label.clear()
+        elif self.drawn_size is not None:
+            self.title_label.setText(renderer.panel_title(self.main_window.panel_data, *self.drawn_size))
+            legend = list(self.types_in_use)
+            if self.diff_overlay:
+                legend += DIFF_LEGEND
+            self.legend_label.setText("<br>".join(
+                f'<span style="color:{to_hex(color)}">■</span> {label}' for label, color in legend))
+        else:
+            self.title_label.clear()
+            self.legend_label.clear()
+        self.place_labels()
+
+    def place_labels(self):
+        area = self.viewport().geometry()
+        self.title_label.adjustSize()
+        self.legend_label.adjustSize()
+        if self.message:
+            self.title_label.move(area.center().x() - self.title_label.width() // 2,
+                                  area.center().y() - self.title_label.height() // 2)
+        else:
+            self.title_label.move(area.left() + 8, area.top() + 6)
+        self.legend_label.move(area.left() + 8, area.bottom() - 8 - self.legend_label.height())
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.place_labels()
+
+    # === Подсветка (поверх плиток) ===
+
+    def clear_highlight(self):
+        if self.highlight_item is not None:
+            self.scene.removeItem(self.highlight_item)
+            self.highlight_item = None
+
+    def highlight_element(self, idx):
+        self.clear_highlight()
+        if self.layers is None or not 0 <= idx < len(self.layers) or not self.layers[idx][0]:
+            return
+        item = self.layers[idx][0][0]
+        pen = cosmetic_pen(QColor("red"), 4)
+        if isinstance(item, QGraphicsEllipseItem):
+            outline = QGraphicsEllipseItem(item.rect().adjusted(-4, -4, 4, 4))
+        elif isinstance(item, QGraphicsRectItem):
+            outline = QGraphicsRectItem(item.rect().adjusted(-2, -2, 2, 2))
+        elif isinstance(item, QGraphicsLineItem):
+            outline = QGraphicsLineItem(item.line())
+            pen = cosmetic_pen(QColor("red"), 5)
+        else:
+            outline = QGraphicsPathItem(item.mapToScene(item.shape()))
+            pen = cosmetic_pen(QColor("red"), 5)
+        outline.setPen(pen)
+        outline.setZValue(30)
+        self.scene.addItem(outline)
+        self.highlight_item = outline
+        self.ensureVisible(item.sceneBoundingRect())
+
+    # === Предпросмотр редактируемого пути (поверх плиток) ===
+
+    def show_preview(self, polyline):
+        """Ломаная редактируемого пути; плитки не сбрасываются — меняется один элемент сцены поверх."""
+        if self.preview_item is None:
+            self.preview_item = QGraphicsPathItem()
+            self.preview_item.setPen(cosmetic_pen(QColor("orange"), 2))
+            self.preview_item.setZValue(25)
+            self.scene.addItem(self.preview_item)
+        path = QPainterPath()
+        path.addPolygon(QPolygonF([QPointF(x, y) for x, y in polyline]))
+        self.preview_item.setPath(path)
+
+    def clear_preview(self):
+        if self.preview_item is not None:
+            self.scene.removeItem(self.preview_item)
+            self.preview_item = None
+
+    # === Сравнение ===
+
+    def show_diff(self, diff):
+        self.diff_overlay = diff
+        self.main_window.refresh_plot()
+
+    def clear_diff(self):
+        self.diff_overlay = None
+        self.main_window.refresh_plot()
+
+    def drop_diff(self):
+        """Как PlotWidget.drop_diff: сравнение устарело, слой уйдёт при полной перерисовке."""
+        if self.diff_overlay:
+            self.diff_overlay = None
+            self.layers = None
+
+    def draw_diff_overlay(self):
+        """Маркеры сравнения (цвета как в PlotWidget.draw_diff_overlay)."""
+        diff = self.diff_overlay
+        if not diff:
+            return
+
+        def markers(points, marker, size, color):
+            for x, y in points:
+                item = QGraphicsPathItem(marker_path(marker, size))
+                item.setPos(x, y)
+                item.setFlag(QGraphicsItem.ItemIgnoresTransformations)
+                item.setPen(cosmetic_pen(qcolor(color), 2.5))
+                item.setZValue(40)
+                self.scene.addItem(item)
+
+        markers([a["at"] for a in diff["added"]], "o", 16, "limegreen")
+        markers([r["at"] for r in diff["removed"]], "x", 12, "red")
+        markers([c["at"] for c in diff["changed"]], "o", 14, "royalblue")
+        for m in diff["moved"]:
+            (x1, y1), (x2, y2) = m["from"], m["to"]
+            line = QGraphicsLineItem(x1, y1, x2, y2)
+            pen = cosmetic_pen(qcolor("darkorange"), 1.5)
+            pen.setStyle(Qt.DashLine)
+            line.setPen(pen)
+            line.setZValue(40)
+            self.scene.addItem(line)
+        markers([m["to"] for m in diff["moved"]], "o", 16, "darkorange")
+
+    # === Мышь ===
+
+    @metrics.timed("hit_test")
+    def find_operation_at(self, pos):
+        """Индекс операции под точкой окна: элементы из BSP-индекса статичной сцены, верхние первыми."""
+        scale = abs(self.transform().m11()) or 1.0
+        tol = max(3, int(PICK_TOLERANCE * scale))
+        area = self.mapToScene(QRect(pos.x() - tol, pos.y() - tol, 2 * tol, 2 * tol)).boundingRect()
+        for item in self.static_scene.items(area, Qt.IntersectsItemShape, Qt.DescendingOrder,
+                                            self.viewportTransform()):
+            idx = item.data(INDEX_KEY)
+            if idx is not None:
+                return idx
+        return None
+
+    def mousePressEvent(self, event):
+        idx = self.find_operation_at(event.pos())
+        if idx is None or event.button() not in (Qt.LeftButton, Qt.RightButton):
+            super().mousePressEvent(event)  # перетаскивание вида
+            return
+        op = self.main_window.cad_operations[idx]
+        if event.button() == Qt.LeftButton:
+            self.main_window.edit_operation(idx)
+        elif op["TypeName"] in ["Vertical Hole", "Back Vertical Hole", "Horizontal Hole"]:
+            self.show_context_menu(event.globalPos(), idx)
+
+    def show_context_menu(self, global_pos, idx):
+        from PyQt5.QtWidgets import QMenu
+
+        menu = QMenu(self.main_window)
+        action_mirror_x = menu.addAction("Отразить/скопировать по X")
+        action_mirror_y = menu.addAction("Отразить/скопировать по Y")
+        action = menu.exec_(global_pos)
+        if action == action_mirror_x:
+            self.mirror_operation(idx, axis='x')
+        elif action == action_mirror_y:
+            self.mirror_operation(idx, axis='y')
+
+    def mirror_operation(self, idx, axis):
+        # Логика отражения общая с PlotWidget (ей нужен только main_window)
+        from editor_window import PlotWidget
+        PlotWidget.mirror_operation(self, idx, axis)
+
+    def wheelEvent(self, event):
+        factor = ZOOM_STEP if event.angleDelta().y() > 0 else 1 / ZOOM_STEP
+        self.scale(factor, factor)
+
+
+# === Бенчмарк ===
+
+def benchmark(count=20000, width=1000, height=600, repeats=5):
+    """
+    matplotlib (FigureCanvasAgg, как PlotWidget) против QGraphicsScene без плиток и с плитками:
+    построение чертежа, полная отрисовка, прокрутка на 10%, правка одной операции, поиск под курсором.
+    """
+    import types
+
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from PyQt5.QtGui import QImage
+    from PyQt5.QtWidgets import QApplication
+
+    import validation
+
+    logging.getLogger("up_editor").disabled = True
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    panel_data, operations = validation.make_random_program(count)
+    L_val, W_val = renderer.panel_size(panel_data)
+    x_pick, y_pick = L_val / 2, W_val / 2
+
+    def best(fn):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    # matplotlib
+    fig = Figure(figsize=(width / 100, height / 100), dpi=100)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    start = time.perf_counter()
+    patches, _ = renderer.draw_panel(ax, panel_data, operations, L_val, W_val)
+    mpl = {"build": time.perf_counter() - start, "draw": best(canvas.draw), "edit": None}
+
+    def mpl_pan():
+        x0, x1 = ax.get_xlim()
+        shift = (x1 - x0) * 0.1
+        ax.set_xlim(x0 + shift, x1 + shift)
+        canvas.draw()
+    mpl["pan"] = best(mpl_pan)
+    host = types.SimpleNamespace(operation_patches=patches)
+    from editor_window import PlotWidget
+    mpl["pick"] = best(lambda: PlotWidget.find_operation_at(host, x_pick, y_pick))
+
+    # QGraphicsScene
+    def scene_run(tiles):
+        ops = [dict(op) for op in operations]
+        window = types.SimpleNamespace(panel_data=panel_data, cad_operations=ops)
+        view = SceneWidget(window, tiles=tiles)
+        view.resize(width, height)
+        result = {}
+        start = time.perf_counter()
+        view.draw_operations(ops, L_val, W_val)
+        result["build"] = time.perf_counter() - start
+        view.scale(4, 4)  # прокрутка имеет смысл при увеличении
+        image = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+
+        def render():
+            painter = QPainter(image)
+            view.render(painter)
+            painter.end()
+        result["draw"] = best(render)
+
+        bar = view.horizontalScrollBar()
+        step = [width // 10]
+
+        def pan():
+            bar.setValue(bar.value() + step[0])
+            step[0] = -step[0]
+            render()
+        result["pan"] = best(pan)
+
+        rng = iter(range(1, 10 ** 6))
+
+        def edit():
+            i = next(rng) * 7919 % len(ops)
+            ops[i] = dict(ops[i], X1=str(float(renderer.parse_coord(ops[i]["X1"], L_val, W_val)) + 1))
+            view.draw_operations(ops, L_val, W_val)
+            render()
+        result["edit"] = best(edit)
+        pick_pos = view.mapFromScene(QPointF(x_pick, y_pick))
+        result["pick"] = best(lambda: view.find_operation_at(pick_pos))
+        result["tiles"] = (len(view.tile_cache), view.tile_cache.bytes) if tiles else None
+        return result
+
+    plain = scene_run(False)
+    tiled = scene_run(True)
+
+    def cell(value):
+        return f"{value * 1000:14.1f}" if value is not None else f"{'—':>14}"
+
+    print(f"Операций: {count}, окно {width}×{height}, лучшее из {repeats}")
+    print(f"{'':28}{'matplotlib':>14}{'сцена':>14}{'сцена+плитки':>14}")
+    for key, name in (("build", "построение, мс"), ("draw", "полная отрисовка, мс"),
+                      ("pan", "прокрутка на 10%, мс"), ("edit", "правка операции, мс"),
+                      ("pick", "поиск под курсором, мс")):
+        print(f"{name:28}{cell(mpl[key])}{cell(plain[key])}{cell(tiled[key])}")
+    count_tiles, size = tiled["tiles"]
+    print(f"плиток в кэше: {count_tiles}, {size / 1024 / 1024:.1f} МБ")
+    del app
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
+    else:
+        print(__doc__)
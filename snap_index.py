@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+Привязка курсора к элементам чертежа: центрам отверстий, вершинам путей
+и концам линий, кромкам детали и узлам сетки GRID_STEP мм.
+
+Точки элементов лежат в k-d дереве (KDTree, только numpy): ближайшая точка
+находится за десятки микросекунд и на сотне тысяч операций. После правки
+дерево не перестраивается — точки изменённой операции помечаются мёртвыми,
+а новые попадают в небольшой буфер, который проверяется перебором. Когда
+буфер и мёртвые точки вместе превышают REBUILD_FRACTION дерева, оно строится
+заново при следующем запросе.
+
+Операции, как в operation_index, живут под постоянными номерами (слотами):
+удаление не перенумеровывает точки.
+
+    python snap_index.py --bench 100000
+"""
+import math
+import sys
+import time
+
+import numpy as np
+
+import metrics
+from operation_index import ValueResolver
+from xml_handler import format_num
+
+
+# Шаг сетки, мм (система 32)
+GRID_STEP = 32.0
+# Точек в листе дерева: лист проверяется одним векторным вычислением
+LEAF_SIZE = 16
+# Буфер правок до перестройки: не меньше MIN_BUFFER точек или доля дерева
+MIN_BUFFER = 256
+REBUILD_FRACTION = 0.125
+
+KIND_CENTER = 0
+KIND_VERTEX = 1
+KIND_NAMES = ("центр отверстия", "вершина")
+
+
+class KDTree:
+    """Статическое k-d дерево по точкам (N, 2); узлы хранятся в списках, лист — отрезок order."""
+
+    def __init__(self, points):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self.order = np.arange(len(self.points))
+        self.start, self.stop, self.dim, self.split, self.left, self.right = [], [], [], [], [], []
+        if len(self.points):
+            self._build()
+
+    def __len__(self):
+        return len(self.points)
+
+    def _new_node(self, start, stop):
+        self.start.append(start)
+        self.stop.append(stop)
+        self.dim.append(0)
+        self.split.append(0.0)
+        self.left.append(-1)
+        self.right.append(-1)
+        return len(self.start) - 1
+
+    def _build(self):
+        points, order = self.points, self.order
+        stack = [self._new_node(0, len(points))]
+        while stack:
+            node = stack.pop()
+            start, stop = self.start[node], self.stop[node]
+            if stop - start <= LEAF_SIZE:
+                continue
+            block = points[order[start:stop]]
+            dim = int(np.argmax(block.max(axis=0) - block.min(axis=0)))
+            mid = (start + stop) // 2
+            order[start:stop] = order[start:stop][np.argpartition(block[:, dim], mid - start)]
+            self.dim[node] = dim
+            self.split[node] = float(points[order[mid], dim])
+            self.left[node] = self._new_node(start, mid)
+            self.right[node] = self._new_node(mid, stop)
+            stack += (self.left[node], self.right[node])
+
+    def nearest(self, x, y, radius, alive=None):
+        """
+        Ближайшая к (x, y) точка не дальше radius: (номер, расстояние²) или (-1, radius²).
+        :param alive: булев массив по точкам — False пропускаются
+        """
+        best, best_d2 = -1, radius * radius
+        if not len(self.points):
+            return best, best_d2
+        xs, ys = self.points[:, 0], self.points[:, 1]
+        stack = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if bound > best_d2:
+                continue
+            left = self.left[node]
+            if left < 0:
+                ids = self.order[self.start[node]:self.stop[node]]
+                if alive is not None:
+                    ids = ids[alive[ids]]
+                    if not len(ids):
+                        continue
+                d2 = (xs[ids] - x) ** 2 + (ys[ids] - y) ** 2
+                k = int(np.argmin(d2))
+                if d2[k] <= best_d2:
+                    best, best_d2 = int(ids[k]), float(d2[k])
+                continue
+            diff = (x if self.dim[node] == 0 else y) - self.split[node]
+            near, far = (left, self.right[node]) if diff < 0 else (self.right[node], left)
+            stack.append((far, max(bound, diff * diff)))
+            stack.append((near, bound))
+        return best, best_d2
+
+
+def coord_text(value, size, axis):
+    """Текст координаты для диалога: на дальней кромке — «L»/«W», иначе число."""
+    if abs(value - size) < 1e-6:
+        return axis
+    return format_num(round(value, 2))
+
+
+class SnapIndex:
+    def __init__(self, grid_step=GRID_STEP):
+        self.grid_step = grid_step
+        self.operations = None
+        self.resolver = ValueResolver()
+        self.stale = True
+
+    def set_program(self, operations, L_val, W_val):
+        """Новая программа или новый размер детали: дерево перестроится при следующем запросе."""
+        if operations is not self.operations or (L_val, W_val) != (self.resolver.L, self.resolver.W):
+            self.operations = operations
+            self.resolver = ValueResolver(L_val, W_val)
+            self.stale = True
+
+    def feature_points(self, op):
+        """Точки привязки операции: (список (x, y), вид)."""
+        kind = KIND_VERTEX if op.get("TypeName", "") in ("Path", "Line", "Vertical Line") else KIND_CENTER
+        return self.resolver.points(op), kind
+
+    def features(self, op):
+        """Точки привязки операции: (массив (k, 2), вид)."""
+        points, kind = self.feature_points(op)
+        return np.array(points, dtype=float).reshape(-1, 2), kind
+
+    def build(self):
+        with metrics.timer("snap_index_build"):
+            operations = self.operations or []
+            self.slots = np.arange(len(operations), dtype=np.int64)  # номер в программе → слот
+            self.next_slot = len(operations)
+            flat, kinds, counts = [], [], []
+            for op in operations:
+                points, kind = self.feature_points(op)
+                flat += points
+                kinds.append(kind)
+                counts.append(len(points))
+            counts = np.array(counts, dtype=np.int64)
+            # Точки слота s (s < static_slots) в дереве: first[s]..first[s + 1]
+            self.first = np.concatenate(([0], np.cumsum(counts)))
+            self.static_slots = len(operations)
+            self.tree = KDTree(flat)
+            self.kinds = np.repeat(np.array(kinds, dtype=np.int8), counts)
+            self.alive = np.ones(len(self.tree), dtype=bool)
+            self.dead = 0
+            self.buffer = {}  # слот → (точки, вид) операций, изменённых после построения
+            self._buffer_arrays = None
+        self.stale = False
+
+    # === Правки ===
+
+    def operation_added(self, idx):
+        if self.stale:
+            return
+        if idx != len(self.slots):
+            self.stale = True  # вставка в середину: слоты перестали возрастать
+            return
+        slot = self.next_slot
+        self.next_slot += 1
+        self.slots = np.append(self.slots, slot)
+        self._set_buffer(slot, self.operations[idx])
+
+    def operation_changed(self, idx):
+        if self.stale:
+            return
+        slot = int(self.slots[idx])
+        self._kill(slot)
+        self._set_buffer(slot, self.operations[idx])
+
+    def operation_removed(self, idx):
+        if self.stale:
+            return
+        slot = int(self.slots[idx])
+        self._kill(slot)
+        if self.buffer.pop(slot, None) is not None:
+            self._buffer_arrays = None
+        self.slots = np.delete(self.slots, idx)
+        self._check_rebuild()
+
+    # Правки пачкой (выделенное на чертеже): слоты и проверка перестройки — один раз
+
+    def operations_changed(self, indices):
+        if self.stale:
+            return
+        for idx in indices:
+            slot = int(self.slots[idx])
+            self._kill(slot)
+            self.buffer[slot] = self.features(self.operations[idx])
+        self._buffer_arrays = None
+        self._check_rebuild()
+
+    def operations_added(self, first):
+        """Операции с first до конца дописаны в программу."""
+        if self.stale:
+            return
+        if first != len(self.slots):
+            self.stale = True
+            return
+        count = len(self.operations) - first
+        new = np.arange(self.next_slot, self.next_slot + count, dtype=np.int64)
+        self.next_slot += count
+        self.slots = np.concatenate((self.slots, new))
+        for idx, slot in zip(range(first, len(self.operations)), new):
+            self.buffer[int(slot)] = self.features(self.operations[idx])
+        self._buffer_arrays = None
+        self._check_rebuild()
+
+    def operations_removed(self, indices):
+        """Операции indices (номера до удаления) удалены из программы."""
+        if self.stale:
+            return
+        for idx in indices:
+            slot = int(self.slots[idx])
+            self._kill(slot)
+            self.buffer.pop(slot, None)
+        self._buffer_arrays = None
+        self.slots = np.delete(self.slots, indices)
+        self._check_rebuild()
+
+    def _kill(self, slot):
+        """Точки слота в дереве больше не находятся."""
+        if slot < self.static_slots:
+            start, stop = self.first[slot], self.first[slot + 1]
+            self.dead += int(self.alive[start:stop].sum())
+            self.alive[start:stop] = False
+
+    def _set_buffer(self, slot, op):
+        self.buffer[slot] = self.features(op)
+        self._buffer_arrays = None
+        self._check_rebuild()
+
+    def _check_rebuild(self):
+        buffered = sum(len(points) for points, _ in self.buffer.values())
+        if buffered + self.dead > max(MIN_BUFFER, REBUILD_FRACTION * len(self.tree)):
+            self.stale = True
+
+    def buffer_arrays(self):
+        """Буфер одним куском: (точки, виды, слоты)."""
+        if self._buffer_arrays is None:
+            items = [(points, kind, slot) for slot, (points, kind) in self.buffer.items() if len(points)]
+            if items:
+                self._buffer_arrays = (
+                    np.concatenate([points for points, _, _ in items]),
+                    np.concatenate([np.full(len(points), kind, dtype=np.int8) for points, kind, _ in items]),
+                    np.concatenate([np.full(len(points), slot, dtype=np.int64) for points, _, slot in items]),
+                )
+            else:
+                self._buffer_arrays = (np.empty((0, 2)), np.empty(0, dtype=np.int8), np.empty(0, dtype=np.int64))
+        return self._buffer_arrays
+
+    # === Запросы ===
+
+    def nearest(self, x, y, radius, exclude=None):
+        """
+        Ближайшая точка элемента не дальше radius мм: (x, y, вид) или None.
+        :param exclude: номер операции в программе, к своим точкам которой не привязываться
+        """
+        if self.stale:
+            self.build()
+        slot = int(self.slots[exclude]) if exclude is not None else None
+        hidden = None
+        if slot is not None and slot < self.static_slots:
+            start, stop = self.first[slot], self.first[slot + 1]
+            hidden = (start, stop, self.alive[start:stop].copy())
+            self.alive[start:stop] = False
+        try:
+            best, best_d2 = self.tree.nearest(x, y, radius, self.alive)
+        finally:
+            if hidden is not None:
+                self.alive[hidden[0]:hidden[1]] = hidden[2]
+        result = None
+        if best >= 0:
+            px, py = self.tree.points[best]
+            result = (float(px), float(py), int(self.kinds[best]))
+
+        points, kinds, slots = self.buffer_arrays()
+        if len(points):
+            d2 = (points[:, 0] - x) ** 2 + (points[:, 1] - y) ** 2
+            if slot is not None:
+                d2[slots == slot] = np.inf
+            k = int(np.argmin(d2))
+            if d2[k] <= best_d2:
+                result = (float(points[k, 0]), float(points[k, 1]), int(kinds[k]))
+        return result
+
+    def _snap_axis(self, value, size, radius):
+        """Привязка одной координаты: к кромке 0/size, иначе к сетке; (значение, подпись или None)."""
+        edge = min((0.0, size), key=lambda e: abs(value - e))
+        if abs(value - edge) <= radius:
+            return edge, "кромка"
+        node = round(value / self.grid_step) * self.grid_step
+        if abs(value - node) <= radius:
+            return node, f"сетка {format_num(self.grid_step)}"
+        return value, None
+
+    def snap(self, x, y, radius, exclude=None):
+        """
+        Точка привязки для курсора (x, y) в мм: (x, y, подпись) или None.
+        Элемент программы важнее кромки, кромка — сетки; кромка и сетка — по каждой оси отдельно.
+        """
+        hit = self.nearest(x, y, radius, exclude)
+        if hit is not None:
+            return hit[0], hit[1], KIND_NAMES[hit[2]]
+        sx, x_label = self._snap_axis(x, self.resolver.L, radius)
+        sy, y_label = self._snap_axis(y, self.resolver.W, radius)
+        labels = [label for label in (x_label, y_label) if label]
+        if not labels:
+            return None
+        return sx, sy, " / ".join(dict.fromkeys(labels))
+
+
+# === Бенчмарк ===
+
+def benchmark(count=100000, queries=2000):
+    """Построение, запросы и правки на синтетической программе; ответы сверяются с перебором."""
+    import logging
+    import random
+
+    import renderer
+    import validation
+
+    logging.getLogger("up_editor").disabled = True
+    panel_data, operations = validation.make_random_program(count)
+    L_val, W_val = renderer.panel_size(panel_data)
+    index = SnapIndex()
+    index.set_program(operations, L_val, W_val)
+    start = time.perf_counter()
+    index.build()
+    print(f"Операций: {count}, точек: {len(index.tree)}, "
+          f"построение {(time.perf_counter() - start) * 1000:.0f} мс")
+
+    rng = random.Random(0)
+
+    def measure(label):
+        points = np.concatenate([index.features(op)[0] for op in operations])
+        probes = [(rng.uniform(0, L_val), rng.uniform(0, W_val)) for _ in range(queries)]
+        start = time.perf_counter()
+        found = [index.nearest(x, y, 20.0) for x, y in probes]
+        elapsed = (time.perf_counter() - start) / queries
+        for (x, y), hit in zip(probes, found):
+            distance = np.hypot(points[:, 0] - x, points[:, 1] - y).min()
+            assert (hit is None) == (distance > 20.0), (x, y)
+            assert hit is None or abs(math.hypot(hit[0] - x, hit[1] - y) - distance) < 1e-9
+        print(f"{label:32}{elapsed * 1e6:8.1f} мкс на запрос")
+
+    measure("запрос (дерево)")
+    start = time.perf_counter()
+    for _ in range(200):
+        i = rng.randrange(len(operations))
+        operations[i] = dict(operations[i], X1=str(rng.randrange(int(L_val))))
+        index.operation_changed(i)
+        operations.append(dict(operations[i]))
+        index.operation_added(len(operations) - 1)
+        del operations[0]
+        index.operation_removed(0)
+    print(f"{'правка + добавление + удаление':32}"
+          f"{(time.perf_counter() - start) / 200 * 1e6:8.1f} мкс, в буфере {len(index.buffer)}")
+    measure("запрос (дерево + буфер)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 100000)
+    else:
+        print(__doc__)
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Потоковая загрузка очень больших файлов УП (сотни МБ, склеенные выгрузки заказа).
+
+Файл отображается в память (mmap) и кусками подаётся в XMLPullParser.
+Операции выдаются по одной сразу после закрывающего </CAD>, а разобранные
+элементы удаляются из дерева — ни весь файл строкой, ни всё дерево
+в памяти не держатся.
+
+Склеенная выгрузка — несколько документов подряд, каждый со своим
+<?xml ...?> и корнем <KDTPanelFormat>; каждый документ разбирается
+отдельным парсером, номер документа передаётся вместе с событиями.
+
+Проверка пикового потребления памяти (код выхода 1, если потоковый разбор
+всего файла занял больше, чем ET.parse одной программы):
+
+    python stream_loader.py --bench 20 5000
+"""
+import mmap
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+import metrics
+from xml_handler import read_cad, read_panel
+
+
+# Размер куска определяет пик памяти: дерево одного куска ~ в 10–15 раз больше его самого
+CHUNK_SIZE = 64 * 1024
+XML_DECL = b"<?xml"
+PANEL_TAGS = ("PANEL", "Panel")
+
+
+def document_ranges(mm):
+    """
+    Границы документов в склеенном файле: [(начало, конец), ...].
+    Документ начинается с <?xml; мусор после последнего '>' отбрасывается
+    (переводы строк, BOM следующего документа).
+    """
+    starts = []
+    pos = mm.find(XML_DECL)
+    while pos != -1:
+        starts.append(pos)
+        pos = mm.find(XML_DECL, pos + len(XML_DECL))
+    if not starts or starts[0] > 0 and mm[:starts[0]].strip(b" \t\r\n\xef\xbb\xbf"):
+        starts.insert(0, 0)
+
+    ranges = []
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else len(mm)
+        last = mm.rfind(b">", start, end)
+        if last != -1:
+            ranges.append((start, last + 1))
+    return ranges
+
+
+def iter_events(file_path, chunk_size=CHUNK_SIZE):
+    """
+    Генератор событий:
+        ("panel", номер_документа, panel_data)
+        ("cad",   номер_документа, op)
+    """
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for doc_index, (start, end) in enumerate(document_ranges(mm)):
+                yield from _iter_document(mm, start, end, doc_index, chunk_size)
+
+
+def _iter_document(mm, start, end, doc_index, chunk_size):
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root = None
+    depth = 0
+    for pos in range(start, end, chunk_size):
+        parser.feed(mm[pos:min(pos + chunk_size, end)])
+        for event, elem in parser.read_events():
+            if event == "start":
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+
+            depth -= 1
+            # Интересуют только прямые потомки корня
+            if depth != 1:
+                continue
+            if elem.tag in PANEL_TAGS:
+                yield "panel", doc_index, read_panel(elem)
+            elif elem.tag == "CAD":
+                op = read_cad(elem)
+                if op is not None:
+                    metrics.count("operations_streamed")
+                    yield "cad", doc_index, op
+            # Разобранное больше не нужно — освобождаем память
+            root.clear()
+    parser.close()
+
+
+def iter_operations(file_path, chunk_size=CHUNK_SIZE):
+    """Только операции: (номер_документа, op)."""
+    for kind, doc_index, payload in iter_events(file_path, chunk_size):
+        if kind == "cad":
+            yield doc_index, payload
+
+
+def load_programs(file_path, chunk_size=CHUNK_SIZE):
+    """
+    Все программы файла списком [(panel_data, operations), ...].
+    Для файлов, которые всё же надо держать в памяти целиком.
+    """
+    programs = []
+    for kind, doc_index, payload in iter_events(file_path, chunk_size):
+        while len(programs) <= doc_index:
+            programs.append(({}, []))
+        if kind == "panel":
+            programs[doc_index][0].update(payload)
+        else:
+            programs[doc_index][1].append(payload)
+    return programs
+
+
+def load_xml_stream(file_path):
+    """Потоковый аналог xml_handler.load_xml для одной программы."""
+    programs = load_programs(file_path)
+    if not programs or not programs[0][0]:
+        raise ValueError("Не найден элемент <PANEL>")
+    return programs[0]
+
+
+# === Проверка памяти ===
+
+def memtest(documents=20, operations=5000):
+    """
+    Сравнивает пиковую память (tracemalloc) потокового разбора
+    и ET.parse на склеенном файле из documents программ.
+    Возвращает True, если весь файл потоково занял меньше, чем дерево одной программы.
+    """
+    import logging
+    import tempfile
+    import tracemalloc
+
+    import validation
+    import xml_handler
+
+    logging.getLogger("up_editor").disabled = True
+    folder = tempfile.mkdtemp(prefix="up_stream_")
+    single = os.path.join(folder, "one.xml")
+    big = os.path.join(folder, "order.xml")
+    with open(big, "wb") as out:
+        for i in range(documents):
+            panel_data, ops = validation.make_random_program(operations, seed=i)
+            panel_data["PanelName"] = f"Деталь {i}"
+            xml_handler.save_xml(single, panel_data, ops)
+            with open(single, "rb") as f:
+                out.write(f.read())
+            out.write(b"\n")
+    size = os.path.getsize(big)
+
+    tracemalloc.start()
+    count = sum(1 for _ in iter_operations(big))
+    _, stream_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    panel_data, ops = xml_handler.load_xml(single)
+    _, tree_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"Файл {size / 1e6:.1f} МБ, документов {documents}, операций {count}")
+    print(f"потоковый разбор всего файла: пик {stream_peak / 1e6:.1f} МБ")
+    print(f"ET.parse одной программы:     пик {tree_peak / 1e6:.1f} МБ (из {size / documents / 1e6:.1f} МБ)")
+    # Весь файл потоково должен занимать меньше, чем дерево одной программы
+    if stream_peak >= tree_peak:
+        print("ОШИБКА: потоковый разбор держит в памяти слишком много")
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in ("--bench", "--memtest"):
+        args = [int(a) for a in sys.argv[2:4]]
+        sys.exit(0 if memtest(*args) else 1)
+    elif len(sys.argv) > 1:
+        for doc_index, op in iter_operations(sys.argv[1]):
+            print(doc_index, op.get("TypeName", ""), op.get("X1", ""), op.get("Y1", ""))
+    else:
+        print(__doc__)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Дисковый кэш миниатюр чертежей.
+
+Миниатюра хранится под именем SHA-1 содержимого XML (<sha1>.png), поэтому
+копии и переименованные файлы используют одну картинку. Чтобы не читать
+файл при каждом просмотре, индекс запоминает для пути (mtime, размер, sha1):
+пока mtime и размер не изменились, хэш берётся из индекса.
+
+Размер кэша ограничен max_bytes — при превышении удаляются миниатюры,
+которые дольше всего не открывались.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import metrics
+import renderer
+
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".up_editor", "thumbnails")
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+# Размер миниатюры: дюймы × dpi
+THUMB_SIZE = (2.4, 1.6)
+THUMB_DPI = 80
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ThumbnailCache:
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or DEFAULT_DIR
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # files: путь → [mtime_ns, размер, sha1]; thumbs: sha1 → [байт, последнее использование]
+        self.files = {}
+        self.thumbs = {}
+        self._load_index()
+
+    # === Индекс ===
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.thumbs = data.get("thumbs", {})
+        except (OSError, ValueError):
+            self.files = {}
+            self.thumbs = {}
+
+    def save_index(self):
+        with self._lock:
+            data = {"files": dict(self.files), "thumbs": dict(self.thumbs)}
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.index_path)
+
+    def thumb_path(self, sha1):
+        return os.path.join(self.cache_dir, sha1 + ".png")
+
+    def content_key(self, path, read_file=True):
+        """
+        sha1 содержимого; файл читается только если изменились mtime/размер.
+        read_file=False — только по индексу: None, если файла в нём нет или он изменился.
+        """
+        st = os.stat(path)
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self.files.get(key)
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return entry[2]
+        if not read_file:
+            return None
+        sha1 = file_sha1(path)
+        with self._lock:
+            self.files[key] = [st.st_mtime_ns, st.st_size, sha1]
+        return sha1
+
+    # === Поиск и заполнение ===
+
+    def lookup(self, path, read_file=True):
+        """
+        Путь к готовой миниатюре или None (XML не разбирается).
+        read_file=False — без чтения файла (для GUI-потока): новый или изменённый
+        файл считается промахом, хэш посчитает фоновый поток.
+        """
+        try:
+            sha1 = self.content_key(path, read_file)
+        except OSError:
+            return None
+        if sha1 is None:
+            return None
+        thumb = self.thumb_path(sha1)
+        with self._lock:
+            entry = self.thumbs.get(sha1)
+            if entry is None:
+                return None
+            entry[1] = time.time()
+        if not os.path.exists(thumb):
+            with self._lock:
+                self.thumbs.pop(sha1, None)
+            return None
+        metrics.count("thumbnail_hits")
+        return thumb
+
+    def render(self, path):
+        """
+        Рисует миниатюру (парсит XML) и кладёт её в кэш.
+        Возвращает путь к PNG.
+        """
+        import xml_handler
+
+        sha1 = self.content_key(path)
+        thumb = self.thumb_path(sha1)
+        with metrics.timer("thumbnail_render"):
+            panel_data, operations = xml_handler.load_xml(path)
+            tmp = thumb + f".{os.getpid()}.{threading.get_ident()}.tmp"
+            renderer.render_to_file(panel_data, operations, tmp, fmt="png", dpi=THUMB_DPI,
+                                    width=THUMB_SIZE[0], height=THUMB_SIZE[1], show_title=False)
+            os.replace(tmp, thumb)
+        metrics.count("thumbnail_misses")
+        with self._lock:
+            self.thumbs[sha1] = [os.path.getsize(thumb), time.time()]
+        self.evict()
+        return thumb
+
+    def get(self, path):
+        """Миниатюра из кэша или новая."""
+        return self.lookup(path) or self.render(path)
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry[0] for entry in self.thumbs.values())
+
+    def evict(self):
+        """Удаляет самые давно использованные миниатюры, пока кэш больше max_bytes."""
+        with self._lock:
+            total = sum(entry[0] for entry in self.thumbs.values())
+            if total <= self.max_bytes:
+                return 0
+            victims = []
+            for sha1, (size, _) in sorted(self.thumbs.items(), key=lambda item: item[1][1]):
+                if total <= self.max_bytes:
+                    break
+                victims.append(sha1)
+                total -= size
+            for sha1 in victims:
+                del self.thumbs[sha1]
+            # Пути, указывающие на удалённые миниатюры, тоже забываем
+            gone = set(victims)
+            self.files = {p: e for p, e in self.files.items() if e[2] not in gone}
+        for sha1 in victims:
+            try:
+                os.remove(self.thumb_path(sha1))
+            except OSError as e:
+                metrics.log_event("thumbnail.evict_failed", logging.WARNING, sha1=sha1, error=e)
+        return len(victims)
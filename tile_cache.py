@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Пирамида растровых плиток для неизменной части чертежа.
+
+Статичная геометрия (контур детали, операции, полосы фрезы) рисуется
+в квадратные плитки TILE_SIZE×TILE_SIZE пикселей. Уровень пирамиды — масштаб
+2**level пикселей на мм; для текущего масштаба вида берётся ближайший уровень,
+плитка растягивается или сжимается не больше чем в √2 раза. При прокрутке
+и повторном масштабе плитки только копируются.
+
+Правка операции сбрасывает лишь плитки, которые пересекает её габарит
+(на всех уровнях, с запасом PIXEL_MARGIN пикселей на толщину линий и маркеры).
+Память ограничена max_bytes: сверх неё вытесняются давно не показанные плитки.
+Подсветка и выделение в плитки не попадают — они рисуются поверх.
+"""
+import math
+from collections import OrderedDict
+
+from PyQt5.QtCore import QRectF, Qt
+from PyQt5.QtGui import QImage, QPainter
+
+import metrics
+
+
+TILE_SIZE = 256
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+# Уровни: 2**level пикселей на мм (1/256 … 64)
+MIN_LEVEL = -8
+MAX_LEVEL = 6
+# Запас при сбросе: перо и маркеры выходят за габарит на столько пикселей
+PIXEL_MARGIN = 8
+# Поле вокруг плитки, пикселей: сглаживание при растяжении берёт соседей из него, а не прозрачность
+GUTTER = 1
+
+
+def level_for(scale):
+    """Уровень пирамиды для масштаба вида (пикселей на мм)."""
+    if scale <= 0:
+        return 0
+    return max(MIN_LEVEL, min(MAX_LEVEL, round(math.log2(scale))))
+
+
+class TileCache:
+    def __init__(self, render, tile_size=TILE_SIZE, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        :param render: render(painter, target, source) — рисует статичную геометрию
+                       области сцены source (QRectF, мм) в target (QRectF, пиксели плитки)
+        """
+        self.render = render
+        self.tile_size = tile_size
+        self.max_bytes = max_bytes
+        self._tiles = OrderedDict()  # (level, tx, ty) → QImage, последние показанные — в конце
+        self.bytes = 0
+
+    def tile_span(self, level):
+        """Сторона плитки уровня level в мм."""
+        return self.tile_size / 2.0 ** level
+
+    def tile_range(self, rect, level):
+        span = self.tile_span(level)
+        return (math.floor(rect.left() / span), math.floor(rect.right() / span),
+                math.floor(rect.top() / span), math.floor(rect.bottom() / span))
+
+    def tiles(self, rect, scale):
+        """
+        Плитки, покрывающие область сцены rect при масштабе вида scale:
+        список (прямоугольник сцены, QImage, область картинки без поля).
+        Недостающие рисуются сразу.
+        """
+        level = level_for(scale)
+        span = self.tile_span(level)
+        tx0, tx1, ty0, ty1 = self.tile_range(rect, level)
+        result = []
+        for ty in range(ty0, ty1 + 1):
+            for tx in range(tx0, tx1 + 1):
+                key = (level, tx, ty)
+                image = self._tiles.get(key)
+                if image is None:
+                    image = self._render_tile(level, tx, ty)
+                    self._tiles[key] = image
+                    self.bytes += image.sizeInBytes()
+                    metrics.count("tile_misses")
+                else:
+                    self._tiles.move_to_end(key)
+                    metrics.count("tile_hits")
+                result.append((QRectF(tx * span, ty * span, span, span), image, self.source_rect))
+        self.evict(keep=len(result))
+        return result
+
+    @property
+    def source_rect(self):
+        return QRectF(GUTTER, GUTTER, self.tile_size, self.tile_size)
+
+    def _render_tile(self, level, tx, ty):
+        span = self.tile_span(level)
+        gutter = GUTTER * span / self.tile_size
+        size = self.tile_size + 2 * GUTTER
+        image = QImage(size, size, QImage.Format_ARGB32_Premultiplied)
+        image.fill(Qt.transparent)
+        with metrics.timer("tile_render"):
+            painter = QPainter(image)
+            painter.setRenderHint(QPainter.Antialiasing)
+            self.render(painter, QRectF(0, 0, size, size),
+                        QRectF(tx * span - gutter, ty * span - gutter, span + 2 * gutter, span + 2 * gutter))
+            painter.end()
+        return image
+
+    def evict(self, keep=0):
+        """Вытесняет самые давно показанные плитки сверх max_bytes (последние keep не трогает)."""
+        evicted = 0
+        while self.bytes > self.max_bytes and len(self._tiles) > keep:
+            _, image = self._tiles.popitem(last=False)
+            self.bytes -= image.sizeInBytes()
+            evicted += 1
+        if evicted:
+            metrics.count("tile_evictions", evicted)
+        return evicted
+
+    def invalidate(self, rect):
+        """Сбрасывает плитки всех уровней, которые пересекает rect (мм) с запасом PIXEL_MARGIN."""
+        if not self._tiles:
+            return 0
+        dropped = 0
+        for level in {key[0] for key in self._tiles}:
+            margin = PIXEL_MARGIN / 2.0 ** level
+            tx0, tx1, ty0, ty1 = self.tile_range(rect.adjusted(-margin, -margin, margin, margin), level)
+            if (tx1 - tx0 + 1) * (ty1 - ty0 + 1) > len(self._tiles):
+                keys = [k for k in self._tiles
+                        if k[0] == level and tx0 <= k[1] <= tx1 and ty0 <= k[2] <= ty1]
+            else:
+                keys = [(level, tx, ty) for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1)]
+            for key in keys:
+                image = self._tiles.pop(key, None)
+                if image is not None:
+                    self.bytes -= image.sizeInBytes()
+                    dropped += 1
+        metrics.count("tiles_invalidated", dropped)
+        return dropped
+
+    def clear(self):
+        self._tiles.clear()
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self._tiles)
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Полоса, которую проходит фреза: Path и Line с учётом Width и Correction.
+
+Correction (сторона коррекции по ходу движения, в координатах станка):
+    0 — по центру:  полоса ±Width/2 от линии;
+    1 — слева:      полоса от линии до Width влево;
+    2 — справа:     полоса от линии до Width вправо.
+
+Дуги Path раскладываются на отрезки так, чтобы хорда отходила от дуги
+не больше ARC_TOLERANCE; смещение ломаной считается массивами numpy
+(нормали вершин со срезом острых углов), поэтому контур в 10 тыс. вершин
+обрабатывается за миллисекунды. Готовые многоугольники кэшируются
+по содержимому операции (и L/W, только если операция от них зависит) —
+при перерисовке пересчитываются лишь изменённые операции.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+from path_simplify import vertex_points
+from renderer import COLOR_LINE, COLOR_PATH, operation_dependencies, parse_coord, to_float
+
+
+# Наибольшее отклонение хорды от дуги, мм
+ARC_TOLERANCE = 0.05
+# Предел удлинения нормали в остром углу (в полуширинах)
+MITER_LIMIT = 4.0
+# Сторона коррекции → (смещение от, смещение до) в долях Width; влево — положительное
+CORRECTION_OFFSETS = {
+    "0": (-0.5, 0.5),
+    "1": (0.0, 1.0),
+    "2": (-1.0, 0.0),
+}
+DEFAULT_CACHE_SIZE = 5000
+
+
+def arc_centers(A, B, radius, direction):
+    """
+    renderer.calculate_arc_center для массивов: A, B — (n, 2), radius, direction — (n,).
+    Возвращает (центры (n, 2), маска допустимых дуг — радиус не меньше полухорды).
+    """
+    d = B - A
+    chord = np.hypot(d[:, 0], d[:, 1])
+    half = chord / 2
+    valid = (chord > 0) & (radius >= half)
+    u = d / np.where(chord > 0, chord, 1.0)[:, None]
+    normal = np.column_stack((-u[:, 1], u[:, 0]))
+    dist = np.sqrt(np.maximum(radius ** 2 - half ** 2, 0.0))
+    sign = np.where(direction == 1, 1.0, -1.0)
+    centers = (A + B) / 2 + (sign * dist)[:, None] * normal
+    return centers, valid
+
+
+def path_polyline(vertexes, L_val, W_val, tolerance=ARC_TOLERANCE):
+    """
+    Ломаная пути (m, 2): вершины Path, дуги разложены на отрезки.
+    Дуга — меньшая из двух (как её рисует renderer.arc_angles).
+    """
+    n = len(vertexes)
+    if n < 2:
+        return np.zeros((0, 2))
+    points, _ = vertex_points(vertexes, L_val, W_val)
+    is_arc = np.array([v.get("type") == "Arc" for v in vertexes])
+    is_arc[0] = False
+    radius = np.array([to_float(v.get("Radius", "10"), 10.0) if a else 0.0 for v, a in zip(vertexes, is_arc)])
+    direction = np.array([int(to_float(v.get("Direction", "1"), 1.0)) if a else 1 for v, a in zip(vertexes, is_arc)])
+
+    # Отрезок k: points[k-1] → points[k]; дуги — только где радиус допустим (иначе прямая, как в renderer)
+    A = points[:-1]
+    B = points[1:]
+    centers, valid = arc_centers(A, B, radius[1:], direction[1:])
+    arc = is_arc[1:] & valid
+
+    a0 = np.arctan2(A[:, 1] - centers[:, 1], A[:, 0] - centers[:, 0])
+    a1 = np.arctan2(B[:, 1] - centers[:, 1], B[:, 0] - centers[:, 0])
+    sweep = np.mod(a1 - a0 + np.pi, 2 * np.pi) - np.pi
+    # Шаг по углу, при котором стрелка прогиба хорды не больше tolerance
+    r = np.where(arc, radius[1:], 1.0)
+    step = 2 * np.arccos(np.clip(1 - tolerance / r, -1.0, 1.0))
+    pieces = np.where(arc, np.ceil(np.abs(sweep) / np.maximum(step, 1e-3)), 1).astype(int)
+    pieces = np.clip(pieces, 1, 256)
+
+    # Точки каждого отрезка без начальной: t = 1/pieces .. 1
+    seg = np.repeat(np.arange(len(A)), pieces)
+    offsets = np.concatenate(([0], np.cumsum(pieces)[:-1]))
+    t = (np.arange(pieces.sum()) - offsets[seg] + 1) / pieces[seg]
+    angle = a0[seg] + t * sweep[seg]
+    on_arc = arc[seg]
+    line_pts = A[seg] + t[:, None] * (B[seg] - A[seg])
+    arc_pts = centers[seg] + radius[1:][seg][:, None] * np.column_stack((np.cos(angle), np.sin(angle)))
+    out = np.where(on_arc[:, None], arc_pts, line_pts)
+    # Концы дуг — точно в вершинах
+    out[offsets + pieces - 1] = B
+    return np.vstack((points[:1], out))
+
+
+def offset_band(polyline, offset_from, offset_to):
+    """
+    Многоугольник полосы между смещениями ломаной offset_from и offset_to
+    (влево по ходу — положительные). Возвращает массив (k, 2) или None.
+    """
+    # Повторяющиеся точки дают нулевые нормали
+    keep = np.ones(len(polyline), dtype=bool)
+    keep[1:] = np.any(np.diff(polyline, axis=0) != 0, axis=1)
+    pts = polyline[keep]
+    if len(pts) < 2:
+        return None
+
+    d = np.diff(pts, axis=0)
+    length = np.hypot(d[:, 0], d[:, 1])
+    seg_normal = np.column_stack((-d[:, 1], d[:, 0])) / length[:, None]
+
+    # Нормаль вершины — биссектриса соседних, удлинённая до смещения от обоих отрезков
+    normal = np.empty_like(pts)
+    normal[0] = seg_normal[0]
+    normal[-1] = seg_normal[-1]
+    if len(pts) > 2:
+        bisector = seg_normal[:-1] + seg_normal[1:]
+        norm = np.hypot(bisector[:, 0], bisector[:, 1])
+        reverse = norm < 1e-9  # разворот на 180°
+        bisector = np.where(reverse[:, None], seg_normal[1:], bisector / np.where(reverse, 1.0, norm)[:, None])
+        cos_half = np.einsum("ij,ij->i", bisector, seg_normal[1:])
+        scale = 1.0 / np.maximum(cos_half, 1.0 / MITER_LIMIT)
+        normal[1:-1] = bisector * scale[:, None]
+
+    side_a = pts + offset_to * normal
+    side_b = pts + offset_from * normal
+    return np.vstack((side_a, side_b[::-1]))
+
+
+def swept_polygon(op, L_val, W_val):
+    """Многоугольник полосы фрезы для Path/Line или None."""
+    type_name = op.get("TypeName", "")
+    width = to_float(op.get("Width", "0"), 0.0)
+    if width <= 0:
+        return None
+    lo, hi = CORRECTION_OFFSETS.get(str(op.get("Correction", "0")).strip(), CORRECTION_OFFSETS["0"])
+
+    if type_name == "Path":
+        polyline = path_polyline(op.get("Vertexes", []), L_val, W_val)
+    elif type_name == "Line":
+        polyline = np.array([
+            (parse_coord(op.get("BeginX", "0"), L_val, W_val),
+             parse_coord(op.get("BeginY", "0"), L_val, W_val, is_y=True)),
+            (parse_coord(op.get("EndX", "0"), L_val, W_val),
+             parse_coord(op.get("EndY", "0"), L_val, W_val, is_y=True)),
+        ])
+    else:
+        return None
+    if len(polyline) < 2:
+        return None
+    return offset_band(polyline, lo * width, hi * width)
+
+
+def cache_key(op, L_val, W_val):
+    """Ключ кэша: поля, влияющие на полосу, и L/W — только если операция от них зависит."""
+    deps = operation_dependencies(op)
+    fields = tuple(op.get(k, "") for k in ("TypeName", "Width", "Correction", "BeginX", "BeginY", "EndX", "EndY"))
+    vertexes = tuple(
+        (v.get("type"), v.get("X1"), v.get("Y1"), v.get("Radius"), v.get("Direction"))
+        for v in op.get("Vertexes", ())
+    )
+    return (fields, vertexes,
+            L_val if "L" in deps else None,
+            W_val if "W" in deps else None)
+
+
+class ToolpathCache:
+    """Многоугольники полос по операциям, LRU по числу записей."""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._polygons = OrderedDict()
+
+    def polygon(self, op, L_val, W_val):
+        if op.get("TypeName") not in ("Path", "Line"):
+            return None
+        key = cache_key(op, L_val, W_val)
+        if key in self._polygons:
+            self._polygons.move_to_end(key)
+            metrics.count("toolpath_cache_hits")
+            return self._polygons[key]
+        metrics.count("toolpath_cache_misses")
+        polygon = swept_polygon(op, L_val, W_val)
+        self._polygons[key] = polygon
+        if len(self._polygons) > self.max_entries:
+            self._polygons.popitem(last=False)
+        return polygon
+
+    def clear(self):
+        self._polygons.clear()
+
+
+def draw_toolpaths(ax, operations, L_val, W_val, cache):
+    """
+    Полосы фрезы одной коллекцией под осевыми линиями.
+    Возвращает артиста (или None, если рисовать нечего).
+    """
+    from matplotlib.collections import PolyCollection
+
+    polygons = []
+    colors = []
+    with metrics.timer("toolpath_polygons"):
+        for op in operations:
+            try:
+                polygon = cache.polygon(op, L_val, W_val)
+            except Exception as e:
+                metrics.log_event("toolpath.failed", type_name=op.get("TypeName", ""), error=e)
+                continue
+            if polygon is not None:
+                polygons.append(polygon)
+                colors.append(COLOR_PATH if op.get("TypeName") == "Path" else COLOR_LINE)
+    if not polygons:
+        return None
+    collection = PolyCollection(polygons, facecolors=colors, edgecolors="none", alpha=0.25, zorder=1.5)
+    ax.add_collection(collection)
+    return collection
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+Движок проверки операций УП.
+
+Правила регистрируются в реестре RULES и работают сразу над массивами
+координат всей программы (numpy), а не над каждой операцией по отдельности.
+Каждое правило возвращает список находок (словарей):
+
+    {"rule": ..., "index": ..., "severity": "error"|"warning", "message": ...}
+
+Находки с severity="error" означают, что операцию нельзя отправлять на станок —
+save_xml такие операции удаляет (как и раньше). "warning" — только сообщение.
+
+Используется в save_xml, в редакторе (меню "Проверка") и из командной строки:
+
+    python validation.py file.xml folder/ ...
+    python validation.py --bench 100000
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+import metrics
+from xml_handler import evaluate_expression
+
+
+# Допуск для "на торце" и границ детали, мм
+EDGE_TOLERANCE = 0.1
+
+# Каталог свёрл (диаметры, мм)
+TOOL_DIAMETERS = [3, 4, 5, 6, 7, 8, 10, 12, 15, 20, 26, 35]
+
+HOLE_TYPES = ("Vertical Hole", "Back Vertical Hole", "Horizontal Hole")
+
+# Реестр правил: имя → {"func", "severity", "description"}
+RULES = {}
+
+
+def register_rule(name, severity="error", description=""):
+    """
+    Декоратор: регистрирует правило проверки.
+    Функция правила получает ProgramArrays и возвращает список находок.
+    """
+    def decorator(func):
+        RULES[name] = {
+            "func": func,
+            "severity": severity,
+            "description": description or name,
+        }
+        return func
+    return decorator
+
+
+def set_tool_catalog(diameters):
+    """Заменяет каталог свёрл (например, под конкретный станок)."""
+    TOOL_DIAMETERS[:] = [float(d) for d in diameters]
+
+
+def panel_dimensions(panel_data):
+    """
+    Возвращает (L, W, T) детали так же, как их считает save_xml.
+    """
+    try:
+        L_size = float(evaluate_expression(str(panel_data.get("PanelLength", 0)), 0, 0))
+        W_size = float(evaluate_expression(str(panel_data.get("PanelWidth", 0)), 0, 0))
+        T_size = float(evaluate_expression(str(panel_data.get("PanelThickness", 0)), 0, 0))
+    except:
+        L_size = 1000.0
+        W_size = 600.0
+        T_size = 18.0
+    return L_size, W_size, T_size
+
+
+def resolve_column(values, L_val, W_val):
+    """
+    Вычисляет столбец выражений (строк) в массив float.
+    Каждое уникальное выражение вычисляется один раз — в программах
+    тысячи отверстий с одинаковыми "L-32", "W/2", "9.5".
+    """
+    if len(values) == 0:
+        return np.zeros(0)
+    cache = {s: evaluate_expression(s, L_val, W_val) for s in set(values)}
+    return np.fromiter((cache[s] for s in values), dtype=float, count=len(values))
+
+
+def parse_number_column(values, default):
+    """
+    Столбец чисел (Depth, Diameter): запятая допускается, мусор → NaN,
+    пустое значение → default.
+    """
+    if len(values) == 0:
+        return np.zeros(0)
+    cache = {}
+    for raw in set(values):
+        s = str(raw).strip().replace(',', '.')
+        if not s:
+            cache[raw] = default
+            continue
+        try:
+            cache[raw] = float(s)
+        except ValueError:
+            cache[raw] = np.nan
+    return np.fromiter((cache[s] for s in values), dtype=float, count=len(values))
+
+
+class ProgramArrays:
+    """
+    Программа, развёрнутая в столбцы numpy для векторных правил.
+    """
+
+    def __init__(self, panel_data, operations):
+        self.operations = operations
+        self.L, self.W, self.T = panel_dimensions(panel_data)
+        self.count = len(operations)
+
+        self.types = np.array([op.get("TypeName", "") for op in operations], dtype=object)
+        x_str = [str(op.get("X1", "0")).strip() for op in operations]
+        y_str = [str(op.get("Y1", "0")).strip() for op in operations]
+
+        self.x_empty = np.array([s == "" for s in x_str], dtype=bool)
+        self.y_empty = np.array([s == "" for s in y_str], dtype=bool)
+        self.x = resolve_column(x_str, self.L, self.W)
+        self.y = resolve_column(y_str, self.L, self.W)
+        self.depth = parse_number_column([op.get("Depth", "0") for op in operations], 0.0)
+        self.diameter = parse_number_column([op.get("Diameter", "5") for op in operations], 5.0)
+
+        self.is_horizontal = self.types == "Horizontal Hole"
+        self.is_vertical = (self.types == "Vertical Hole") | (self.types == "Back Vertical Hole")
+        self.is_hole = self.is_horizontal | self.is_vertical
+
+    def in_x(self):
+        return (self.x >= 0) & (self.x <= self.L)
+
+    def in_y(self):
+        return (self.y >= 0) & (self.y <= self.W)
+
+    def on_edge(self, tolerance=EDGE_TOLERANCE):
+        return (
+            (np.abs(self.x) < tolerance) |              # X ≈ 0 (правый торец)
+            (np.abs(self.x - self.L) < tolerance) |     # X ≈ L (левый торец)
+            (np.abs(self.y) < tolerance) |              # Y ≈ 0 (верхний торец)
+            (np.abs(self.y - self.W) < tolerance)       # Y ≈ W (нижний торец)
+        )
+
+
+def make_findings(mask, rule, message):
+    """
+    Превращает булеву маску в список находок.
+    message — функция (index) → текст, вызывается только для найденных.
+    """
+    severity = RULES[rule]["severity"]
+    return [
+        {"rule": rule, "index": int(i), "severity": severity, "message": message(int(i))}
+        for i in np.flatnonzero(mask)
+    ]
+
+
+# === Правила ===
+
+@register_rule("horizontal_empty_coords", "error", "Торцевое отверстие без координат")
+def rule_horizontal_empty_coords(prog):
+    mask = prog.is_horizontal & (prog.x_empty | prog.y_empty)
+    return make_findings(mask, "horizontal_empty_coords",
+                         lambda i: "Торцевое отверстие: пустые X1/Y1")
+
+
+@register_rule("hole_in_panel", "error", "Отверстие за пределами детали")
+def rule_hole_in_panel(prog):
+    filled = ~(prog.x_empty | prog.y_empty)
+    mask = prog.is_hole & filled & ~(prog.in_x() & prog.in_y())
+    return make_findings(
+        mask, "hole_in_panel",
+        lambda i: f"X={prog.x[i]:.1f}, Y={prog.y[i]:.1f} вне детали [0, {prog.L:g}] × [0, {prog.W:g}]"
+    )
+
+
+@register_rule("horizontal_on_edge", "error", "Торцевое отверстие не на торце")
+def rule_horizontal_on_edge(prog):
+    filled = ~(prog.x_empty | prog.y_empty)
+    inside = prog.in_x() & prog.in_y()
+    mask = prog.is_horizontal & filled & inside & ~prog.on_edge()
+    return make_findings(
+        mask, "horizontal_on_edge",
+        lambda i: f"Торцевое отверстие не на торце: X={prog.x[i]:.1f}, Y={prog.y[i]:.1f}"
+    )
+
+
+@register_rule("depth_thickness", "warning", "Глубина больше толщины детали")
+def rule_depth_thickness(prog):
+    if prog.T <= 0:
+        return []
+    # Торцевые сверлятся в плоскости детали — их глубина с толщиной не связана
+    mask = ~prog.is_horizontal & (prog.depth > prog.T + 1e-9)
+    return make_findings(
+        mask, "depth_thickness",
+        lambda i: f"Глубина {prog.depth[i]:g} больше толщины детали {prog.T:g}"
+    )
+
+
+@register_rule("diameter_catalog", "warning", "Диаметр отсутствует в каталоге свёрл")
+def rule_diameter_catalog(prog):
+    catalog = np.asarray(TOOL_DIAMETERS, dtype=float)
+    if catalog.size == 0:
+        return []
+    known = np.isin(np.round(prog.diameter, 3), np.round(catalog, 3))
+    mask = prog.is_hole & ~known
+    return make_findings(
+        mask, "diameter_catalog",
+        lambda i: f"Диаметр {prog.diameter[i]:g} нет в каталоге свёрл"
+    )
+
+
+# === Запуск ===
+
+@metrics.timed("validate")
+def validate(panel_data, operations, rules=None):
+    """
+    Прогоняет правила (по умолчанию — все из RULES) и возвращает
+    находки, отсортированные по индексу операции.
+    """
+    prog = ProgramArrays(panel_data, operations)
+    findings = []
+    for name in (RULES if rules is None else rules):
+        findings.extend(RULES[name]["func"](prog))
+    findings.sort(key=lambda f: (f["index"], f["rule"]))
+    return findings
+
+
+def filter_operations(panel_data, operations, rules=None):
+    """
+    Возвращает (допустимые операции, находки).
+    Операции с находками уровня "error" отбрасываются.
+    """
+    findings = validate(panel_data, operations, rules)
+    bad = {f["index"] for f in findings if f["severity"] == "error"}
+    valid_operations = [op for i, op in enumerate(operations) if i not in bad]
+    return valid_operations, findings
+
+
+def format_report(findings, operations=None):
+    """Текстовый отчёт: одна строка на находку."""
+    if not findings:
+        return "Замечаний нет"
+    lines = []
+    for f in findings:
+        type_name = ""
+        if operations is not None:
+            type_name = operations[f["index"]].get("TypeName", "")
+        level = "ОШИБКА" if f["severity"] == "error" else "предупр."
+        lines.append(f"#{f['index'] + 1} {type_name} [{level}] {f['message']}")
+    return "\n".join(lines)
+
+
+def validate_file(file_path):
+    """Загружает XML и возвращает (panel_data, operations, findings)."""
+    import xml_handler
+    panel_data, operations = xml_handler.load_xml(file_path)
+    return panel_data, operations, validate(panel_data, operations)
+
+
+# === Пакетный режим и бенчмарк ===
+
+def make_random_program(count, L_val=2800, W_val=2070, seed=0):
+    """Синтетическая программа для бенчмарка: отверстия с формулами и числами."""
+    rng = np.random.default_rng(seed)
+    panel_data = {"PanelLength": str(L_val), "PanelWidth": str(W_val), "PanelThickness": "16"}
+    kinds = rng.integers(0, 3, count)
+    xs = rng.integers(-20, L_val + 20, count)
+    ys = rng.integers(-20, W_val + 20, count)
+    diameters = rng.choice(["5", "8", "15", "35", "9"], count)
+    operations = []
+    for k, x, y, d in zip(kinds, xs, ys, diameters):
+        if k == 0:
+            op = {"TypeName": "Vertical Hole", "X1": str(x), "Y1": f"W-{W_val - y}", "Depth": "13"}
+        elif k == 1:
+            op = {"TypeName": "Back Vertical Hole", "X1": f"L-{L_val - x}", "Y1": str(y), "Depth": "17"}
+        else:
+            op = {"TypeName": "Horizontal Hole", "X1": "0" if x % 2 else "L", "Y1": str(y), "Depth": "22"}
+        op["Diameter"] = str(d)
+        operations.append(op)
+    return panel_data, operations
+
+
+def benchmark(count=100000):
+    panel_data, operations = make_random_program(count)
+    start = time.perf_counter()
+    findings = validate(panel_data, operations)
+    elapsed = time.perf_counter() - start
+    print(f"{count} операций: {elapsed * 1000:.1f} мс, находок: {len(findings)}")
+    return elapsed
+
+
+def main(argv):
+    if argv and argv[0] == "--bench":
+        benchmark(int(argv[1]) if len(argv) > 1 else 100000)
+        return 0
+
+    files = []
+    for arg in argv:
+        if os.path.isdir(arg):
+            files.extend(sorted(
+                os.path.join(arg, name) for name in os.listdir(arg) if name.lower().endswith(".xml")
+            ))
+        else:
+            files.append(arg)
+
+    errors = 0
+    for path in files:
+        try:
+            _, operations, findings = validate_file(path)
+        except Exception as e:
+            print(f"{path}: не удалось прочитать: {e}")
+            errors += 1
+            continue
+        print(f"=== {path}: операций {len(operations)}, замечаний {len(findings)}")
+        if findings:
+            print(format_report(findings, operations))
+        if any(f["severity"] == "error" for f in findings):
+            errors += 1
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
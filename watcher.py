@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Служба проверки папки выгрузки CAM.
+
+Следит за папкой (опрос os.scandir — работает одинаково на Windows-шарах
+и локальных дисках), берёт только новые и изменённые XML, проверяет их
+в пуле процессов тем же движком, что и save_xml (validation.py), и пишет
+отчёт на каждый файл:
+
+    <папка отчётов>/<имя>.report.json  — находки в машинном виде
+    <папка отчётов>/<имя>.report.txt   — то же текстом
+
+Индекс хэшей содержимого (<папка отчётов>/index.json) переживает
+перезапуск: файл, который только "тронули" (mtime изменился, содержимое нет),
+повторно не проверяется.
+
+    python watcher.py \\\\server\\cam_export --reports D:\\reports --jobs 8
+    python watcher.py export/ --once
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import metrics
+
+
+# Файл должен "отлежаться" столько секунд, чтобы не читать его во время записи
+SETTLE_SECONDS = 1.0
+
+
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def report_base(reports_dir, path):
+    return os.path.join(reports_dir, os.path.splitext(os.path.basename(path))[0])
+
+
+def check_file(path, reports_dir, known_sha1=None):
+    """
+    Задача пула: хэш, разбор, проверка, запись отчёта.
+    Если содержимое совпадает с known_sha1 — только хэш.
+    """
+    import validation
+    import xml_handler
+
+    logging.getLogger("up_editor").disabled = True
+    start = time.perf_counter()
+    sha1 = file_sha1(path)
+    if sha1 == known_sha1:
+        return {"path": path, "sha1": sha1, "status": "unchanged"}
+
+    result = {"path": path, "sha1": sha1, "checked_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    try:
+        panel_data, operations = xml_handler.load_xml(path)
+    except Exception as e:
+        result.update(status="unreadable", error=str(e), findings=[], operations=0)
+        text = f"{path}\nНе удалось прочитать: {e}\n"
+    else:
+        findings = validation.validate(panel_data, operations)
+        errors = sum(1 for f in findings if f["severity"] == "error")
+        result.update(
+            status="error" if errors else ("warning" if findings else "ok"),
+            panel=panel_data.get("PanelName", ""),
+            operations=len(operations),
+            errors=errors,
+            warnings=len(findings) - errors,
+            findings=findings,
+        )
+        text = (
+            f"{path}\nДеталь: {result['panel']}, операций: {len(operations)}, "
+            f"ошибок: {errors}, предупреждений: {len(findings) - errors}\n\n"
+            + validation.format_report(findings, operations) + "\n"
+        )
+    result["seconds"] = round(time.perf_counter() - start, 4)
+
+    base = report_base(reports_dir, path)
+    with open(base + ".report.json", "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=1)
+    with open(base + ".report.txt", "w", encoding="utf-8") as f:
+        f.write(text)
+    result.pop("findings", None)
+    return result
+
+
+class FolderWatcher:
+    def __init__(self, folder, reports_dir=None, jobs=None, settle=SETTLE_SECONDS):
+        self.folder = folder
+        self.reports_dir = reports_dir or os.path.join(folder, "_reports")
+        self.jobs = jobs
+        self.settle = settle
+        self.index_path = os.path.join(self.reports_dir, "index.json")
+        os.makedirs(self.reports_dir, exist_ok=True)
+        # путь → {"mtime_ns", "size", "sha1", "status"}
+        self.index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_index(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, ensure_ascii=False)
+        os.replace(tmp, self.index_path)
+
+    def changed_files(self):
+        """Новые/изменённые XML, которые уже дописаны."""
+        now = time.time()
+        changed = []
+        present = set()
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if not entry.is_file() or not entry.name.lower().endswith(".xml"):
+                    continue
+                st = entry.stat()
+                present.add(entry.path)
+                known = self.index.get(entry.path)
+                if known and known["mtime_ns"] == st.st_mtime_ns and known["size"] == st.st_size:
+                    continue
+                if now - st.st_mtime < self.settle:
+                    continue  # ещё пишется — возьмём на следующем проходе
+                changed.append((entry.path, st.st_mtime_ns, st.st_size))
+        # Удалённые файлы забываем
+        for path in list(self.index):
+            if path not in present:
+                del self.index[path]
+        return changed
+
+    def process(self, pool, changed):
+        """Проверяет пачку файлов в пуле, обновляет индекс. Возвращает результаты."""
+        futures = {}
+        for path, mtime_ns, size in changed:
+            known = self.index.get(path, {}).get("sha1")
+            future = pool.submit(check_file, path, self.reports_dir, known)
+            futures[future] = (path, mtime_ns, size)
+
+        results = []
+        for future in as_completed(futures):
+            path, mtime_ns, size = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                metrics.log_event("watcher.failed", logging.ERROR, path=path, error=e)
+                continue
+            previous = self.index.get(path, {})
+            status = previous.get("status", "ok") if result["status"] == "unchanged" else result["status"]
+            self.index[path] = {"mtime_ns": mtime_ns, "size": size, "sha1": result["sha1"], "status": status}
+            if result["status"] != "unchanged":
+                metrics.log_event("watcher.checked", path=path, status=status,
+                                  operations=result.get("operations", 0), errors=result.get("errors", 0))
+            results.append(result)
+        return results
+
+    def scan_once(self, pool):
+        changed = self.changed_files()
+        if not changed:
+            return []
+        start = time.perf_counter()
+        results = self.process(pool, changed)
+        self.save_index()
+        elapsed = time.perf_counter() - start
+        checked = sum(1 for r in results if r["status"] != "unchanged")
+        metrics.log_event("watcher.batch", files=len(changed), checked=checked,
+                          seconds=round(elapsed, 3), files_per_sec=round(len(changed) / elapsed, 1))
+        return results
+
+    def run(self, interval=2.0, once=False):
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            while True:
+                self.scan_once(pool)
+                if once:
+                    return
+                time.sleep(interval)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Проверка новых УП в папке выгрузки")
+    parser.add_argument("folder")
+    parser.add_argument("--reports", help="папка отчётов (по умолчанию <папка>/_reports)")
+    parser.add_argument("--jobs", type=int, default=None, help="процессов проверки")
+    parser.add_argument("--interval", type=float, default=2.0, help="период опроса, с")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                        help="сколько секунд файл не должен меняться перед проверкой")
+    parser.add_argument("--once", action="store_true", help="один проход и выход")
+    args = parser.parse_args(argv)
+
+    metrics.setup_logging()
+    watcher = FolderWatcher(args.folder, args.reports, args.jobs, args.settle)
+    try:
+        watcher.run(args.interval, args.once)
+    except KeyboardInterrupt:
+        watcher.save_index()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
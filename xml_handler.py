@@ -2,6 +2,9 @@
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
 import re
+import logging
+
+import metrics
 
 
 def evaluate_expression(expr, L_val, W_val):
@@ -47,21 +50,11 @@ def get_text(parent, tag, default):
     return default
 
 
-def load_xml(file_path):
+def read_panel(panel_elem):
     """
-    Загружает XML-файл в формате KDTPanelFormat.
-    Полная поддержка Path с <Point>, <Line>, <Arc> внутри <Vertexes>.
+    Разбирает элемент <PANEL> в словарь panel_data.
     """
-    tree = ET.parse(file_path)
-    root = tree.getroot()
-
     panel_data = {}
-    operations = []
-
-    # === Читаем PANEL ===
-    panel_elem = root.find("PANEL") or root.find("Panel")
-    if panel_elem is None:
-        raise ValueError("Не найден элемент <PANEL>")
 
     def get_text_local(parent, tag, default):
         elem = parent.find(tag)
@@ -93,87 +86,124 @@ def load_xml(file_path):
             elif key == "T":
                 panel_data["PanelThickness"] = value
 
-    # === Читаем все CAD операции ===
-    for cad_elem in root.findall("CAD"):
-        op = {}
+    return panel_data
 
-        for child in cad_elem:
-            tag = child.tag
-            text = child.text or ""
-            op[tag] = text.strip()
 
-        type_name = op.get("TypeName", "")
+def read_cad(cad_elem):
+    """
+    Разбирает элемент <CAD> в словарь операции.
+    Возвращает None для неподдерживаемых типов.
+    """
+    op = {}
+
+    for child in cad_elem:
+        tag = child.tag
+        text = child.text or ""
+        op[tag] = text.strip()
+
+    type_name = op.get("TypeName", "")
+
+    # --- Обработка Path ---
+    if type_name == "Path":
+        vertexes = []
+        vertexes_container = cad_elem.find("Vertexes")
+        if vertexes_container is not None:
+            for child in vertexes_container:
+                tag = child.tag.lower()
+                x1 = get_text(child, "X1", "0")
+                y1 = get_text(child, "Y1", "0")
+                z1 = get_text(child, "Z1", "0.00")
+                vtype = get_text(child, "VertexType", "0")
+
+                if tag == "point":
+                    vertex = {
+                        "type": "Point",
+                        "X1": x1,
+                        "Y1": y1,
+                        "Z1": z1,
+                        "VertexType": vtype
+                    }
+                    vertexes.append(vertex)
+                elif tag == "line":
+                    vertex = {
+                        "type": "Line",
+                        "X1": x1,
+                        "Y1": y1,
+                        "Z1": z1,
+                        "VertexType": vtype
+                    }
+                    vertexes.append(vertex)
+                elif tag == "arc":
+                    radius = get_text(child, "Radius", "0")
+                    direction = get_text(child, "Direction", "1")
+                    vertex = {
+                        "type": "Arc",
+                        "X1": x1,
+                        "Y1": y1,
+                        "Z1": z1,
+                        "VertexType": vtype,
+                        "Radius": radius,
+                        "Direction": direction
+                    }
+                    vertexes.append(vertex)
+
+        if len(vertexes) > 0:
+            settings = {
+                "Width": op.get("Width", "8"),
+                "Depth": op.get("Depth", "17"),
+                "Correction": op.get("Correction", "2"),
+                "CorrectionExtra": op.get("CorrectionExtra", "0"),
+                "Close": op.get("Close", "0"),
+                "Empty": op.get("Empty", "0"),
+                "Relative": op.get("Relative", "0"),
+                "Enable": op.get("Enable", "1")
+            }
+            op.update(settings)
+            op["Vertexes"] = vertexes
+
+    # --- Остальные типы ---
+    elif type_name in ["Vertical Hole", "Back Vertical Hole", "Horizontal Hole", "Line", "Vertical Line"]:
+        pass
+    else:
+        return None
+
+    return op
+
+
+@metrics.timed("load_xml")
+def load_xml(file_path):
+    """
+    Загружает XML-файл в формате KDTPanelFormat.
+    Полная поддержка Path с <Point>, <Line>, <Arc> внутри <Vertexes>.
+    """
+    with metrics.timer("parse"):
+        tree = ET.parse(file_path)
+    root = tree.getroot()
 
-        # --- Обработка Path ---
-        if type_name == "Path":
-            vertexes = []
-            vertexes_container = cad_elem.find("Vertexes")
-            if vertexes_container is not None:
-                for child in vertexes_container:
-                    tag = child.tag.lower()
-                    x1 = get_text(child, "X1", "0")
-                    y1 = get_text(child, "Y1", "0")
-                    z1 = get_text(child, "Z1", "0.00")
-                    vtype = get_text(child, "VertexType", "0")
-
-                    if tag == "point":
-                        vertex = {
-                            "type": "Point",
-                            "X1": x1,
-                            "Y1": y1,
-                            "Z1": z1,
-                            "VertexType": vtype
-                        }
-                        vertexes.append(vertex)
-                    elif tag == "line":
-                        vertex = {
-                            "type": "Line",
-                            "X1": x1,
-                            "Y1": y1,
-                            "Z1": z1,
-                            "VertexType": vtype
-                        }
-                        vertexes.append(vertex)
-                    elif tag == "arc":
-                        radius = get_text(child, "Radius", "0")
-                        direction = get_text(child, "Direction", "1")
-                        vertex = {
-                            "type": "Arc",
-                            "X1": x1,
-                            "Y1": y1,
-                            "Z1": z1,
-                            "VertexType": vtype,
-                            "Radius": radius,
-                            "Direction": direction
-                        }
-                        vertexes.append(vertex)
-
-            if len(vertexes) > 0:
-                settings = {
-                    "Width": op.get("Width", "8"),
-                    "Depth": op.get("Depth", "17"),
-                    "Correction": op.get("Correction", "2"),
-                    "CorrectionExtra": op.get("CorrectionExtra", "0"),
-                    "Close": op.get("Close", "0"),
-                    "Empty": op.get("Empty", "0"),
-                    "Relative": op.get("Relative", "0"),
-                    "Enable": op.get("Enable", "1")
-                }
-                op.update(settings)
-                op["Vertexes"] = vertexes
-
-        # --- Остальные типы ---
-        elif type_name in ["Vertical Hole", "Back Vertical Hole", "Horizontal Hole", "Line", "Vertical Line"]:
-            pass
-        else:
-            continue
+    # === Читаем PANEL ===
+    panel_elem = root.find("PANEL") or root.find("Panel")
+    if panel_elem is None:
+        raise ValueError("Не найден элемент <PANEL>")
+    panel_data = read_panel(panel_elem)
 
-        operations.append(op)
+    # === Читаем все CAD операции ===
+    operations = []
+    for cad_elem in root.findall("CAD"):
+        op = read_cad(cad_elem)
+        if op is not None:
+            operations.append(op)
 
+    metrics.count("operations_loaded", len(operations))
     return panel_data, operations
 
 
-def save_xml(file_path, panel_data, operations):
+@metrics.timed("save_xml")
+def save_xml(file_path, panel_data, operations, validate=True):
+    """
+    Пишет УП в файл. Возвращает находки проверки.
+    validate=False — без проверки: пишутся все операции как есть, в лог ничего
+    не пишется (копии восстановления из фонового потока).
+    """
     import xml.etree.ElementTree as ET
     from xml.dom import minidom
 
@@ -205,78 +235,21 @@ def save_xml(file_path, panel_data, operations):
     add_param(params, "Толщина детали", "T", format_num(T_size))
 
     # === Фильтрация операций перед сохранением ===
-    # === Фильтрация операций перед сохранением ===
-    valid_operations = []
-    removed_count = 0
-    tolerance = 0.1
-
-    try:
-        L_size = float(evaluate_expression(str(panel_data.get("PanelLength", 0)), 0, 0))
-        W_size = float(evaluate_expression(str(panel_data.get("PanelWidth", 0)), 0, 0))
-    except:
-        L_size = 1000.0
-        W_size = 600.0
-
-    print(f"razmery detali: L={L_size}, W={W_size}")
-
-    for op in operations:
-        type_name = op.get("TypeName", "")
-        is_valid = True
-
-        if type_name == "Horizontal Hole":
-            x_str = op.get("X1", "0").strip()
-            y_str = op.get("Y1", "0").strip()
-
-            if not x_str or not y_str:
-                is_valid = False
-            else:
-                try:
-                    x_val = evaluate_expression(x_str, L_size, W_size)
-                    y_val = evaluate_expression(y_str, L_size, W_size)
-                except:
-                    is_valid = False
-                else:
-                    # Условие 1: X должен быть в пределах [0, L]
-                    if not (0 <= x_val <= L_size):
-                        print(f"[save_xml] Horizontal Hole: X={x_val:.1f} вне [0, {L_size}]  удалено")
-                        is_valid = False
-                    # Условие 2: Y должен быть в пределах [0, W]
-                    elif not (0 <= y_val <= W_size):
-                        print(f"[save_xml] Horizontal Hole: Y={y_val:.1f} вне [0, {W_size}] удалено")
-                        is_valid = False
-                    # Условие 3: должно быть на одном из торцов
-                    else:
-                        on_edge = (
-                            abs(x_val) < tolerance or           # X ≈ 0
-                            abs(x_val - L_size) < tolerance or   # X ≈ L
-                            abs(y_val) < tolerance or           # Y ≈ 0
-                            abs(y_val - W_size) < tolerance      # Y ≈ W
-                        )
-                        if not on_edge:
-                            print(f"[save_xml] Horizontal Hole не на торце: X={x_val:.1f}, Y={y_val:.1f} удалено")
-                            is_valid = False
-
-        elif type_name in ["Vertical Hole", "Back Vertical Hole"]:
-            x_str = op.get("X1", "0").strip()
-            y_str = op.get("Y1", "0").strip()
-            try:
-                x_val = evaluate_expression(x_str, L_size, W_size)
-                y_val = evaluate_expression(y_str, L_size, W_size)
-            except:
-                is_valid = False
-            else:
-                if not (0 <= x_val <= L_size and 0 <= y_val <= W_size):
-                    print(f"[save_xml] vnutrennee: X={x_val:.1f}, Y={y_val:.1f} deleted")
-                    is_valid = False
-
-        # Все остальные типы — всегда валидны
-        if is_valid:
-            valid_operations.append(op)
-        else:
-            removed_count += 1
-
-    if removed_count > 0:
-        print(f"[save_xml] deleted {removed_count} bad hole")
+    import validation
+    tolerance = validation.EDGE_TOLERANCE
+    if validate:
+        valid_operations, findings = validation.filter_operations(panel_data, operations)
+
+        for f in findings:
+            metrics.log_event("save_xml.finding", logging.WARNING, index=f["index"],
+                              rule=f["rule"], severity=f["severity"], message=f["message"])
+        removed_count = len(operations) - len(valid_operations)
+        if removed_count > 0:
+            metrics.log_event("save_xml.removed", logging.WARNING, count=removed_count)
+        metrics.count("operations_saved", len(valid_operations))
+        metrics.count("operations_removed", removed_count)
+    else:
+        valid_operations, findings = operations, []
 
     # === Сохраняем только валидные операции ===
     for op in valid_operations:
@@ -393,21 +366,78 @@ def save_xml(file_path, panel_data, operations):
 
     # === Запись в файл ===
     try:
-        rough_string = ET.tostring(root, 'utf-8')
-        reparsed = minidom.parseString(rough_string)
-        xml_str = reparsed.toprettyxml(indent="  ")
-        lines = [line for line in xml_str.split('\n') if line.strip()]
-        clean_xml = '\n'.join(lines)
+        clean_xml = pretty_xml(root)
+        if clean_xml is None:
+            rough_string = ET.tostring(root, 'utf-8')
+            reparsed = minidom.parseString(rough_string)
+            xml_str = reparsed.toprettyxml(indent="  ")
+            lines = [line for line in xml_str.split('\n') if line.strip()]
+            clean_xml = '\n'.join(lines)
 
         with open(file_path, "w", encoding="utf-8", errors='replace', newline='') as f:
             f.write(clean_xml)
+            metrics.count("bytes_written", f.tell())
 
-        print(f"Файл успешно сохранён: {file_path}")
+        if validate:
+            metrics.log_event("save_xml.saved", path=file_path, operations=len(valid_operations))
 
     except Exception as e:
-        print(f"Ошибка при сохранении: {e}")
+        metrics.log_event("save_xml.failed", logging.ERROR, path=file_path, error=e)
         raise
 
+    # Находки проверки — чтобы редактор мог показать, что было удалено
+    return findings
+
+
+# В таких строках minidom меняет переводы строк и пустые строки — пишем через него
+_CONTROL_CHARS = re.compile(r"[\x00-\x1f]")
+
+
+def _escape(data):
+    return data.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+
+def pretty_xml(root):
+    """
+    Текст документа — тот же, что minidom.toprettyxml(indent="  ") без пустых строк,
+    но без повторного разбора в DOM (в разы быстрее на больших программах).
+    Возвращает None, если дерево не такое, какое строит save_xml
+    (текст вместе с дочерними элементами, управляющие символы, не строки), —
+    тогда нужен обычный путь через minidom.
+    """
+    lines = ['<?xml version="1.0" ?>']
+    append = lines.append
+
+    def write(elem, indent):
+        attrs = ""
+        for key, value in elem.attrib.items():
+            if not isinstance(value, str) or _CONTROL_CHARS.search(value):
+                return False
+            attrs += f' {key}="{_escape(value)}"'
+        text = elem.text
+        if text is not None and (not isinstance(text, str) or _CONTROL_CHARS.search(text)):
+            return False
+        if elem.tail:
+            return False
+        if len(elem):
+            if text:
+                return False
+            append(f"{indent}<{elem.tag}{attrs}>")
+            child_indent = indent + "  "
+            for child in elem:
+                if not write(child, child_indent):
+                    return False
+            append(f"{indent}</{elem.tag}>")
+        elif text:
+            append(f"{indent}<{elem.tag}{attrs}>{_escape(text)}</{elem.tag}>")
+        else:
+            append(f"{indent}<{elem.tag}{attrs}/>")
+        return True
+
+    if not write(root, ""):
+        return None
+    return "\n".join(lines)
+
 
 def add_param(parent, comment, key, value):
     param = ET.SubElement(parent, "Param")